@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Analysis Worker
+Long-lived spine/posture analyzer behind the upload, overlay and report
+endpoints: models are loaded once and requests arrive as framed messages
+(see worker_protocol.py)
+
+Requests:
+    {"id": 1, "method": "spine",   "params": {"imagePath": ..., "modelPath": ...}}
+    {"id": 2, "method": "posture", "params": {"imagePath": ..., "modelPath": ...}}
+    {"id": 3, "method": "rekey",   "params": {"key": ..., "upload": ...}}
+    {"id": 4, "method": "overlay", "params": {"key": ..., "format": "json" | "svg"}}
+    {"id": 5, "method": "report",  "params": {"key": ..., "imagePath": ..., "outputPath": ...,
+                                              "size": ..., "format": ..., "quality": ...}}
+
+A request may carry the encoded upload as its payload, or as a {"slot",
+"bytes"} "frame" descriptor into the shared memory ring the worker was
+started with (--ring); the image is then decoded from memory, straight out
+of the slot for ring frames, and imagePath only names the study (the file
+may not have been written yet). "rekey" stores a study's detections again under
+another upload (a cached result served to a later, identical upload) and
+answers with the new detection key. "overlay" rebuilds the annotation
+overlay of a stored study from its detections (no inference); "report"
+renders its annotated report into outputPath and answers with the
+encoding stats.
+
+Each request is answered with {"id", "result"} (the dict the CLI scripts
+print) or {"id", "error"}, preceded by {"id", "event": "stage", "stage"}
+messages as decoding, inference and scoring finish. Requests run on a
+small thread pool, so several may be in flight and answers can come back
+out of order.
+
+Imported analysis code is never reloaded; the Node client restarts the
+worker when the pipeline files it was started under change.
+
+Usage:
+    python analysis_worker.py [--threads 2] [--ring name:slots:slot_bytes]
+"""
+
+import argparse
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from detection_store import default_store, model_hash
+from frame_ring import FrameRing, ring_spec
+from worker_protocol import MessageWriter, ProtocolError, read_message
+
+
+class ModelCache:
+    """
+    YOLO models by weights path and content hash, one set per thread
+
+    Ultralytics predictors keep per-call state, so threads never share a
+    model instance. Weights replaced on disk are reloaded on the next
+    request instead of answering with the old ones under the new hash.
+    """
+
+    def __init__(self, loader=None):
+        """
+        Args:
+            loader: Optional model_path -> model (ultralytics YOLO by default)
+        """
+        self.local = threading.local()
+        self.loader = loader
+
+    def get(self, model_path):
+        models = getattr(self.local, "models", None)
+        if models is None:
+            models = self.local.models = {}
+        weights = model_hash(model_path)
+        cached = models.get(model_path)
+        if cached is None or cached[0] != weights:
+            print(f"Loading model: {model_path} ({weights})", file=sys.stderr)
+            models[model_path] = (weights, self.load(model_path))
+        return models[model_path][1]
+
+    def load(self, model_path):
+        if self.loader is not None:
+            return self.loader(model_path)
+        from ultralytics import YOLO
+        return YOLO(model_path)
+
+
+def decode_payload(payload):
+    """Decode an uploaded image payload, bytes or a ring slot view (None without a payload)"""
+    if payload is None or not len(payload):
+        return None
+    image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Image could not be decoded")
+    return image
+
+
+def default_handlers(models):
+    """
+    Request handlers of the upload analyses
+
+    Args:
+        models: ModelCache
+
+    Returns:
+        Dict of method name -> handler(params, payload, emit) returning the result
+    """
+    def stage(emit):
+        return lambda name: emit("stage", stage=name)
+
+    def spine(params, payload, emit):
+        from spine_analysis import analyze_spine
+        model = models.get(params["modelPath"])
+        return analyze_spine(params["imagePath"], params["modelPath"], model, stage(emit), decode_payload(payload))
+
+    def posture(params, payload, emit):
+        from posture_analysis import analyze_posture
+        model = models.get(params["modelPath"])
+        return analyze_posture(params["imagePath"], params["modelPath"], model, stage(emit), decode_payload(payload))
+
+    def rekey(params, payload, emit):
+        return default_store().copy(params["key"], params["upload"])
+
+    def overlay(params, payload, emit):
+        import report_overlay
+        result = report_overlay.overlay_from_store(params["key"])
+        if result is None:
+            raise ValueError(f"Unknown detection key: {params['key']}")
+        if params.get("format") == "svg":
+            return report_overlay.overlay_svg(result, f"/uploads/{result['image']}")
+        return result
+
+    def report(params, payload, emit):
+        import study_report
+        key, image_path, output_path = params["key"], params["imagePath"], params["outputPath"]
+        try:
+            return study_report.write_study(
+                key, image_path, output_path, params.get("size"), params.get("format"), params.get("quality")
+            )
+        except KeyError as e:
+            # Unknown detection key; str() of a KeyError would quote the message
+            raise ValueError(e.args[0]) from e
+
+    return {"spine": spine, "posture": posture, "rekey": rekey, "overlay": overlay, "report": report}
+
+
+class AnalysisWorker:
+    """Dispatches framed requests to handlers on a thread pool"""
+
+    def __init__(self, handlers, output, threads=1, ring=None):
+        """
+        Args:
+            handlers: Dict of method name -> handler(params, payload, emit);
+                emit(event, **fields) sends an event message for the request
+            output: Binary stream for responses (stdout buffer)
+            threads: Requests analyzed concurrently
+            ring: Optional FrameRing holding the payloads of "frame" requests
+        """
+        self.handlers = handlers
+        self.writer = MessageWriter(output)
+        self.threads = max(1, threads)
+        self.ring = ring
+
+    def handle(self, header, payload):
+        request_id = header.get("id")
+        try:
+            handler = self.handlers.get(header.get("method"))
+            if handler is None:
+                raise ValueError(f"Unknown method: {header.get('method')}")
+
+            if header.get("frame") is not None:
+                if self.ring is None:
+                    raise ValueError("Frame request without a frame ring")
+                # The slot stays ours until the answer below is written
+                payload = self.ring.payload(header["frame"])
+
+            def emit(event, **fields):
+                self.writer.write({"id": request_id, "event": event, **fields})
+
+            result = handler(header.get("params") or {}, payload, emit)
+            self.writer.write({"id": request_id, "result": result})
+        except Exception as e:
+            self.writer.write({"id": request_id, "error": str(e)})
+
+    def serve(self, stream):
+        """Answer requests until the input closes; waits for in-flight ones"""
+        with ThreadPoolExecutor(self.threads) as pool:
+            while True:
+                message = read_message(stream)
+                if message is None:
+                    return
+                pool.submit(self.handle, *message)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived spine/posture analysis worker")
+    parser.add_argument("--threads", type=int, default=1, help="Requests analyzed concurrently")
+    parser.add_argument("--ring", type=ring_spec, help="Shared memory frame ring created by the server")
+    args = parser.parse_args()
+
+    # Frames own stdout; stray prints from libraries must not corrupt them
+    output = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    ring = FrameRing.attach(args.ring, track=False) if args.ring else None
+    worker = AnalysisWorker(default_handlers(ModelCache()), output, args.threads, ring)
+    try:
+        worker.serve(sys.stdin.buffer)
+    except ProtocolError as e:
+        print(f"Protocol error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,742 @@
+#!/usr/bin/env python3
+"""
+Batch Spine Analysis
+Parallel, resumable analysis of radiograph directory trees with a SQLite
+manifest, so interrupted archive runs continue where they stopped
+
+Usage:
+    python batch_analysis.py <input_dir> --output <report_dir> [--workers 4]
+    python batch_analysis.py <input_dir> --output <report_dir> --batch 16 [--shm-slot-mb 32]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+
+import cv2
+
+import spine_geometry
+import batch_export
+import report_encoding
+import report_overlay
+import study_report
+from detection_store import DetectionStore, model_hash
+from frame_ring import FrameRing
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "best.pt")
+
+THRESHOLD_PRESETS = {
+    "default": spine_geometry.DEFAULT_THRESHOLDS,
+    "report": spine_geometry.REPORT_THRESHOLDS,
+}
+
+# Statuses that need no further work while the file is unchanged
+FINAL_STATUSES = ("done", "no_spine")
+
+# Manifest writes are committed in groups to keep SQLite off the hot path
+COMMIT_EVERY = 50
+COMMIT_SECONDS = 2.0
+
+# Pending files the walk runs ahead of the work, so progress can count them
+SCAN_AHEAD = 10000
+
+
+def iter_images(root, skip=()):
+    """
+    Lazily walk a directory tree for images
+
+    Args:
+        root: Directory (or a single image file)
+        skip: Directories not to descend into (e.g. the report output)
+
+    Yields:
+        Image paths in sorted order per directory
+    """
+    if os.path.isfile(root):
+        yield root
+        return
+
+    skip = {os.path.abspath(d) for d in skip if d}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            print(f"⚠️ Cannot read {directory}: {e}", file=sys.stderr)
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.abspath(entry.path) not in skip:
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry.path
+        # Reversed so directories are visited in sorted order
+        stack.extend(reversed(subdirs))
+
+
+class PendingScan:
+    """
+    Single pass over the pending files that reads ahead of the work
+
+    Up to ``lookahead`` paths are buffered beyond the one being handed out,
+    so the number of pending files is known up front for archives of up to
+    that size and is a lower bound (provisional) for larger ones until the
+    walk finishes.
+    """
+
+    def __init__(self, paths, lookahead=SCAN_AHEAD):
+        """
+        Args:
+            paths: Lazy iterator of pending paths (Manifest.pending())
+            lookahead: Max paths buffered ahead of the work
+        """
+        self.paths = iter(paths)
+        self.lookahead = max(1, lookahead)
+        self.buffer = deque()
+        self.found = 0
+        self.complete = False
+
+    def fill(self):
+        """Walk on until the read-ahead buffer is full or the walk ends"""
+        while not self.complete and len(self.buffer) < self.lookahead:
+            try:
+                self.buffer.append(next(self.paths))
+            except StopIteration:
+                self.complete = True
+            else:
+                self.found += 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.fill()
+        if not self.buffer:
+            raise StopIteration
+        return self.buffer.popleft()
+
+
+class Manifest:
+    """
+    Per-file status of a batch run in a SQLite database (WAL mode)
+
+    Only the coordinating process writes; a file counts as finished while
+    its size and mtime match the recorded ones.
+    """
+
+    def __init__(self, path):
+        """
+        Open (or create) a manifest
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                status TEXT,
+                detection_key TEXT,
+                image_type TEXT,
+                cobb_angle REAL,
+                findings TEXT,
+                report TEXT,
+                error TEXT,
+                elapsed_ms REAL,
+                updated_at REAL
+            )"""
+        )
+        self.conn.commit()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def is_finished(self, path, stat=None):
+        """Whether a file was already analyzed in its current version"""
+        stat = stat or os.stat(path)
+        row = self.conn.execute(
+            "SELECT status, size, mtime_ns FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        return (
+            row is not None and row[0] in FINAL_STATUSES
+            and row[1] == stat.st_size and row[2] == stat.st_mtime_ns
+        )
+
+    def pending(self, paths):
+        """Filter a path iterator down to files that still need work"""
+        for path in paths:
+            try:
+                if not self.is_finished(path):
+                    yield path
+            except OSError:
+                # Vanished since the walk
+                continue
+
+    def record(self, result):
+        """
+        Store the outcome of one file
+
+        Args:
+            result: Dict returned by analyze_file()
+        """
+        self.conn.execute(
+            """INSERT OR REPLACE INTO files
+               (path, size, mtime_ns, status, detection_key, image_type, cobb_angle,
+                findings, report, error, elapsed_ms, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                result["path"], result.get("size"), result.get("mtimeNs"), result["status"],
+                result.get("detectionKey"), result.get("imageType"), result.get("cobbAngle"),
+                json.dumps(result["findings"]) if result.get("findings") else None,
+                result.get("report"), result.get("error"), result.get("elapsedMs"), time.time()
+            )
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= COMMIT_EVERY or time.monotonic() - self._last_commit > COMMIT_SECONDS:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def counts(self):
+        """Number of files per status"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def load_detector(model_path):
+    """
+    Load the YOLO vertebra detector
+
+    Returns:
+        Function mapping a BGR image to (N, 6) detections
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+
+    def detect(img):
+        results = model.predict(source=img, save=False, conf=0.25, verbose=False)
+        return results[0].boxes.data.cpu().numpy()
+
+    return detect
+
+
+def load_batch_detector(model_path, batch_size):
+    """
+    Load the YOLO vertebra detector for batched inference
+
+    Args:
+        model_path: YOLO weights
+        batch_size: Images per forward pass
+
+    Returns:
+        Function mapping a list of BGR images to a generator of (N, 6)
+        detections, one per image in order
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+
+    def detect_batch(images):
+        # stream=True yields results per image instead of collecting the whole list
+        for result in model.predict(source=images, stream=True, batch=batch_size, save=False, conf=0.25,
+                                    verbose=False):
+            yield result.boxes.data.cpu().numpy()
+
+    return detect_batch
+
+
+def iter_chunks(iterable, size):
+    """Split an iterator into lists of at most size items without materializing it"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Per-process worker state, set by init_worker()
+_worker = {}
+
+
+def init_worker(model_path, options, load_model=True, ring_spec=None):
+    """
+    Load the detector once per worker process (scoring-only workers skip it)
+    and attach to the frame ring the batched producer hands images over in
+    """
+    _worker["detect"] = load_detector(model_path) if load_model else None
+    _worker["ring"] = FrameRing.attach(ring_spec) if ring_spec else None
+    _worker["model_id"] = model_hash(model_path)
+    _worker["options"] = options
+    _worker["store"] = DetectionStore(options["store_dir"]) if options.get("store_dir") else DetectionStore()
+
+
+def read_file(path):
+    """
+    Stat and decode one image
+
+    Args:
+        path: Image path
+
+    Returns:
+        (partial result dict, BGR image or None if it could not be read)
+    """
+    result = {"path": path, "status": "failed", "modelHash": _worker.get("model_id"), "timings": {}}
+    try:
+        stat = os.stat(path)
+        result["size"] = stat.st_size
+        result["mtimeNs"] = stat.st_mtime_ns
+
+        start = time.perf_counter()
+        img = cv2.imread(path)
+        result["timings"]["decodeMs"] = _ms(start)
+        if img is None:
+            raise ValueError("Image could not be read")
+        return result, img
+    except Exception as e:
+        result["error"] = str(e)
+        return result, None
+
+
+def score_file(result, img, boxes, elapsed=0.0):
+    """
+    Score and render the detections of one file
+
+    Args:
+        result: Partial result dict from read_file()
+        img: Decoded BGR image
+        boxes: (N, 6) detections
+        elapsed: Seconds already spent on the file (decode, inference)
+
+    Returns:
+        Result dict for the manifest (never raises)
+    """
+    start = time.perf_counter()
+    options = _worker["options"]
+    try:
+        path = result["path"]
+        upload_id = os.path.relpath(path, options["root"]) if os.path.isdir(options["root"]) else os.path.basename(path)
+        result.update(score_detections(img, boxes, upload_id, options, result["timings"]))
+    except Exception as e:
+        result["error"] = str(e)
+
+    result["elapsedMs"] = round((elapsed + time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def score_shared(result, descriptor, boxes, elapsed=0.0):
+    """score_file() of an image read straight from its frame ring slot"""
+    img = _worker["ring"].view(descriptor)
+    try:
+        return score_file(result, img, boxes, elapsed)
+    finally:
+        del img
+
+
+def analyze_file(path):
+    """
+    Analyze one image in a worker process
+
+    Args:
+        path: Image path
+
+    Returns:
+        Result dict for the manifest (never raises)
+    """
+    start = time.perf_counter()
+    result, img = read_file(path)
+    if img is not None:
+        try:
+            infer_start = time.perf_counter()
+            boxes = _worker["detect"](img)
+            result["timings"]["inferenceMs"] = _ms(infer_start)
+        except Exception as e:
+            result["error"] = str(e)
+        else:
+            return score_file(result, img, boxes, time.perf_counter() - start)
+
+    result["elapsedMs"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def _ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def score_detections(img, boxes, upload_id, options, timings=None):
+    """
+    Persist, score and optionally render the detections of one image
+
+    Args:
+        img: BGR image the boxes were detected on
+        boxes: (N, 6) detections
+        upload_id: Study id in the detection store (path relative to the root)
+        options: Batch options (thresholds, report settings)
+        timings: Optional dict receiving geometryMs, renderMs and encodeMs
+
+    Returns:
+        Partial result dict
+    """
+    timings = {} if timings is None else timings
+    height, width = img.shape[:2]
+    result = {
+        "detectionKey": _worker["store"].append(upload_id, _worker["model_id"], boxes, (width, height)),
+        "vertebrae": len(boxes)
+    }
+    if len(boxes) < 3:
+        result["status"] = "no_spine"
+        return result
+
+    start = time.perf_counter()
+    column = spine_geometry.VertebraColumn(boxes)
+    image_type = column.image_type()
+    flags = column.diseases(image_type, THRESHOLD_PRESETS[options["thresholds"]])
+    measurement = column.cobb()
+    timings["geometryMs"] = _ms(start)
+    result.update({
+        "status": "done",
+        "imageType": image_type,
+        "cobbAngle": round(measurement.angle, 2),
+        "findings": flags.counts()
+    })
+    if measurement.idx_max is not None:
+        result["limitVertebrae"] = sorted([measurement.idx_max, measurement.idx_min])
+
+    if options.get("output"):
+        start = time.perf_counter()
+        overlay = report_overlay.build_overlay(
+            column, flags, image_type, (width, height), os.path.basename(upload_id), measurement
+        )
+        report = study_report.render_overlay(img, overlay, options.get("max_dim"))
+        timings["renderMs"] = _ms(start)
+        root, _ = os.path.splitext(upload_id)
+        target = os.path.join(options["output"], f"{root}.{options['format']}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        stats = report_encoding.write_report(
+            report, target, options["format"], options.get("quality"),
+            progressive=options.get("progressive", False), thumbnail=options.get("thumbnail")
+        )
+        timings["encodeMs"] = round(stats["resizeMs"] + stats["encodeMs"], 2)
+        result["report"] = target
+        result["reportBytes"] = stats["bytes"]
+
+    return result
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """
+    Throughput and ETA printer
+
+    While the scan is still walking, the total is the number of pending
+    files found so far and the ETA is a lower bound (shown as "≥").
+    """
+
+    def __init__(self, scan, interval=2.0):
+        self.scan = scan
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._last_print = 0.0
+
+    def update(self, result):
+        self.done += 1
+        if result["status"] == "failed":
+            self.failed += 1
+            print(f"   ❌ {result['path']}: {result.get('error')}", file=sys.stderr)
+        now = time.monotonic()
+        if now - self._last_print >= self.interval or (self.scan.complete and self.done == self.scan.found):
+            self._last_print = now
+            self.print()
+
+    def print(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = self.done / elapsed
+        provisional = not self.scan.complete
+        eta = (self.scan.found - self.done) / rate if rate > 0 else 0
+        print(f"📊 {self.done}/{self.scan.found}{'+' if provisional else ''} files | {rate:.2f} files/s | "
+              f"failed {self.failed} | elapsed {format_duration(elapsed)} | "
+              f"ETA {'≥' if provisional else ''}{format_duration(eta)}",
+              flush=True)
+
+
+def run_batch(root, model_path, options, workers=1, manifest_path=None, batch_size=None):
+    """
+    Analyze every pending image under a root
+
+    Args:
+        root: Input directory (or a single image)
+        model_path: YOLO weights
+        options: Batch options (output, format, quality, max_dim, thumbnail,
+            progressive, thresholds, store_dir, summary, summary_format,
+            shm_slot_mb)
+        workers: Worker processes (0 runs in this process)
+        manifest_path: SQLite manifest (next to the reports by default)
+        batch_size: Batched inference in this process with this many images
+            per forward pass; workers then only score and render
+
+    Returns:
+        Status counts of the manifest
+    """
+    options = dict(options, root=root)
+    if manifest_path is None:
+        base = options.get("output") or (root if os.path.isdir(root) else os.path.dirname(root))
+        manifest_path = os.path.join(base, "batch_manifest.sqlite")
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+
+    manifest = Manifest(manifest_path)
+    summary = None
+    try:
+        if options.get("summary"):
+            summary = batch_export.SummaryWriter(options["summary"], options.get("summary_format"))
+        # One walk feeds the work; it reads ahead to count the pending files
+        pending = PendingScan(manifest.pending(iter_images(root, [options.get("output")])))
+        pending.fill()
+        print(f"🗂️ {pending.found}{'' if pending.complete else '+'} files to analyze (manifest: {manifest_path})")
+        progress = Progress(pending)
+
+        def finish(result):
+            manifest.record(result)
+            if summary is not None:
+                summary.write(result)
+            progress.update(result)
+
+        if batch_size:
+            run_batched(pending, model_path, options, batch_size, workers, finish)
+        elif workers == 0:
+            init_worker(model_path, options)
+            for path in pending:
+                finish(analyze_file(path))
+        else:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(model_path, options)) as pool:
+                # A bounded window of submitted files keeps memory flat on huge trees
+                in_flight = set()
+                for path in pending:
+                    in_flight.add(pool.submit(analyze_file, path))
+                    if len(in_flight) >= workers * 2:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            finish(future.result())
+                for future in wait(in_flight).done:
+                    finish(future.result())
+
+        manifest.commit()
+        return manifest.counts()
+    finally:
+        if summary is not None:
+            summary.close()
+            print(f"📑 {summary.count} summary records from this run, {summary.total} in total: {summary.path}")
+        manifest.close()
+
+
+def open_frame_ring(slots, slot_mb):
+    """Shared memory ring for the scoring workers (None when disabled or unavailable)"""
+    if not slot_mb:
+        return None
+    try:
+        return FrameRing(slots, int(slot_mb * 1024 * 1024))
+    except OSError as e:
+        print(f"⚠️ Shared memory unavailable, images are pickled to the workers: {e}", file=sys.stderr)
+        return None
+
+
+def run_batched(pending, model_path, options, batch_size, workers, finish):
+    """
+    Streaming batched inference over pending files
+
+    Paths are taken from the lazy walk one batch at a time; the next batch
+    is decoded on threads while the current one is on the model, and each
+    result is scored and rendered as soon as the predictor yields it (in
+    this process, or on the worker pool when workers > 0). At most two
+    decoded batches plus the worker window are held in memory.
+
+    With workers, images are decoded into a shared memory frame ring
+    (options["shm_slot_mb"] per slot): the model reads the slot and the
+    scoring worker maps the same slot, so only a slot descriptor is sent
+    to it instead of a pickled image. Images that do not fit a slot take
+    the pickled path.
+
+    Args:
+        pending: Iterator of paths still to analyze
+        model_path: YOLO weights
+        options: Batch options
+        batch_size: Images per forward pass
+        workers: Scoring/rendering processes (0 scores in this process)
+        finish: Callback receiving every result dict
+    """
+    detect_batch = load_batch_detector(model_path, batch_size)
+    init_worker(model_path, options, load_model=False)
+    # Current batch, prefetched batch and the scoring window each hold a slot
+    ring = open_frame_ring(2 * batch_size + 2 * workers, options.get("shm_slot_mb")) if workers else None
+    pool = None
+    if workers:
+        pool = ProcessPoolExecutor(workers, initializer=init_worker,
+                                   initargs=(model_path, options, False, ring.spec() if ring else None))
+    in_flight = {}
+
+    def load(path):
+        """Decode a file, into a ring slot when one is free and large enough"""
+        result, img = read_file(path)
+        if ring is None or img is None or not ring.fits(img):
+            return result, img, None
+        slot = ring.acquire()
+        if slot is None:
+            return result, img, None
+        descriptor = ring.write(slot, img)
+        return result, ring.view(descriptor), descriptor
+
+    def release(descriptor):
+        if descriptor is not None:
+            ring.release(descriptor[0])
+
+    def collect(futures):
+        for future in futures:
+            release(in_flight.pop(future))
+            finish(future.result())
+
+    def submit(result, img, descriptor, boxes, elapsed):
+        if pool is None:
+            finish(score_file(result, img, boxes, elapsed))
+            return
+        if descriptor is not None:
+            future = pool.submit(score_shared, result, descriptor, boxes, elapsed)
+        else:
+            future = pool.submit(score_file, result, img, boxes, elapsed)
+        in_flight[future] = descriptor
+        if len(in_flight) >= workers * 2:
+            collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+
+    try:
+        with ThreadPoolExecutor(max(1, min(batch_size, os.cpu_count() or 1))) as decoder:
+            chunks = iter_chunks(pending, batch_size)
+            next_chunk = next(chunks, None)
+            decoding = [decoder.submit(load, path) for path in next_chunk or []]
+            while decoding:
+                start = time.perf_counter()
+                loaded = [future.result() for future in decoding]
+                decode_elapsed = (time.perf_counter() - start) / len(loaded)
+
+                # Prefetch the following batch while this one runs on the model
+                next_chunk = next(chunks, None)
+                decoding = [decoder.submit(load, path) for path in next_chunk or []]
+
+                readable = []
+                for result, img, descriptor in loaded:
+                    if img is None:
+                        finish(result)
+                    else:
+                        readable.append((result, img, descriptor))
+                if not readable:
+                    continue
+
+                done = 0
+                try:
+                    last = time.perf_counter()
+                    for boxes in detect_batch([img for _, img, _ in readable]):
+                        result, img, descriptor = readable[done]
+                        done += 1
+                        now = time.perf_counter()
+                        result["timings"]["inferenceMs"] = round((now - last) * 1000, 2)
+                        submit(result, img, descriptor, boxes, decode_elapsed + now - last)
+                        last = now
+                except Exception as e:
+                    error = str(e)
+                else:
+                    error = "No detection result"
+                # A failed forward pass (or a short result stream) fails the rest of the batch
+                for result, _, descriptor in readable[done:]:
+                    release(descriptor)
+                    result["error"] = error
+                    finish(result)
+                del loaded, readable, img
+
+        collect(wait(in_flight).done)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if ring is not None:
+            ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable spine analysis of a directory tree")
+    parser.add_argument("input", help="Image directory (walked recursively) or a single image")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="YOLO weights")
+    parser.add_argument("--output", help="Report directory (no reports are rendered without it)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes (0 = run in this process)")
+    parser.add_argument("--manifest", help="SQLite manifest path")
+    parser.add_argument("--batch", type=int,
+                        help="Batched streaming inference with this many images per forward pass "
+                             "(the workers then only score and render)")
+    parser.add_argument("--shm-slot-mb", type=float, default=32,
+                        help="Shared memory slot size for handing batched images to the workers (0 = pickle them)")
+    parser.add_argument("--thresholds", choices=sorted(THRESHOLD_PRESETS), default="report")
+    parser.add_argument("--store", help="Detection store directory")
+    parser.add_argument("--format", choices=["jpg", "webp", "png"], default="jpg")
+    parser.add_argument("--quality", type=int, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--max-dim", type=int, help="Max film width/height of reports")
+    parser.add_argument("--thumbnail", type=int, help="Also write thumbnails of this max width/height")
+    parser.add_argument("--progressive", action="store_true", help="Progressive JPEG reports")
+    parser.add_argument("--summary", help="Per-study summary file, covering resumed runs too "
+                                          "(.parquet, .arrow, .csv or .jsonl)")
+    parser.add_argument("--summary-format", choices=sorted(batch_export.FORMATS),
+                        help="Summary format (from the extension by default)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        sys.exit(f"Input not found: {args.input}")
+    if not os.path.exists(args.model):
+        sys.exit(f"Model file not found: {args.model}")
+    if args.batch is not None and args.batch < 1:
+        sys.exit("--batch must be at least 1")
+
+    counts = run_batch(
+        args.input,
+        args.model,
+        {
+            "output": args.output,
+            "format": args.format,
+            "quality": args.quality,
+            "max_dim": args.max_dim,
+            "thumbnail": args.thumbnail,
+            "progressive": args.progressive,
+            "thresholds": args.thresholds,
+            "store_dir": args.store,
+            "summary": args.summary,
+            "summary_format": args.summary_format,
+            "shm_slot_mb": args.shm_slot_mb,
+        },
+        workers=args.workers,
+        manifest_path=args.manifest,
+        batch_size=args.batch
+    )
+    print(f"✅ Batch complete: {json.dumps(counts)}")
+    sys.exit(1 if counts.get("failed") else 0)
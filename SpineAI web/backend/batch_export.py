@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Batch Export
+Streams one flat summary record per analyzed study into a columnar file
+(Parquet or Arrow IPC) or CSV/JSONL, so cohort statistics never need a
+re-run. Records land in per-run part files as results arrive and the
+summary file is rebuilt from all of them when a run ends, so resumed and
+crashed runs never lose earlier records.
+
+Usage (rebuild a summary after a killed run):
+    python batch_export.py <summary_path> [--format parquet]
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+    pq = None
+
+
+# Output format -> file extension
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv", "jsonl": ".jsonl"}
+
+# Records per Parquet row group / Arrow record batch / CSV write
+ROW_GROUP_SIZE = 1024
+
+# Column name -> type, in file order (narrow types keep 100k-study files small)
+SCHEMA = [
+    ("file", "string"),
+    ("status", "category"),
+    ("detectionKey", "string"),
+    ("modelHash", "category"),
+    ("imageType", "category"),
+    ("vertebrae", "int16"),
+    ("cobbAngle", "float32"),
+    ("upperVertebra", "int16"),
+    ("lowerVertebra", "int16"),
+    ("compressionFracture", "int16"),
+    ("herniatedDisc", "int16"),
+    ("listhesis", "int16"),
+    ("decodeMs", "float32"),
+    ("inferenceMs", "float32"),
+    ("geometryMs", "float32"),
+    ("renderMs", "float32"),
+    ("encodeMs", "float32"),
+    ("totalMs", "float32"),
+    ("error", "string"),
+]
+
+COLUMNS = [name for name, _ in SCHEMA]
+
+# Finding counter (API key) -> column
+FINDING_COLUMNS = {
+    "compression_fracture": "compressionFracture",
+    "herniated_disc": "herniatedDisc",
+    "listhesis": "listhesis",
+}
+
+TIMING_COLUMNS = ("decodeMs", "inferenceMs", "geometryMs", "renderMs", "encodeMs")
+
+
+def normalize_format(fmt):
+    """
+    Canonical summary format
+
+    Args:
+        fmt: "parquet", "arrow", "csv" or "jsonl" (a leading dot is ignored)
+
+    Returns:
+        Format name
+    """
+    fmt = fmt.lower().lstrip(".")
+    fmt = {"pq": "parquet", "feather": "arrow", "ipc": "arrow", "ndjson": "jsonl"}.get(fmt, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported summary format: {fmt}")
+    return fmt
+
+
+def summary_record(result):
+    """
+    Flatten one batch result into a summary row
+
+    Args:
+        result: Result dict of batch_analysis (manifest fields, "timings",
+            "limitVertebrae", "vertebrae", "modelHash")
+
+    Returns:
+        Dict with every column of SCHEMA (None where not applicable)
+    """
+    record = dict.fromkeys(COLUMNS)
+    record.update({
+        "file": result["path"],
+        "status": result["status"],
+        "detectionKey": result.get("detectionKey"),
+        "modelHash": result.get("modelHash"),
+        "imageType": result.get("imageType"),
+        "vertebrae": result.get("vertebrae"),
+        "cobbAngle": result.get("cobbAngle"),
+        "totalMs": result.get("elapsedMs"),
+        "error": result.get("error"),
+    })
+    if result.get("limitVertebrae"):
+        record["upperVertebra"], record["lowerVertebra"] = result["limitVertebrae"]
+    for key, column in FINDING_COLUMNS.items():
+        if result.get("findings"):
+            record[column] = result["findings"][key]
+    timings = result.get("timings") or {}
+    for column in TIMING_COLUMNS:
+        record[column] = timings.get(column)
+    return record
+
+
+def arrow_schema(fmt="parquet"):
+    """
+    pyarrow schema of the summary columns
+
+    Arrow IPC files cannot replace a dictionary between record batches, so
+    category columns are dictionary-encoded in Parquet only.
+    """
+    types = {
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()) if fmt == "parquet" else pa.string(),
+        "int16": pa.int16(),
+        "float32": pa.float32(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in SCHEMA])
+
+
+def require_format(fmt):
+    """Raise if the libraries of a summary format are missing"""
+    if fmt in ("parquet", "arrow") and not PYARROW_AVAILABLE:
+        raise RuntimeError(f"pyarrow is required for {fmt} summaries (pip install pyarrow)")
+
+
+class _SummaryFile:
+    """Writes flat summary records to one file, a row group at a time"""
+
+    def __init__(self, path, fmt, row_group_size=ROW_GROUP_SIZE):
+        self.path = path
+        self.format = fmt
+        self.row_group_size = row_group_size
+        self.rows = []
+        if fmt == "parquet":
+            self.schema = arrow_schema(fmt)
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        elif fmt == "arrow":
+            self.schema = arrow_schema(fmt)
+            self._writer = pa.ipc.new_file(path, self.schema)
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+            if fmt == "csv":
+                self._writer = csv.DictWriter(self._file, COLUMNS)
+                self._writer.writeheader()
+
+    def write(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.format in ("parquet", "arrow"):
+            self._writer.write_batch(pa.RecordBatch.from_pylist(self.rows, schema=self.schema))
+        elif self.format == "csv":
+            self._writer.writerows(self.rows)
+        else:
+            self._file.write("".join(json.dumps(row) + "\n" for row in self.rows))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.format in ("parquet", "arrow"):
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+def parts_dir(path):
+    """Directory of the per-run part files of a summary"""
+    return path + ".parts"
+
+
+def read_parts(path):
+    """
+    Summary records of every run so far, one per file
+
+    Args:
+        path: Summary file
+
+    Returns:
+        Records in first-analyzed order; a file analyzed again (a changed
+        image, or one redone after a crash) keeps its latest record
+    """
+    records = {}
+    directory = parts_dir(path)
+    if not os.path.isdir(directory):
+        return []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Torn last line of a crashed run
+                    break
+                record = json.loads(line)
+                records[record["file"]] = record
+    return list(records.values())
+
+
+def rebuild_summary(path, fmt=None, row_group_size=ROW_GROUP_SIZE):
+    """
+    Write the summary file from the part files of all runs
+
+    The file is written next to the target and renamed over it, so readers
+    never see a partial Parquet/Arrow file. Also usable on its own after a
+    run was killed before it could finalize.
+
+    Args:
+        path: Summary file
+        fmt: Summary format (from the file extension if None)
+        row_group_size: Records per row group
+
+    Returns:
+        Number of records in the summary
+    """
+    fmt = normalize_format(fmt or os.path.splitext(path)[1])
+    require_format(fmt)
+    records = read_parts(path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    target = _SummaryFile(temp_path, fmt, row_group_size)
+    try:
+        for record in records:
+            target.write(record)
+        target.close()
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(records)
+
+
+class SummaryWriter:
+    """
+    Streaming writer of batch summary records
+
+    Each run appends its records to its own JSONL part file next to the
+    summary (``<summary>.parts/``), flushed per record, so a crashed run
+    loses nothing and a resumed run, which skips finished files, keeps the
+    records of earlier runs. close() rebuilds the summary file from all
+    parts; Parquet and Arrow files are only ever replaced complete.
+    """
+
+    def __init__(self, path, fmt=None, row_group_size=ROW_GROUP_SIZE):
+        """
+        Start the part file of a new run
+
+        Args:
+            path: Summary file
+            fmt: Summary format (from the file extension if None)
+            row_group_size: Records per row group of the summary file
+        """
+        self.path = path
+        self.format = normalize_format(fmt or os.path.splitext(path)[1])
+        self.row_group_size = row_group_size
+        self.count = 0
+        self.total = None
+
+        require_format(self.format)
+
+        os.makedirs(parts_dir(path), exist_ok=True)
+        # Sortable by start time, so later runs win for files analyzed again
+        self.part_path = os.path.join(parts_dir(path), f"{time.time_ns():020d}-{os.getpid()}.jsonl")
+        self._part = open(self.part_path, "a", encoding="utf-8")
+
+    def write(self, result):
+        """Add the record of one batch result"""
+        self._part.write(json.dumps(summary_record(result)) + "\n")
+        self._part.flush()
+        self.count += 1
+
+    def close(self):
+        """Finish the part file and rebuild the summary from all runs"""
+        if self._part.closed:
+            return
+        self._part.close()
+        self.total = rebuild_summary(self.path, self.format, self.row_group_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_summary(path, fmt=None):
+    """
+    Load a summary file
+
+    Args:
+        path: Summary file
+        fmt: Summary format (from the file extension if None)
+
+    Returns:
+        pyarrow.Table for Parquet/Arrow, list of record dicts for CSV/JSONL
+    """
+    fmt = normalize_format(fmt or os.path.splitext(path)[1])
+    if fmt == "parquet":
+        return pq.read_table(path)
+    if fmt == "arrow":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            return [json.loads(line) for line in f]
+        return list(csv.DictReader(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild a batch summary from its per-run part files")
+    parser.add_argument("summary", help="Summary file (.parquet, .arrow, .csv or .jsonl)")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="Summary format (from the extension by default)")
+    args = parser.parse_args()
+
+    count = rebuild_summary(args.summary, args.format)
+    print(f"📑 {count} summary records: {args.summary}")
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Raw Detection Store
+Append-only binary store of post-NMS detections so geometry can be re-run
+without inference
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+import spine_geometry
+
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "SPINEAI_DETECTION_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "detections")
+)
+
+# [x1, y1, x2, y2, conf, class]; float32 keeps pixel-exact centers on large
+# films (float16 loses whole pixels above 2048 px)
+ROW_WIDTH = 6
+ROW_DTYPE = np.float32
+ROW_BYTES = ROW_WIDTH * np.dtype(ROW_DTYPE).itemsize
+
+_model_hash_cache = {}
+
+
+def model_hash(model_path):
+    """
+    Short content hash of a model file
+
+    Args:
+        model_path: Path to the weights (.pt / .onnx)
+
+    Returns:
+        First 16 hex characters of the SHA-256 digest
+    """
+    stat = os.stat(model_path)
+    cache_key = (os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _model_hash_cache:
+        digest = hashlib.sha256()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _model_hash_cache[cache_key] = digest.hexdigest()[:16]
+    return _model_hash_cache[cache_key]
+
+
+def append_all(path, payload):
+    """
+    Append a whole buffer to a file
+
+    os.write may write less than asked; the rest is written in further
+    calls, which must land directly behind the first part.
+
+    Args:
+        path: File to append to (created if missing)
+        payload: Bytes to append
+
+    Returns:
+        Byte offset at which the buffer starts
+
+    Raises:
+        OSError: If the write stalls or another writer's bytes landed
+            between two parts of the buffer
+    """
+    view = memoryview(payload)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        written = os.write(fd, view)
+        end = os.lseek(fd, 0, os.SEEK_CUR)
+        offset = end - written
+        while written < len(view):
+            count = os.write(fd, view[written:])
+            if count == 0:
+                raise OSError(f"Append to {path} stalled after {written} of {len(view)} bytes")
+            position = os.lseek(fd, 0, os.SEEK_CUR)
+            if position - count != end:
+                raise OSError(f"Append to {path} was interleaved with another writer at byte {end}")
+            written += count
+            end = position
+    finally:
+        os.close(fd)
+    return offset
+
+
+def detection_key(upload_id, model_id):
+    """Store key of one study scored by one model"""
+    return f"{upload_id}:{model_id}"
+
+
+class DetectionStore:
+    """
+    Append-only detection store
+
+    ``detections.bin`` holds raw float32 rows back to back and
+    ``index.jsonl`` holds one record per study with its byte offset. Both
+    files are only ever appended with O_APPEND writes, so concurrent
+    analyzer processes can share a store without locking; the latest
+    record for a key wins.
+
+    Appending never reads the index. It is parsed on the first read and
+    then only the records appended since, so a long-lived process should
+    keep one store open rather than reopen it per study.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        """
+        Open (or create) a store
+
+        Args:
+            store_dir: Directory holding detections.bin and index.jsonl
+        """
+        self.store_dir = store_dir
+        self.data_path = os.path.join(store_dir, "detections.bin")
+        self.index_path = os.path.join(store_dir, "index.jsonl")
+        os.makedirs(store_dir, exist_ok=True)
+
+        self._index = {}
+        self._index_pos = 0
+        self._index_lock = threading.Lock()
+
+    def _refresh_index(self):
+        """Read index records appended since the last refresh"""
+        if not os.path.exists(self.index_path):
+            return
+        with self._index_lock, open(self.index_path, "rb") as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Record still being written by another process
+                    break
+                record = json.loads(line)
+                self._index[record["key"]] = record
+                self._index_pos += len(line)
+
+    def __len__(self):
+        self._refresh_index()
+        return len(self._index)
+
+    def __contains__(self, key):
+        self._refresh_index()
+        return key in self._index
+
+    def keys(self):
+        """Keys in first-stored order"""
+        self._refresh_index()
+        return list(self._index)
+
+    def append(self, upload_id, model_id, boxes, image_size=None):
+        """
+        Persist the detections of one study
+
+        Args:
+            upload_id: Upload file name (or any stable study id)
+            model_id: Model hash from model_hash()
+            boxes: (N, >=4) post-NMS detections as returned by the detector
+            image_size: Optional (width, height) of the analyzed image
+
+        Returns:
+            Store key of the study
+
+        Raises:
+            ValueError: If detections.bin holds a partial row
+        """
+        rows = np.zeros((len(boxes), ROW_WIDTH), dtype=ROW_DTYPE)
+        if len(boxes):
+            boxes = np.asarray(boxes)
+            rows[:, :min(boxes.shape[1], ROW_WIDTH)] = boxes[:, :ROW_WIDTH]
+
+        offset = append_all(self.data_path, rows.tobytes())
+        if offset % ROW_BYTES:
+            # A torn write left a partial row behind; row indices past it
+            # would point into the middle of rows
+            raise ValueError(f"{self.data_path} is not row aligned at byte {offset}")
+
+        key = detection_key(upload_id, model_id)
+        record = {
+            "key": key,
+            "upload": upload_id,
+            "model": model_id,
+            "offset": offset,
+            "count": len(rows),
+            "size": list(image_size) if image_size is not None else None
+        }
+        append_all(self.index_path, (json.dumps(record) + "\n").encode("utf-8"))
+
+        return key
+
+    def copy(self, key, upload_id):
+        """
+        Store the detections of a study again under another upload
+
+        Args:
+            key: Store key of the stored study
+            upload_id: Upload the detections now belong to
+
+        Returns:
+            Store key of the copy, or None if the key is unknown
+        """
+        record = self.record(key)
+        if record is None:
+            return None
+        if record["upload"] == upload_id:
+            return key
+        return self.append(upload_id, record["model"], self.load(key), record["size"])
+
+    def record(self, key):
+        """Index record of a stored study, or None"""
+        self._refresh_index()
+        return self._index.get(key)
+
+    def load(self, key):
+        """
+        Load the detections of one study
+
+        Args:
+            key: Store key
+
+        Returns:
+            (N, 6) float32 array, or None if the key is unknown
+        """
+        record = self.record(key)
+        if record is None:
+            return None
+        return np.fromfile(
+            self.data_path, dtype=ROW_DTYPE,
+            count=record["count"] * ROW_WIDTH, offset=record["offset"]
+        ).reshape(-1, ROW_WIDTH)
+
+    def load_batch(self, keys=None):
+        """
+        Load many studies as concatenated rows plus offsets
+
+        Args:
+            keys: Keys to load (all stored studies by default)
+
+        Returns:
+            (keys, boxes, offsets) ready for spine_geometry.analyze_batch
+        """
+        self._refresh_index()
+        keys = list(self._index) if keys is None else list(keys)
+        records = [self._index[k] for k in keys]
+
+        counts = np.array([r["count"] for r in records], dtype=np.int64)
+        starts = np.array([r["offset"] // ROW_BYTES for r in records], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        if offsets[-1] == 0:
+            return keys, np.empty((0, ROW_WIDTH), dtype=ROW_DTYPE), offsets
+
+        data = np.memmap(self.data_path, dtype=ROW_DTYPE, mode="r").reshape(-1, ROW_WIDTH)
+        rows = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return keys, np.asarray(data[rows]), offsets
+
+    def rescore(self, thresholds=None, keys=None):
+        """
+        Re-run the geometry stage over stored detections
+
+        Args:
+            thresholds: Rule thresholds (defaults to DEFAULT_THRESHOLDS)
+            keys: Keys to score (all stored studies by default)
+
+        Returns:
+            (keys, BatchGeometry)
+        """
+        keys, boxes, offsets = self.load_batch(keys)
+        return keys, spine_geometry.analyze_batch(boxes, offsets, thresholds)
+
+
+_default_store = None
+
+
+def default_store():
+    """Process-wide store in DEFAULT_STORE_DIR (its index is parsed once, on first read)"""
+    global _default_store
+    if _default_store is None:
+        _default_store = DetectionStore()
+    return _default_store
+
+
+if __name__ == "__main__":
+    # Re-score every stored study and print one JSON line per study
+    presets = {"default": spine_geometry.DEFAULT_THRESHOLDS, "report": spine_geometry.REPORT_THRESHOLDS}
+    if len(sys.argv) > 3 or (len(sys.argv) > 2 and sys.argv[2] not in presets):
+        print("Usage: python detection_store.py [store_dir] [default|report]")
+        sys.exit(1)
+
+    store = DetectionStore(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_STORE_DIR)
+    keys, result = store.rescore(presets[sys.argv[2] if len(sys.argv) > 2 else "default"])
+
+    for s, key in enumerate(keys):
+        print(json.dumps({
+            "key": key,
+            "imageType": str(result.image_type[s]),
+            "cobbAngle": round(float(result.cobb_angle[s]), 2),
+            "findings": {k: int(v[s]) for k, v in result.findings.items()}
+        }))
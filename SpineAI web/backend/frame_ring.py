@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Frame Ring
+Fixed-size slots in one shared memory block for handing decoded or encoded
+frames between processes: the producer copies a frame into a free slot
+once, only a small descriptor (slot, shape, dtype) travels over the
+control channel, and the consumer maps the slot as a numpy array without
+copying it.
+
+Slot bookkeeping (acquire/release) lives in the process that created the
+ring; consumers only attach and read. The Node server creates the rings of
+its long-lived workers itself (a file in /dev/shm, see frameRing.js) and
+passes their spec on the command line as name:slots:slot_bytes.
+"""
+
+import queue
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class FrameRing:
+    """Shared memory block of `slots` frames of up to `slot_bytes` each"""
+
+    def __init__(self, slots, slot_bytes, name=None, track=True):
+        """
+        Args:
+            slots: Number of slots
+            slot_bytes: Capacity of one slot
+            name: Attach to an existing ring of this name instead of creating one
+            track: Let Python's resource tracker unlink an attached ring when
+                this process exits; off for rings another program owns
+        """
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        elif track:
+            self.shm = shared_memory.SharedMemory(name=name)
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.free = queue.SimpleQueue()
+        if self.owner:
+            for slot in range(slots):
+                self.free.put(slot)
+
+    @classmethod
+    def attach(cls, spec, track=True):
+        """Attach to a ring from its spec() in another process"""
+        name, slots, slot_bytes = spec
+        return cls(slots, slot_bytes, name=name, track=track)
+
+    def spec(self):
+        """Picklable (name, slots, slot_bytes) for attach()"""
+        return self.shm.name, self.slots, self.slot_bytes
+
+    def fits(self, frame):
+        return frame.nbytes <= self.slot_bytes
+
+    def acquire(self, block=False):
+        """
+        Take a free slot (owner only)
+
+        Args:
+            block: Wait for a slot instead of returning None when all are taken
+
+        Returns:
+            Slot index, or None
+        """
+        try:
+            return self.free.get(block=block)
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        """Return a slot once its consumer is done with it (owner only)"""
+        self.free.put(slot)
+
+    def view(self, descriptor):
+        """
+        Array over a slot (no copy; valid until the slot is released)
+
+        Args:
+            descriptor: (slot, shape, dtype string) from write()
+
+        Returns:
+            numpy array backed by the shared block
+        """
+        slot, shape, dtype = descriptor
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def payload(self, frame):
+        """
+        Bytes of an encoded frame another program wrote into a slot
+
+        Args:
+            frame: {"slot", "bytes"} descriptor from the request header
+
+        Returns:
+            uint8 array backed by the shared block (no copy)
+        """
+        if not 0 <= frame["slot"] < self.slots or not 0 <= frame["bytes"] <= self.slot_bytes:
+            raise ValueError(f"Frame descriptor outside the ring: {frame}")
+        return self.view((frame["slot"], (frame["bytes"],), "|u1"))
+
+    def write(self, slot, frame):
+        """
+        Copy a frame into a slot
+
+        Args:
+            slot: Slot from acquire()
+            frame: numpy array (decoded image) or bytes (encoded image)
+
+        Returns:
+            Descriptor for view()
+
+        Raises:
+            ValueError: If the frame is larger than a slot
+        """
+        frame = np.frombuffer(frame, np.uint8) if isinstance(frame, (bytes, bytearray, memoryview)) else frame
+        if not self.fits(frame):
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.slot_bytes} byte slot")
+        descriptor = (slot, frame.shape, frame.dtype.str)
+        self.view(descriptor)[...] = frame
+        return descriptor
+
+    def close(self):
+        """Detach; the owner also frees the block"""
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views still alive (e.g. held by a predictor); the mapping goes with them
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ring_spec(text):
+    """Parse a name:slots:slot_bytes command line spec for FrameRing.attach()"""
+    name, slots, slot_bytes = text.rsplit(":", 2)
+    return name, int(slots), int(slot_bytes)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Image Gate
+Cheap pre-inference check of an upload: a small thumbnail is classified as
+radiograph, photo or unusable from colour saturation, histogram shape,
+blur, exposure and aspect ratio, so misdirected or garbage uploads are
+routed or rejected before a full forward pass
+
+Usage:
+    python image_gate.py <image_path>
+"""
+
+import json
+import sys
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+THUMB_SIZE = 128               # Colour, exposure and histogram statistics
+DETAIL_SIZE = 512              # Blur is measured on this (nearest-neighbour) downscale
+
+# Share of thumbnail pixels with visible colour (max - min channel > COLOR_CHROMA);
+# radiographs are grayscale up to compression noise and small burned-in markers
+COLOR_CHROMA = 20
+PHOTO_COLOR_SHARE = 0.25
+
+MIN_SIDE = 128                 # Smaller uploads cannot hold a readable spine
+MAX_ASPECT = 4.0               # Long side / short side (panoramas, strips, banners)
+DARK_MEAN, BRIGHT_MEAN = 20, 235
+MAX_CLIPPED_SHARE = 0.85       # Share of pixels at 0-4 or 251-255
+MIN_CONTRAST = 8.0             # Gray level standard deviation
+MIN_ENTROPY = 3.0              # Bits; near-binary images (documents, screenshots)
+MIN_SHARPNESS = 5.0            # Variance of the Laplacian of the detail image
+
+GateResult = namedtuple("GateResult", ["kind", "reason", "signals"])
+
+
+def downscale(img, size, interpolation=cv2.INTER_AREA):
+    """Downscale so the longer side is at most size (never upscales)"""
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return img
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, target, interpolation=interpolation)
+
+
+def image_signals(img):
+    """
+    Gate signals of a decoded image
+
+    Args:
+        img: BGR (or grayscale) image at full size
+
+    Returns:
+        Dict of width, height, aspect, colorShare, mean, contrast,
+        clippedShare, entropy and sharpness
+    """
+    height, width = img.shape[:2]
+    # Nearest-neighbour subsampling keeps pixel-level sharpness and the original
+    # gray levels, both of which area averaging would smooth away
+    detail = downscale(img, DETAIL_SIZE, cv2.INTER_NEAREST)
+    thumb = downscale(detail, THUMB_SIZE, cv2.INTER_NEAREST)
+    if img.ndim == 3:
+        chroma = thumb.max(axis=2).astype(np.int16) - thumb.min(axis=2)
+        color_share = float((chroma > COLOR_CHROMA).mean())
+        detail_gray = cv2.cvtColor(detail, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    else:
+        color_share = 0.0
+        detail_gray, gray = detail, thumb
+
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    hist /= hist.sum()
+    nonzero = hist[hist > 0]
+    return {
+        "width": int(width),
+        "height": int(height),
+        "aspect": round(max(width, height) / max(1, min(width, height)), 3),
+        "colorShare": round(color_share, 4),
+        "mean": round(float(gray.mean()), 2),
+        "contrast": round(float(gray.std()), 2),
+        "clippedShare": round(float(hist[:5].sum() + hist[251:].sum()), 4),
+        "entropy": round(float(-(nonzero * np.log2(nonzero)).sum()), 3),
+        "sharpness": round(float(cv2.Laplacian(detail_gray, cv2.CV_32F).var()), 2),
+    }
+
+
+def classify_signals(signals):
+    """
+    Classify gate signals
+
+    Returns:
+        (kind, reason): kind is "radiograph", "photo" or "unusable"; reason
+        explains an unusable verdict (None otherwise)
+    """
+    if min(signals["width"], signals["height"]) < MIN_SIDE:
+        return "unusable", f"Image too small ({signals['width']}x{signals['height']})"
+    if signals["aspect"] > MAX_ASPECT:
+        return "unusable", f"Unusual aspect ratio ({signals['aspect']:.1f}:1)"
+    if signals["mean"] < DARK_MEAN or (signals["clippedShare"] > MAX_CLIPPED_SHARE and signals["mean"] < 128):
+        return "unusable", "Image is underexposed (too dark)"
+    if signals["mean"] > BRIGHT_MEAN or signals["clippedShare"] > MAX_CLIPPED_SHARE:
+        return "unusable", "Image is overexposed (too bright)"
+    if signals["contrast"] < MIN_CONTRAST:
+        return "unusable", "Image has no contrast (blank)"
+    if signals["entropy"] < MIN_ENTROPY:
+        return "unusable", "Image has too few gray levels (document or screenshot)"
+    if signals["sharpness"] < MIN_SHARPNESS:
+        return "unusable", "Image is too blurry"
+    if signals["colorShare"] > PHOTO_COLOR_SHARE:
+        return "photo", None
+    return "radiograph", None
+
+
+def classify_image(img):
+    """
+    Gate a decoded upload
+
+    Args:
+        img: BGR image
+
+    Returns:
+        GateResult(kind, reason, signals); signals include the gate time (gateMs)
+    """
+    start = time.perf_counter()
+    signals = image_signals(img)
+    kind, reason = classify_signals(signals)
+    signals["gateMs"] = round((time.perf_counter() - start) * 1000, 3)
+    return GateResult(kind, reason, signals)
+
+
+def gate_dict(gate):
+    """JSON form of a GateResult"""
+    return {"kind": gate.kind, "reason": gate.reason, "signals": gate.signals}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(json.dumps({"success": False, "error": "Usage: python image_gate.py <image_path>"}))
+        sys.exit(1)
+
+    image = cv2.imread(sys.argv[1], cv2.IMREAD_COLOR)
+    if image is None:
+        print(json.dumps({"success": False, "error": f"Image could not be read: {sys.argv[1]}"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, **gate_dict(classify_image(image))}))
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Perceptual Hash Index
+Near-duplicate lookup of previously analyzed images (recompressed copies,
+re-photos) so their stored detections can be reused instead of inference
+
+Spine films all share the same coarse structure, so a close dHash only
+nominates candidates; a match is reused only if a stored thumbnail of the
+candidate correlates with the new image as well.
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from detection_store import DEFAULT_STORE_DIR, append_all
+
+
+HASH_BITS = 64
+
+# Max Hamming distance between dHashes of the same film. Distinct radiographs
+# of the training batches come as close as 6 bits; recompressed and resized
+# copies mostly stay within 4
+MAX_DISTANCE = 4
+
+# Verification thumbnail side and the min Pearson correlation of a match
+# (distinct training films reach 0.92, recompressed/resized copies >= 0.98)
+THUMB_SIDE = 32
+MIN_CORRELATION = 0.97
+
+# Aspect ratios further apart than this are not treated as the same film
+MAX_ASPECT_DIFF = 0.03
+
+# Compact hash entries, scanned whole when the band tables are built; the
+# keys and thumbnails of candidates are read from the record file on demand
+ENTRY_DTYPE = np.dtype([
+    ("hash", "<u8"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    ("record", "<u8"),
+])
+
+KEY_BYTES = 112
+
+RECORD_DTYPE = np.dtype([
+    ("key", f"S{KEY_BYTES}"),
+    ("thumb", "u1", (THUMB_SIDE, THUMB_SIDE)),
+])
+
+# Hashes and thumbnails live in separate files since these names; the older
+# phash.bin / phash_v2.bin are ignored and the index refills as uploads arrive
+HASH_FILE = "phash_v3.idx"
+RECORD_FILE = "phash_v3.bin"
+
+# New entries are scanned linearly until this many have collected, then
+# merged into the sorted band tables
+DELTA_LIMIT = 4096
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(gray):
+    """
+    64-bit difference hash of a grayscale image
+
+    Args:
+        gray: 2D uint8 image
+
+    Returns:
+        Hash as a Python int
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def thumbnail(gray):
+    """Verification thumbnail of a grayscale image (THUMB_SIDE square, uint8)"""
+    return cv2.resize(gray, (THUMB_SIDE, THUMB_SIDE), interpolation=cv2.INTER_AREA)
+
+
+def correlation(thumbs, thumb):
+    """Pearson correlations between (N, side, side) thumbnails and one thumbnail"""
+    a = np.asarray(thumbs, dtype=np.float32).reshape(len(thumbs), -1)
+    b = np.asarray(thumb, dtype=np.float32).ravel()
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean()
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b)
+    return np.where(norms > 0, a @ b / np.maximum(norms, 1e-6), 0.0)
+
+
+def hamming(hashes, value):
+    """Hamming distances between a uint64 array and one hash"""
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value))
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def _flip_masks(bits, radius):
+    """All masks of ``bits`` width with at most ``radius`` bits set"""
+    masks = [0]
+    for _ in range(radius):
+        masks = sorted({m | (1 << b) for m in masks for b in range(bits)} | set(masks))
+    return np.array(masks, dtype=np.uint64)
+
+
+class PerceptualHashIndex:
+    """
+    Multi-index hashing over dHashes
+
+    The 64-bit hash is split into ``bands`` substrings. By the pigeonhole
+    principle two hashes within MAX_DISTANCE differ in at most
+    MAX_DISTANCE // bands bits of some band, so a lookup only probes each
+    band's sorted table for its value and its few bit flips, then checks
+    the candidates' full distance, and the survivors' thumbnails are
+    correlated with the new image.
+
+    Hashes are appended to a compact entry file and keys plus thumbnails
+    to a record file next to the detection store. Entries added since the
+    tables were built (by this or another process) form a delta that is
+    compared linearly; once it passes DELTA_LIMIT it is merged into the
+    sorted tables, so no add ever re-sorts the whole index. One instance
+    per process keeps the tables across lookups.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, max_distance=MAX_DISTANCE, bands=4, delta_limit=DELTA_LIMIT):
+        """
+        Open (or create) an index
+
+        Args:
+            store_dir: Directory holding the index files
+            max_distance: Max Hamming distance of a near duplicate
+            bands: Number of hash substrings (must divide 64)
+            delta_limit: Unsorted entries tolerated before a merge
+        """
+        self.hash_path = os.path.join(store_dir, HASH_FILE)
+        self.record_path = os.path.join(store_dir, RECORD_FILE)
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = HASH_BITS // bands
+        self.delta_limit = delta_limit
+        self.flips = _flip_masks(self.band_bits, max_distance // bands)
+        self._band_dtype = np.min_scalar_type((1 << self.band_bits) - 1)
+        os.makedirs(store_dir, exist_ok=True)
+
+        # (entries, sorted count, band tables), swapped whole so readers on
+        # other threads always see a consistent triple
+        self._state = (np.empty(0, dtype=ENTRY_DTYPE), 0, [
+            (np.empty(0, dtype=self._band_dtype), np.empty(0, dtype=np.int64)) for _ in range(bands)
+        ])
+        self._records = np.empty(0, dtype=RECORD_DTYPE)
+        self._lock = threading.Lock()
+
+    def _band_values(self, hashes, band):
+        band_mask = np.uint64((1 << self.band_bits) - 1)
+        return ((hashes >> np.uint64(band * self.band_bits)) & band_mask).astype(self._band_dtype)
+
+    def _load(self):
+        """
+        Map newly appended entries and merge the delta once it is large
+
+        Returns:
+            Current (entries, sorted count, band tables)
+        """
+        size = os.path.getsize(self.hash_path) if os.path.exists(self.hash_path) else 0
+        if size // ENTRY_DTYPE.itemsize == len(self._state[0]):
+            return self._state
+
+        with self._lock:
+            entries, sorted_count, tables = self._state
+            count = size // ENTRY_DTYPE.itemsize
+            if count > len(entries):
+                entries = np.memmap(self.hash_path, dtype=ENTRY_DTYPE, mode="r", shape=(count,))
+
+            if count - sorted_count > self.delta_limit:
+                hashes = np.asarray(entries["hash"][sorted_count:])
+                merged = []
+                for b, (values, order) in enumerate(tables):
+                    new_values = self._band_values(hashes, b)
+                    # Radix sort on the narrow band dtype, then one insert pass
+                    new_order = np.argsort(new_values, kind="stable")
+                    new_values = new_values[new_order]
+                    at = np.searchsorted(values, new_values, side="right")
+                    merged.append((np.insert(values, at, new_values), np.insert(order, at, new_order + sorted_count)))
+                tables, sorted_count = merged, count
+
+            self._state = (entries, sorted_count, tables)
+            return self._state
+
+    def _record_rows(self, ids):
+        """Records (key, thumb) at the given record numbers"""
+        if len(ids) and ids.max() >= len(self._records):
+            count = os.path.getsize(self.record_path) // RECORD_DTYPE.itemsize
+            self._records = np.memmap(self.record_path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+        return self._records[ids]
+
+    def __len__(self):
+        return len(self._load()[0])
+
+    def add(self, hash_value, thumb, key, image_size):
+        """
+        Record an analyzed image
+
+        Args:
+            hash_value: dHash of the image
+            thumb: thumbnail() of the image
+            key: Detection store key of its detections
+            image_size: (width, height) of the image
+
+        Raises:
+            ValueError: If the key does not fit KEY_BYTES
+        """
+        encoded = key.encode("utf-8")
+        if len(encoded) > KEY_BYTES:
+            raise ValueError(f"Detection key longer than {KEY_BYTES} bytes: {key}")
+
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["key"] = encoded
+        record["thumb"] = thumb
+        offset = append_all(self.record_path, record.tobytes())
+        if offset % RECORD_DTYPE.itemsize:
+            raise ValueError(f"{self.record_path} is not record aligned at byte {offset}")
+
+        # The entry goes in last, so it never points at a missing record
+        entry = np.zeros(1, dtype=ENTRY_DTYPE)
+        entry["hash"] = hash_value
+        entry["width"], entry["height"] = image_size
+        entry["record"] = offset // RECORD_DTYPE.itemsize
+        offset = append_all(self.hash_path, entry.tobytes())
+        if offset % ENTRY_DTYPE.itemsize:
+            raise ValueError(f"{self.hash_path} is not entry aligned at byte {offset}")
+
+    def candidates(self, hash_value):
+        """Entry indices sharing a near-exact band with the hash, plus the unsorted delta"""
+        entries, sorted_count, tables = self._load()
+
+        found = [np.arange(sorted_count, len(entries), dtype=np.int64)]
+        for b, (values, order) in enumerate(tables):
+            probe = self._band_values(np.uint64(hash_value), b)
+            probes = np.bitwise_xor(self.flips, np.uint64(probe)).astype(self._band_dtype)
+            lo = np.searchsorted(values, probes, side="left")
+            hi = np.searchsorted(values, probes, side="right")
+            for start, stop in zip(lo[hi > lo], hi[hi > lo]):
+                found.append(order[start:stop])
+        return np.unique(np.concatenate(found))
+
+    def lookup(self, hash_value, thumb, image_size, model_id=None):
+        """
+        Find the closest verified near duplicate
+
+        Args:
+            hash_value: dHash of the new image
+            thumb: thumbnail() of the new image; candidates below
+                MIN_CORRELATION with it are never returned
+            image_size: (width, height) of the new image
+            model_id: Only match detections made by this model
+
+        Returns:
+            Dict with key, distance, correlation and size of the match, or None
+        """
+        ids = self.candidates(hash_value)
+        if not len(ids):
+            return None
+
+        entries = self._state[0][ids]
+        distance = hamming(entries["hash"], hash_value)
+        aspect = entries["width"] / np.maximum(entries["height"], 1)
+        new_aspect = image_size[0] / max(image_size[1], 1)
+        keep = (distance <= self.max_distance) & (np.abs(aspect / new_aspect - 1) <= MAX_ASPECT_DIFF)
+        if not keep.any():
+            return None
+
+        kept = np.flatnonzero(keep)
+        records = self._record_rows(entries["record"][kept].astype(np.int64))
+        if model_id is not None:
+            same_model = np.char.endswith(records["key"], f":{model_id}".encode("utf-8"))
+            kept, records = kept[same_model], records[same_model]
+            if not len(kept):
+                return None
+
+        similarity = correlation(records["thumb"], thumb)
+        verified = np.flatnonzero(similarity >= MIN_CORRELATION)
+        if not len(verified):
+            return None
+
+        # Closest hash first, best correlation among equals
+        pick = verified[np.lexsort((-similarity[verified], distance[kept[verified]]))[0]]
+        best = kept[pick]
+        return {
+            "key": records["key"][pick].decode("utf-8"),
+            "distance": int(distance[best]),
+            "correlation": round(float(similarity[pick]), 4),
+            "size": (int(entries["width"][best]), int(entries["height"][best]))
+        }
+
+
+def remap_boxes(boxes, from_size, to_size):
+    """
+    Scale detections of one image onto a resized copy
+
+    Args:
+        boxes: (N, >=4) detections in ``from_size`` pixels
+        from_size: (width, height) the boxes were detected on
+        to_size: (width, height) of the new image
+
+    Returns:
+        Scaled copy of the boxes
+    """
+    boxes = np.array(boxes, dtype=np.float32, copy=True)
+    sx = to_size[0] / from_size[0]
+    sy = to_size[1] / from_size[1]
+    boxes[:, [0, 2]] *= sx
+    boxes[:, [1, 3]] *= sy
+    return boxes
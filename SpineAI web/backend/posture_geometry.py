@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Posture Geometry Engine
+Head and back posture verdicts from COCO pose keypoints, vectorized over
+frames so single images, live streams and whole videos share one rule set
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+# COCO keypoint indices
+NOSE = 0
+EARS = (3, 4)
+SHOULDERS = (5, 6)
+HIPS = (11, 12)
+
+# Forward head when the ear is ahead of the shoulder by this share of the torso height
+HEAD_FORWARD_RATIO = 0.15
+HEAD_BACKWARD_RATIO = 0.10
+
+# Kyphosis when the shoulder is ahead of the hip by this share of the torso height
+KYPHOSIS_RATIO = 0.12
+
+# Assumed average torso height for the centimeter estimates
+TORSO_CM = 50
+
+
+PostureMeasurements = namedtuple(
+    "PostureMeasurements",
+    ["direction", "torso_height", "head_deviation", "shoulder_deviation", "ear", "shoulder", "hip"]
+)
+
+
+def posture_measurements(kpts):
+    """
+    Direction, torso height and deviations from keypoints
+
+    Args:
+        kpts: (17, 2) keypoints of one person, or (T, 17, 2) for T frames
+
+    Returns:
+        PostureMeasurements; direction is +1 (facing right) or -1, the
+        deviations are in pixels along the facing direction and ear,
+        shoulder and hip are (..., 2) left/right midpoints
+    """
+    kpts = np.asarray(kpts)
+    nose_x = kpts[..., NOSE, 0]
+    ear = (kpts[..., EARS[0], :] + kpts[..., EARS[1], :]) / 2
+    shoulder = (kpts[..., SHOULDERS[0], :] + kpts[..., SHOULDERS[1], :]) / 2
+    hip = (kpts[..., HIPS[0], :] + kpts[..., HIPS[1], :]) / 2
+
+    direction = np.where(nose_x > shoulder[..., 0], 1, -1)
+
+    # Torso height is the zoom-invariant ruler
+    torso_height = np.abs(hip[..., 1] - shoulder[..., 1])
+    torso_height = np.where(torso_height == 0, 1, torso_height).astype(kpts.dtype)
+
+    head_deviation = (ear[..., 0] - shoulder[..., 0]) * direction.astype(kpts.dtype)
+    shoulder_deviation = (shoulder[..., 0] - hip[..., 0]) * direction.astype(kpts.dtype)
+    return PostureMeasurements(direction, torso_height, head_deviation, shoulder_deviation, ear, shoulder, hip)
+
+
+def head_status(head_deviation, torso_height):
+    """Head verdict codes: 1 forward, -1 backward, 0 normal"""
+    return np.where(
+        head_deviation > torso_height * HEAD_FORWARD_RATIO, 1,
+        np.where(head_deviation < -(torso_height * HEAD_BACKWARD_RATIO), -1, 0)
+    )
+
+
+def back_status(shoulder_deviation, torso_height):
+    """Back verdict codes: 1 kyphosis, 0 aligned"""
+    return np.where(shoulder_deviation > torso_height * KYPHOSIS_RATIO, 1, 0)
+
+
+def deviation_cm(deviation, torso_height):
+    """Estimated deviation in cm for an average torso"""
+    return (deviation / torso_height) * TORSO_CM
+
+
+HEAD_VERDICTS = {
+    0: ("NORMAL", "normal", "green"),
+    1: ("FORWARD HEAD POSTURE", "moderate", "red"),
+    -1: ("BACKWARD HEAD POSTURE", "mild", "orange"),
+}
+
+BACK_VERDICTS = {
+    0: ("BACK ALIGNED", "normal", "green"),
+    1: ("KYPHOSIS (SLOUCHING)", "moderate", "red"),
+}
+
+
+def assess_posture(kpts):
+    """
+    Full posture assessment of one person in the API format
+
+    Args:
+        kpts: (17, 2) keypoints
+
+    Returns:
+        Dict with direction, headPosture, backPosture, overall verdict,
+        recommendations, score and the measured keypoints
+    """
+    m = posture_measurements(kpts)
+    head = int(head_status(m.head_deviation, m.torso_height))
+    back = int(back_status(m.shoulder_deviation, m.torso_height))
+    head_label, head_severity, head_color = HEAD_VERDICTS[head]
+    back_label, back_severity, back_color = BACK_VERDICTS[back]
+
+    consult_doctor = False
+    overall_status = "HEALTHY POSTURE"
+    overall_severity = "normal"
+    recommendations = []
+
+    if head != 0 or back != 0:
+        consult_doctor = True
+        overall_status = "POSTURE ISSUES DETECTED"
+        overall_severity = "moderate"
+
+        if head == 1:
+            recommendations.append("⚠️ Forward head posture detected. Consider neck strengthening exercises.")
+            recommendations.append("💡 Adjust screen height to eye level.")
+
+        if back == 1:
+            recommendations.append("⚠️ Slouching detected. Focus on back strengthening and stretching.")
+            recommendations.append("💡 Practice proper sitting posture with back support.")
+
+        recommendations.append("🏥 Consult a physical therapist for personalized treatment.")
+    else:
+        recommendations.append("✅ Healthy posture detected. Keep maintaining good posture habits!")
+
+    score = 100
+    if head != 0:
+        score -= 25
+    if back != 0:
+        score -= 30
+
+    return {
+        "direction": "RIGHT" if m.direction == 1 else "LEFT",
+        "headPosture": {
+            "status": head_label,
+            "severity": head_severity,
+            "deviation_cm": round(float(deviation_cm(m.head_deviation, m.torso_height)), 1),
+            "color": head_color
+        },
+        "backPosture": {
+            "status": back_label,
+            "severity": back_severity,
+            "deviation_cm": round(float(deviation_cm(m.shoulder_deviation, m.torso_height)), 1),
+            "color": back_color
+        },
+        "overallStatus": overall_status,
+        "overallSeverity": overall_severity,
+        "consultDoctor": consult_doctor,
+        "recommendations": recommendations,
+        "score": int(max(0, score)),
+        "keypoints": {
+            "ear": {"x": float(m.ear[0]), "y": float(m.ear[1])},
+            "shoulder": {"x": float(m.shoulder[0]), "y": float(m.shoulder[1])},
+            "hip": {"x": float(m.hip[0]), "y": float(m.hip[1])}
+        }
+    }
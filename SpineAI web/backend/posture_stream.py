@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Posture Stream
+Continuous posture analysis of a camera or video file: frames are decoded
+on a reader thread, stale frames are dropped when inference falls behind,
+the pose model runs every `stride` frames and keypoints are smoothed over
+time before the per-frame head/back verdicts
+
+Usage:
+    python posture_stream.py 0 --display                 # webcam 0
+    python posture_stream.py video.mp4 --stride 2 --output annotated.mp4
+    python posture_stream.py 0 --track --stride 6         # optical flow in between
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from posture_geometry import EARS, HIPS, NOSE, SHOULDERS, assess_posture
+
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yolov8n-pose.pt")
+
+# Legacy report colors (BGR)
+COLORS = {"green": (0, 255, 0), "red": (0, 0, 255), "orange": (0, 165, 255)}
+
+
+class FrameReader:
+    """
+    Decodes frames of a camera or video file on a background thread
+
+    In drop mode only the newest `buffer` frames are kept, so a slow
+    consumer always gets a recent frame; files are then paced at their own
+    frame rate to behave like a live source. Without dropping every frame
+    is delivered and the reader blocks while the buffer is full.
+    """
+
+    def __init__(self, source, drop=True, buffer=1, stride=1):
+        """
+        Open a source
+
+        Args:
+            source: Camera index (int) or video path
+            drop: Drop stale frames instead of blocking the reader
+            buffer: Frames kept for the consumer
+            stride: Deliver every stride-th frame; the others are only
+                grabbed, not decoded to images
+        """
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Video source could not be opened: {source}")
+        self.live = isinstance(source, int)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.drop = drop
+        self.buffer = max(1, buffer)
+        self.stride = max(1, stride)
+        self.read = 0
+        self.dropped = 0
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._finished = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        pace = self.drop and not self.live and self.fps > 0
+        start = time.monotonic()
+        position = 0
+        while not self._stopped:
+            if position % self.stride:
+                position += 1
+                if not self.capture.grab():
+                    break
+                continue
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            if self.live:
+                timestamp = time.monotonic()
+            else:
+                timestamp = position / self.fps if self.fps > 0 else self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if pace:
+                delay = start + timestamp - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            with self._cond:
+                if self.drop:
+                    while len(self._frames) >= self.buffer:
+                        self._frames.popleft()
+                        self.dropped += 1
+                else:
+                    while len(self._frames) >= self.buffer and not self._stopped:
+                        self._cond.wait()
+                self._frames.append((position, timestamp, frame))
+                self.read += 1
+                self._cond.notify_all()
+            position += 1
+
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def get(self):
+        """
+        Next frame
+
+        Returns:
+            (frame index, timestamp in seconds, BGR frame), or None at the end
+        """
+        with self._cond:
+            while not self._frames and not self._finished:
+                self._cond.wait()
+            if not self._frames:
+                return None
+            item = self._frames.popleft()
+            self._cond.notify_all()
+            return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.capture.release()
+
+
+def _valid(x):
+    """Mask of detected keypoints (undetected ones come back as 0, 0)"""
+    return np.any(x != 0, axis=-1, keepdims=True)
+
+
+class EmaFilter:
+    """Exponential moving average over keypoint arrays"""
+
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.value = None
+
+    def __call__(self, x, t=None):
+        x = np.asarray(x, dtype=np.float32)
+        if self.value is None:
+            self.value = x.copy()
+        else:
+            smoothed = self.alpha * x + (1 - self.alpha) * self.value
+            self.value = np.where(_valid(x), smoothed, self.value).astype(np.float32)
+        return self.value
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter over keypoint arrays
+
+    The cutoff frequency grows with the speed of each coordinate, so the
+    keypoints are steady while the person holds still and still follow
+    quick movements without lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        """
+        Args:
+            min_cutoff: Cutoff (Hz) at rest; lower is smoother
+            beta: Cutoff increase per pixel/s of speed; higher lags less
+            d_cutoff: Cutoff (Hz) of the speed estimate
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.speed = None
+        self.time = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=np.float32)
+        if self.value is None:
+            self.value = x.copy()
+            self.speed = np.zeros_like(x)
+            self.time = t
+            return self.value
+
+        dt = max(t - self.time, 1e-3)
+        self.time = t
+        valid = _valid(x)
+
+        alpha_d = self._alpha(self.d_cutoff, dt)
+        speed = alpha_d * (x - self.value) / dt + (1 - alpha_d) * self.speed
+        alpha = self._alpha(self.min_cutoff + self.beta * np.abs(speed), dt)
+
+        self.speed = np.where(valid, speed, self.speed).astype(np.float32)
+        self.value = np.where(valid, alpha * x + (1 - alpha) * self.value, self.value).astype(np.float32)
+        return self.value
+
+
+def make_smoother(name, min_cutoff=1.0, beta=0.05, alpha=0.5):
+    """Keypoint filter by name ("one-euro", "ema" or "none")"""
+    if name == "one-euro":
+        return OneEuroFilter(min_cutoff, beta)
+    if name == "ema":
+        return EmaFilter(alpha)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown filter: {name}")
+
+
+class KeypointTracker:
+    """
+    Propagates pose keypoints between inferences with sparse optical flow
+
+    Each detected keypoint is tracked with pyramidal Lucas-Kanade and
+    checked by tracking it back to the previous frame; the confidence is
+    the share of posture keypoints (nose, ears, shoulders, hips) that pass
+    both checks, and a low confidence asks for a fresh pose inference.
+    """
+
+    # Keypoints the posture verdicts depend on
+    POSTURE_KEYPOINTS = (NOSE,) + EARS + SHOULDERS + HIPS
+
+    def __init__(self, win_size=21, max_level=3, max_fb_error=1.5, min_confidence=0.7):
+        """
+        Args:
+            win_size: LK search window (pixels)
+            max_level: LK pyramid levels
+            max_fb_error: Max forward-backward error (pixels) of a tracked point
+            min_confidence: Share of posture keypoints that must be tracked
+        """
+        self.lk_params = {
+            "winSize": (win_size, win_size),
+            "maxLevel": max_level,
+            "criteria": (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        }
+        self.max_fb_error = max_fb_error
+        self.min_confidence = min_confidence
+        self.gray = None
+        self.kpts = None
+
+    def reset(self, gray, kpts):
+        """Start tracking from freshly inferred keypoints"""
+        self.gray = gray
+        self.kpts = np.asarray(kpts, dtype=np.float32).copy()
+
+    def track(self, gray):
+        """
+        Move the keypoints to a new frame
+
+        Args:
+            gray: Grayscale frame
+
+        Returns:
+            (tracked (17, 2) keypoints, confidence in 0-1); undetected and
+            lost keypoints keep their previous position
+        """
+        valid = np.flatnonzero(_valid(self.kpts)[:, 0])
+        if self.gray is None or len(valid) == 0:
+            return self.kpts, 0.0
+
+        points = self.kpts[valid].reshape(-1, 1, 2)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, points, None, **self.lk_params)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.gray, moved, None, **self.lk_params)
+        fb_error = np.linalg.norm((back - points).reshape(-1, 2), axis=1)
+        ok = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        kpts = self.kpts.copy()
+        kpts[valid[ok]] = moved.reshape(-1, 2)[ok]
+        tracked = set(valid[ok].tolist())
+        required = [i for i in self.POSTURE_KEYPOINTS if i in set(valid.tolist())]
+        confidence = sum(i in tracked for i in required) / len(required) if required else 0.0
+
+        self.gray = gray
+        self.kpts = kpts
+        return kpts, confidence
+
+
+def load_pose_estimator(model_path, imgsz=320, conf=0.5):
+    """
+    Load the YOLO pose model
+
+    Args:
+        model_path: Pose weights (yolov8n-pose.pt)
+        imgsz: Inference size (smaller keeps CPU frame rates up)
+        conf: Person confidence
+
+    Returns:
+        Function mapping a BGR frame to (17, 2) keypoints of the first
+        person, or None
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+
+    def estimate(frame):
+        results = model.predict(source=frame, imgsz=imgsz, save=False, conf=conf, verbose=False)
+        if not results or len(results[0].keypoints) == 0:
+            return None
+        kpts = results[0].keypoints.xy.cpu().numpy()[0]
+        return kpts if kpts.shape[0] else None
+
+    return estimate
+
+
+def frame_verdict(assessment):
+    """Compact per-frame record of a posture assessment"""
+    return {
+        "direction": assessment["direction"],
+        "head": assessment["headPosture"]["status"],
+        "headDeviationCm": assessment["headPosture"]["deviation_cm"],
+        "back": assessment["backPosture"]["status"],
+        "backDeviationCm": assessment["backPosture"]["deviation_cm"],
+        "score": assessment["score"]
+    }
+
+
+def stream_posture(frames, estimate, stride=1, smoother=None, tracker=None):
+    """
+    Analyze posture frame by frame
+
+    Args:
+        frames: Iterable of (index, timestamp, BGR frame), e.g. a FrameReader
+        estimate: Function mapping a frame to (17, 2) keypoints or None
+        stride: Run the pose model on every stride-th frame; frames in
+            between reuse the last smoothed keypoints, or track them
+        smoother: Optional keypoint filter (OneEuroFilter, EmaFilter)
+        tracker: Optional KeypointTracker moving the keypoints between
+            inferences; the model runs early when tracking is lost
+
+    Yields:
+        (frame, result dict, smoothed keypoints or None, full assessment or None)
+    """
+    kpts = None
+    since_inference = stride
+    for index, timestamp, frame in frames:
+        result = {"frame": index, "time": round(timestamp, 3)}
+        raw = None
+        due = since_inference >= stride
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if tracker is not None else None
+
+        if not due and tracker is not None and kpts is not None:
+            start = time.perf_counter()
+            raw, confidence = tracker.track(gray)
+            result["trackingMs"] = round((time.perf_counter() - start) * 1000, 2)
+            result["trackingConfidence"] = round(confidence, 2)
+            if confidence < tracker.min_confidence:
+                # Re-detect now instead of reporting drifting keypoints
+                raw = None
+                due = True
+
+        result["inferred"] = due
+        if due:
+            since_inference = 0
+            start = time.perf_counter()
+            raw = estimate(frame)
+            result["inferenceMs"] = round((time.perf_counter() - start) * 1000, 1)
+            if raw is None:
+                # Lost the person: do not blend the next one with stale keypoints
+                kpts = None
+                if smoother is not None:
+                    smoother.reset()
+            elif tracker is not None:
+                tracker.reset(gray, raw)
+        since_inference += 1
+
+        if raw is not None:
+            kpts = smoother(raw, timestamp) if smoother is not None else np.asarray(raw, dtype=np.float32)
+
+        assessment = None
+        if kpts is not None:
+            assessment = assess_posture(kpts)
+            result.update(frame_verdict(assessment))
+        result["person"] = assessment is not None
+        yield frame, result, kpts, assessment
+
+
+def draw_posture(img, assessment):
+    """Draw the legacy posture skeleton and report box onto a frame in place"""
+    points = assessment["keypoints"]
+    ear = (int(points["ear"]["x"]), int(points["ear"]["y"]))
+    shoulder = (int(points["shoulder"]["x"]), int(points["shoulder"]["y"]))
+    hip = (int(points["hip"]["x"]), int(points["hip"]["y"]))
+    head = assessment["headPosture"]
+    back = assessment["backPosture"]
+
+    cv2.line(img, ear, shoulder, (255, 0, 255), 3)
+    cv2.line(img, shoulder, hip, (255, 0, 255), 3)
+    cv2.line(img, hip, (hip[0], shoulder[1] - 50), (200, 200, 200), 1, cv2.LINE_AA)
+    cv2.circle(img, ear, 8, COLORS[head["color"]], -1)
+    cv2.circle(img, shoulder, 8, COLORS[back["color"]], -1)
+    cv2.circle(img, hip, 8, (255, 0, 0), -1)
+
+    cv2.rectangle(img, (0, 0), (700, 120), (0, 0, 0), -1)
+    cv2.putText(img, f"DIRECTION: {assessment['direction']}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                (255, 255, 255), 1)
+    cv2.putText(img, f"NECK: {head['status']}", (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, COLORS[head["color"]], 2)
+    cv2.putText(img, f"Deviation: {head['deviation_cm']:.1f} cm (Ref)", (450, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                (200, 200, 200), 1)
+    cv2.putText(img, f"BACK:  {back['status']}", (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.7, COLORS[back["color"]], 2)
+    cv2.putText(img, f"Tilt: {back['deviation_cm']:.1f} cm (Ref)", (450, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                (200, 200, 200), 1)
+    return img
+
+
+def parse_source(value):
+    """Camera index for digit strings, otherwise a file path"""
+    return int(value) if value.isdigit() else value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time posture analysis of a camera or video file")
+    parser.add_argument("source", help="Camera index (e.g. 0) or video file")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="YOLO pose weights")
+    parser.add_argument("--stride", type=int, default=2, help="Run the pose model every N frames")
+    parser.add_argument("--imgsz", type=int, default=320, help="Inference size")
+    parser.add_argument("--filter", choices=["one-euro", "ema", "none"], default="one-euro", help="Keypoint smoothing")
+    parser.add_argument("--min-cutoff", type=float, default=1.0, help="One-Euro cutoff at rest (Hz)")
+    parser.add_argument("--beta", type=float, default=0.05, help="One-Euro speed coefficient")
+    parser.add_argument("--alpha", type=float, default=0.5, help="EMA weight of the newest frame")
+    parser.add_argument("--track", action="store_true",
+                        help="Track keypoints with optical flow between pose inferences (use with a larger --stride)")
+    parser.add_argument("--min-track-confidence", type=float, default=0.7,
+                        help="Re-run the pose model when fewer posture keypoints than this share are tracked")
+    parser.add_argument("--no-drop", action="store_true", help="Analyze every frame instead of dropping stale ones")
+    parser.add_argument("--display", action="store_true", help="Show the annotated stream (q quits)")
+    parser.add_argument("--output", help="Write the annotated stream to a video file")
+    parser.add_argument("--max-frames", type=int, help="Stop after this many analyzed frames")
+    args = parser.parse_args()
+
+    if args.stride < 1:
+        sys.exit("--stride must be at least 1")
+    if not os.path.exists(args.model):
+        sys.exit(f"Model file not found: {args.model}")
+
+    source = parse_source(args.source)
+    try:
+        reader = FrameReader(source, drop=not args.no_drop).start()
+    except ValueError as e:
+        sys.exit(str(e))
+
+    estimate = load_pose_estimator(args.model, args.imgsz)
+    smoother = make_smoother(args.filter, args.min_cutoff, args.beta, args.alpha)
+    tracker = KeypointTracker(min_confidence=args.min_track_confidence) if args.track else None
+    writer = None
+    frames = 0
+    inferred = 0
+    start = time.monotonic()
+    try:
+        for frame, result, kpts, assessment in stream_posture(reader, estimate, args.stride, smoother, tracker):
+            frames += 1
+            inferred += result["inferred"]
+            print(json.dumps(result), flush=True)
+
+            if args.display or args.output:
+                if assessment is not None:
+                    draw_posture(frame, assessment)
+                if args.output:
+                    if writer is None:
+                        fps = reader.fps or 30.0
+                        writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), fps,
+                                                 (frame.shape[1], frame.shape[0]))
+                    writer.write(frame)
+                if args.display:
+                    cv2.imshow("Posture Stream", frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        break
+            if args.max_frames and frames >= args.max_frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.release()
+        if args.display:
+            cv2.destroyAllWindows()
+
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(json.dumps({
+        "frames": frames,
+        "inferred": inferred,
+        "read": reader.read,
+        "dropped": reader.dropped,
+        "fps": round(frames / elapsed, 2)
+    }), file=sys.stderr)
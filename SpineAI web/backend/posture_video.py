@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Posture Video Analysis
+Offline posture analysis of a recorded session: frames are decoded on a
+reader thread, batched through the pose model and turned into a per-frame
+head/shoulder deviation time series with summary statistics
+
+Usage:
+    python posture_video.py <video_path> [--output series.json] [--batch 16] [--stride 1]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import posture_geometry
+from posture_stream import DEFAULT_MODEL, FrameReader
+
+
+def load_pose_batch_estimator(model_path, imgsz=640, conf=0.5, batch_size=16):
+    """
+    Load the YOLO pose model for batched inference
+
+    Args:
+        model_path: Pose weights (yolov8n-pose.pt)
+        imgsz: Inference size
+        conf: Person confidence
+        batch_size: Frames per forward pass
+
+    Returns:
+        Function mapping a list of BGR frames to a generator of (17, 2)
+        keypoints of the first person (None without a person), in order
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+
+    def estimate_batch(frames):
+        for result in model.predict(source=frames, stream=True, batch=batch_size, imgsz=imgsz, save=False,
+                                    conf=conf, verbose=False):
+            if len(result.keypoints) == 0:
+                yield None
+                continue
+            kpts = result.keypoints.xy.cpu().numpy()[0]
+            yield kpts if kpts.shape[0] else None
+
+    return estimate_batch
+
+
+def collect_keypoints(frames, estimate_batch, batch_size=16):
+    """
+    Run the pose model over a frame iterator in batches
+
+    Args:
+        frames: Iterable of (index, timestamp, BGR frame)
+        estimate_batch: Function from load_pose_batch_estimator()
+        batch_size: Frames per batch (only one batch of images is held)
+
+    Returns:
+        (frame indices (T,), timestamps (T,), keypoints (T, 17, 2) float32
+        with NaN where no person was found)
+    """
+    indices, times, keypoints = [], [], []
+    missing = np.full((17, 2), np.nan, dtype=np.float32)
+    chunk = []
+
+    def flush():
+        for (index, timestamp, _), kpts in zip(chunk, estimate_batch([frame for _, _, frame in chunk])):
+            indices.append(index)
+            times.append(timestamp)
+            keypoints.append(missing if kpts is None else np.asarray(kpts, dtype=np.float32))
+        chunk.clear()
+
+    for item in frames:
+        chunk.append(item)
+        if len(chunk) >= batch_size:
+            flush()
+    if chunk:
+        flush()
+
+    if not keypoints:
+        return np.empty(0, np.int64), np.empty(0), np.empty((0, 17, 2), np.float32)
+    return np.asarray(indices, np.int64), np.asarray(times), np.stack(keypoints)
+
+
+def deviation_series(kpts):
+    """
+    Per-frame posture metrics of a keypoint series
+
+    Args:
+        kpts: (T, 17, 2) keypoints, NaN where no person was found
+
+    Returns:
+        Dict of (T,) arrays: head_deviation_cm, shoulder_deviation_cm (NaN
+        without a person), head (1 forward, -1 backward, 0 normal), back
+        (1 kyphosis, 0 aligned) and person (bool)
+    """
+    person = ~np.isnan(kpts).any(axis=(1, 2))
+    m = posture_geometry.posture_measurements(kpts)
+    head_cm = posture_geometry.deviation_cm(m.head_deviation, m.torso_height)
+    shoulder_cm = posture_geometry.deviation_cm(m.shoulder_deviation, m.torso_height)
+    return {
+        "person": person,
+        "head_deviation_cm": np.where(person, head_cm, np.nan),
+        "shoulder_deviation_cm": np.where(person, shoulder_cm, np.nan),
+        "head": np.where(person, posture_geometry.head_status(m.head_deviation, m.torso_height), 0),
+        "back": np.where(person, posture_geometry.back_status(m.shoulder_deviation, m.torso_height), 0),
+    }
+
+
+def _stats(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    return {
+        "mean": round(float(values.mean()), 2),
+        "median": round(float(np.median(values)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "min": round(float(values.min()), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def longest_run(mask, times, frame_time):
+    """Duration in seconds of the longest run of consecutive True frames"""
+    if not mask.any():
+        return 0.0
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return round(float((times[ends] - times[starts] + frame_time).max()), 2)
+
+
+def summarize(series, times, frame_time):
+    """
+    Summary statistics of a deviation series
+
+    Args:
+        series: Dict from deviation_series()
+        times: (T,) timestamps in seconds
+        frame_time: Seconds covered by one analyzed frame
+
+    Returns:
+        Dict with frame counts, deviation statistics, the share of person
+        frames with each finding and the longest episode of each
+    """
+    person = series["person"]
+    n_person = int(person.sum())
+    forward = person & (series["head"] == 1)
+    backward = person & (series["head"] == -1)
+    kyphosis = person & (series["back"] == 1)
+
+    def share(mask):
+        return round(float(mask.sum()) / n_person, 4) if n_person else 0.0
+
+    return {
+        "frames": int(len(person)),
+        "personFrames": n_person,
+        "headDeviationCm": _stats(series["head_deviation_cm"]),
+        "shoulderDeviationCm": _stats(series["shoulder_deviation_cm"]),
+        "forwardHeadShare": share(forward),
+        "backwardHeadShare": share(backward),
+        "kyphosisShare": share(kyphosis),
+        "longestForwardHeadSec": longest_run(forward, times, frame_time),
+        "longestKyphosisSec": longest_run(kyphosis, times, frame_time),
+    }
+
+
+def _column(values, digits=None):
+    """JSON column with None for NaN"""
+    if digits is None:
+        return [int(v) for v in values]
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def analyze_video(video_path, estimate_batch, batch_size=16, stride=1):
+    """
+    Analyze a recorded session
+
+    Args:
+        video_path: Video file
+        estimate_batch: Function from load_pose_batch_estimator()
+        batch_size: Frames per forward pass
+        stride: Analyze every stride-th frame
+
+    Returns:
+        Dict with video info, summary statistics and the columnar series
+    """
+    start = time.perf_counter()
+    reader = FrameReader(video_path, drop=False, buffer=batch_size * 2, stride=stride).start()
+    try:
+        indices, times, kpts = collect_keypoints(reader, estimate_batch, batch_size)
+    finally:
+        reader.close()
+    fps = reader.fps or 30.0
+    elapsed = time.perf_counter() - start
+
+    series = deviation_series(kpts)
+    person = series["person"]
+    duration = (int(indices[-1]) + 1) / fps if len(indices) else 0.0
+    return {
+        "success": True,
+        "video": os.path.basename(video_path),
+        "fps": round(fps, 3),
+        "stride": stride,
+        "durationSec": round(duration, 2),
+        "processingSec": round(elapsed, 2),
+        "realtimeFactor": round(duration / elapsed, 2) if elapsed > 0 else None,
+        "summary": summarize(series, times, stride / fps),
+        "series": {
+            "frame": _column(indices),
+            "time": _column(times, 3),
+            "head_deviation_cm": _column(series["head_deviation_cm"], 1),
+            "shoulder_deviation_cm": _column(series["shoulder_deviation_cm"], 1),
+            "head": [int(v) if p else None for v, p in zip(series["head"], person)],
+            "back": [int(v) if p else None for v, p in zip(series["back"], person)],
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Posture deviation time series of a recorded session")
+    parser.add_argument("video_path", help="Video file")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="YOLO pose weights")
+    parser.add_argument("--output", help="Write the full result (with series) here; stdout gets the summary")
+    parser.add_argument("--batch", type=int, default=16, help="Frames per forward pass")
+    parser.add_argument("--stride", type=int, default=1, help="Analyze every N-th frame")
+    parser.add_argument("--imgsz", type=int, default=640, help="Inference size")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.video_path):
+        print(json.dumps({"success": False, "error": f"Video file not found: {args.video_path}"}))
+        sys.exit(1)
+    if not os.path.exists(args.model):
+        print(json.dumps({"success": False, "error": f"Model file not found: {args.model}"}))
+        sys.exit(1)
+
+    try:
+        estimate_batch = load_pose_batch_estimator(args.model, args.imgsz, batch_size=args.batch)
+        result = analyze_video(args.video_path, estimate_batch, max(1, args.batch), max(1, args.stride))
+    except Exception as e:
+        result = {"success": False, "error": f"Video analysis error: {str(e)}"}
+
+    if result["success"] and args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, separators=(",", ":"))
+        result = {key: value for key, value in result.items() if key != "series"}
+        result["output"] = args.output
+    print(json.dumps(result, ensure_ascii=False))
+    sys.exit(0 if result["success"] else 1)
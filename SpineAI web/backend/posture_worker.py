@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Posture Worker
+Long-lived posture analyzer behind the live WebSocket endpoint: loads the
+pose model once and answers encoded webcam frames of many streams
+
+Protocol: framed messages (see worker_protocol.py) in both directions
+    {"method": "frame", "params": {"stream", "seq", "time"}} + JPEG/PNG payload,
+        or a {"slot", "bytes"} "frame" descriptor into the --ring instead
+    {"method": "close", "params": {"stream"}}
+    answered with one {"stream", "seq", ...} message per frame after an
+    initial {"ready": true}; stdout carries only frames, logs go to stderr
+
+Usage:
+    python posture_worker.py <model_path> [--imgsz 320] [--ring name:slots:slot_bytes]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from frame_ring import FrameRing, ring_spec
+from posture_geometry import assess_posture
+from posture_stream import OneEuroFilter, frame_verdict, load_pose_estimator
+from worker_protocol import MessageWriter, ProtocolError, read_message
+
+
+class PostureAnalyzer:
+    """
+    Pose model plus per-stream keypoint smoothing
+
+    Each stream keeps its own One-Euro filter, so consecutive frames of one
+    webcam are smoothed while streams never mix.
+    """
+
+    def __init__(self, estimate, min_cutoff=1.0, beta=0.05):
+        """
+        Args:
+            estimate: Function mapping a BGR frame to (17, 2) keypoints or None
+            min_cutoff: One-Euro cutoff at rest (Hz)
+            beta: One-Euro speed coefficient
+        """
+        self.estimate = estimate
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.filters = {}
+
+    def analyze(self, stream, frame, timestamp):
+        """
+        Analyze one frame of a stream
+
+        Args:
+            stream: Stream id
+            frame: BGR frame
+            timestamp: Capture time in seconds
+
+        Returns:
+            Compact message: person flag, integer keypoints (x0, y0, x1, ...)
+            and the frame verdict
+        """
+        start = time.perf_counter()
+        raw = self.estimate(frame)
+        message = {"inferenceMs": round((time.perf_counter() - start) * 1000, 1)}
+        smoother = self.filters.setdefault(stream, OneEuroFilter(self.min_cutoff, self.beta))
+        if raw is None:
+            smoother.reset()
+            message["person"] = False
+            return message
+
+        kpts = smoother(raw, timestamp)
+        message["person"] = True
+        message["kp"] = np.rint(kpts).astype(np.int32).ravel().tolist()
+        message.update(frame_verdict(assess_posture(kpts)))
+        return message
+
+    def close(self, stream):
+        self.filters.pop(stream, None)
+
+
+def serve(analyzer, stdin, stdout, ring=None):
+    """Answer requests until stdin closes; frames may arrive in ring slots"""
+    writer = MessageWriter(stdout)
+    while True:
+        request = read_message(stdin)
+        if request is None:
+            return
+        header, payload = request
+        params = header.get("params") or {}
+
+        if header.get("method") == "close":
+            analyzer.close(params.get("stream"))
+            continue
+
+        message = {"stream": params.get("stream"), "seq": params.get("seq")}
+        try:
+            if header.get("method") != "frame":
+                raise ValueError(f"Unknown method: {header.get('method')}")
+            if header.get("frame") is not None:
+                if ring is None:
+                    raise ValueError("Frame request without a frame ring")
+                payload = ring.payload(header["frame"])
+            frame = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError("Frame could not be decoded")
+            message.update(analyzer.analyze(params["stream"], frame, params.get("time", 0.0)))
+        except Exception as e:
+            message["error"] = str(e)
+        writer.write(message)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived posture analyzer for live streams")
+    parser.add_argument("model_path", help="YOLO pose weights")
+    parser.add_argument("--imgsz", type=int, default=320, help="Inference size")
+    parser.add_argument("--ring", type=ring_spec, help="Shared memory frame ring created by the server")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model_path):
+        print(f"Model file not found: {args.model_path}", file=sys.stderr)
+        sys.exit(1)
+
+    # Frames own stdout; stray prints from libraries must not corrupt them
+    output = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    analyzer = PostureAnalyzer(load_pose_estimator(args.model_path, args.imgsz))
+    ring = FrameRing.attach(args.ring, track=False) if args.ring else None
+    MessageWriter(output).write({"ready": True})
+    try:
+        serve(analyzer, sys.stdin.buffer, output, ring)
+    except ProtocolError as e:
+        print(f"Protocol error: {e}", file=sys.stderr)
+        sys.exit(1)
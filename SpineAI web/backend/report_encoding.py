@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Report Encoding
+Encodes rendered report buffers to JPEG/WebP/PNG with a quality setting,
+a max output dimension and an optional thumbnail in one pass
+"""
+
+import os
+import time
+
+import cv2
+
+
+# Output format -> file extension understood by cv2.imencode
+FORMATS = {"jpg": ".jpg", "jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+DEFAULT_QUALITY = {"jpg": 85, "webp": 80}
+
+# zlib level for PNG (lossless, so quality does not apply)
+PNG_COMPRESSION = 3
+
+THUMBNAIL_QUALITY = 70
+
+
+def normalize_format(fmt):
+    """
+    Canonical format name
+
+    Args:
+        fmt: "jpg", "jpeg", "webp" or "png" (a leading dot is ignored)
+
+    Returns:
+        "jpg", "webp" or "png"
+    """
+    fmt = fmt.lower().lstrip(".")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    return "jpg" if fmt == "jpeg" else fmt
+
+
+def encode_params(fmt, quality=None, progressive=False):
+    """cv2.imencode parameters of a format"""
+    fmt = normalize_format(fmt)
+    if fmt == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+
+    quality = int(quality if quality is not None else DEFAULT_QUALITY[fmt])
+    if not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be between 1 and 100: {quality}")
+    if fmt == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    if progressive:
+        params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+    return params
+
+
+def fit(img, max_dim):
+    """Downscale an image so its longer side is at most max_dim (never upscales)"""
+    height, width = img.shape[:2]
+    if not max_dim or max(height, width) <= max_dim:
+        return img
+    scale = max_dim / max(height, width)
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def encode(img, fmt="jpg", quality=None, max_dim=None, progressive=False):
+    """
+    Encode one image
+
+    Args:
+        img: BGR image
+        fmt: Output format
+        quality: 1-100 for JPEG/WebP (format default if None)
+        max_dim: Optional max width/height of the output
+        progressive: Progressive JPEG
+
+    Returns:
+        (encoded uint8 buffer, stats dict with size, bytes and timings in ms,
+        the resized image)
+    """
+    fmt = normalize_format(fmt)
+    params = encode_params(fmt, quality, progressive)
+
+    start = time.perf_counter()
+    resized = fit(img, max_dim)
+    resize_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    ok, buffer = cv2.imencode(FORMATS[fmt], resized, params)
+    encode_ms = (time.perf_counter() - start) * 1000
+    if not ok:
+        raise ValueError(f"Encoding to {fmt} failed")
+
+    return buffer, {
+        "format": fmt,
+        "size": [resized.shape[1], resized.shape[0]],
+        "bytes": int(buffer.size),
+        "resizeMs": round(resize_ms, 2),
+        "encodeMs": round(encode_ms, 2)
+    }, resized
+
+
+def write_atomic(path, buffer):
+    """Write a buffer next to its target and rename, so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    buffer.tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def thumbnail_path(path):
+    """Path of the thumbnail written next to an output"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_thumb{ext}"
+
+
+def write_report(img, path, fmt=None, quality=None, max_dim=None, progressive=False, thumbnail=None):
+    """
+    Encode a rendered report and write it (plus an optional thumbnail)
+
+    The thumbnail is downscaled from the already fitted output, so the
+    full-resolution buffer is only read once.
+
+    Args:
+        img: Rendered BGR report
+        path: Output file
+        fmt: Output format (from the file extension if None)
+        quality: 1-100 for JPEG/WebP
+        max_dim: Optional max width/height of the output
+        progressive: Progressive JPEG
+        thumbnail: Optional max width/height of a thumbnail
+
+    Returns:
+        Stats dict (path, size, bytes, timings; "thumbnail" with the same keys)
+    """
+    fmt = normalize_format(fmt or os.path.splitext(path)[1])
+    buffer, stats, resized = encode(img, fmt, quality, max_dim, progressive)
+    write_atomic(path, buffer)
+    stats["path"] = path
+
+    if thumbnail:
+        thumb_quality = None if fmt == "png" else THUMBNAIL_QUALITY
+        thumb_buffer, thumb_stats, _ = encode(resized, fmt, thumb_quality, thumbnail)
+        thumb_stats["path"] = thumbnail_path(path)
+        write_atomic(thumb_stats["path"], thumb_buffer)
+        stats["thumbnail"] = thumb_stats
+
+    return stats
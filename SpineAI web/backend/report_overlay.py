@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Report Overlay
+Annotation primitives of a spine report (boxes, spine line, limit lines,
+panel fields) as compact JSON or SVG, drawn client-side over the upload
+"""
+
+import json
+import math
+import sys
+from xml.sax.saxutils import escape, quoteattr
+
+import cv2
+import numpy as np
+
+import spine_geometry
+import report_renderer
+from detection_store import default_store
+
+
+OVERLAY_VERSION = 1
+
+# Half length of the limit vertebra tangent lines (doktor_limit_cizgisi)
+LIMIT_LINE_LENGTH = 250
+
+# Stroke styles of the batch report, as RGB hex
+STYLES = {
+    "compression_fracture": {"color": "#ff0000", "width": 3},
+    "listhesis": {"color": "#ffa500", "width": 3},
+    "herniated_disc": {"color": "#ff00ff", "width": 4},
+    "healthy": {"color": "#00ffff", "radius": 3},
+    "spine": {"color": "#ffff00", "width": 2},
+    "limit": {"color": "#dcdcdc", "width": 2, "radius": 6},
+}
+
+
+def _hex(bgr):
+    """OpenCV BGR color as RGB hex"""
+    return "#{:02x}{:02x}{:02x}".format(bgr[2], bgr[1], bgr[0])
+
+
+def limit_line(center, angle, length=LIMIT_LINE_LENGTH):
+    """
+    End points of a limit vertebra tangent line
+
+    Args:
+        center: (x, y) of the smoothed limit vertebra center
+        angle: Segment angle from vertical in degrees
+        length: Half length in pixels
+
+    Returns:
+        [x1, y1, x2, y2]
+    """
+    cx, cy = int(center[0]), int(center[1])
+    rad = math.radians(angle)
+    dx = int(length * math.cos(rad))
+    dy = int(length * math.sin(rad))
+    return [cx - dx, cy + dy, cx + dx, cy - dy]
+
+
+def panel_fields(file_name, image_type, angle, findings):
+    """Values of the report panel, without layout"""
+    comment, color = report_renderer.angle_comment(image_type, angle)
+    risk = sum(findings[key] for _, key, _ in report_renderer.FINDING_ROWS) + (1 if comment else 0)
+    return {
+        "id": file_name,
+        "imageType": image_type,
+        "heading": report_renderer.angle_heading(image_type),
+        "angle": round(float(angle), 1),
+        "comment": comment,
+        "color": _hex(color),
+        "findings": [
+            {"key": key, "label": label, "count": int(findings[key]), "color": _hex(row_color)}
+            for label, key, row_color in report_renderer.FINDING_ROWS
+        ],
+        "verdict": "PATHOLOGY DETECTED" if risk > 0 else "NORMAL"
+    }
+
+
+def build_overlay(column, flags, image_type, image_size=None, file_name=None, measurement=None):
+    """
+    Annotation primitives of one study
+
+    Args:
+        column: spine_geometry.VertebraColumn of the study
+        flags: DiseaseFlags of the column
+        image_type: "AP", "LATERAL" or "UNKNOWN"
+        image_size: Optional (width, height) of the upload
+        file_name: Upload file name the overlay refers to
+        measurement: CobbMeasurement (computed from the column if omitted)
+
+    Returns:
+        JSON-serializable dict
+    """
+    if measurement is None:
+        measurement = column.cobb()
+
+    boxes = column.boxes.astype(np.int64)
+    fracture = flags.compression_fracture
+    listhesis = flags.listhesis & ~fracture
+
+    # Fracture boxes are drawn over listhesis boxes in the batch report
+    shapes = []
+    for name, mask in (("listhesis", listhesis), ("compression_fracture", fracture)):
+        for box in boxes[mask].tolist():
+            shapes.append({"type": "rect", "class": name, "points": box})
+
+    # Herniation is marked by a line through the disc space below a vertebra
+    for i in np.flatnonzero(flags.herniated_disc):
+        x1, _, x2, y2 = boxes[i]
+        gap = column.y1[i + 1] - column.y2[i]
+        mid = int(y2 + gap / 2)
+        shapes.append({"type": "line", "class": "herniated_disc", "points": [int(x1) + 5, mid, int(x2) - 5, mid]})
+
+    healthy = ~(fracture | flags.listhesis)
+    for center in column.centers[healthy].tolist():
+        shapes.append({"type": "dot", "class": "healthy", "points": center})
+
+    if len(measurement.smooth_points):
+        shapes.append({
+            "type": "polyline",
+            "class": "spine",
+            "points": np.asarray(measurement.smooth_points, dtype=np.int64).ravel().tolist()
+        })
+
+    for idx, angle in ((measurement.idx_max, measurement.angle_max), (measurement.idx_min, measurement.angle_min)):
+        if idx is None:
+            continue
+        center = [int(v) for v in measurement.smooth_points[idx]]
+        shapes.append({"type": "line", "class": "limit", "points": limit_line(center, angle)})
+        shapes.append({"type": "dot", "class": "limit", "points": center})
+
+    return {
+        "version": OVERLAY_VERSION,
+        "image": file_name,
+        "size": list(image_size) if image_size is not None else None,
+        "styles": STYLES,
+        "shapes": shapes,
+        "panel": panel_fields(file_name or "", image_type, measurement.angle, flags.counts())
+    }
+
+
+def overlay_svg(overlay, image_href=None):
+    """
+    Render overlay primitives as an SVG document
+
+    Args:
+        overlay: Dict from build_overlay()
+        image_href: Optional URL of the upload drawn underneath
+
+    Returns:
+        SVG markup in image pixel coordinates
+    """
+    width, height = overlay["size"] or (0, 0)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}">'
+    ]
+    if image_href:
+        parts.append(f'<image href={quoteattr(image_href)} width="{width}" height="{height}"/>')
+
+    for shape in overlay["shapes"]:
+        style = overlay["styles"][shape["class"]]
+        p = shape["points"]
+        stroke = f'stroke="{style["color"]}" stroke-width="{style.get("width", 1)}"'
+        if shape["type"] == "rect":
+            parts.append(f'<rect class="{shape["class"]}" x="{p[0]}" y="{p[1]}" width="{p[2] - p[0]}" '
+                         f'height="{p[3] - p[1]}" fill="none" {stroke}/>')
+        elif shape["type"] == "line":
+            parts.append(f'<line class="{shape["class"]}" x1="{p[0]}" y1="{p[1]}" x2="{p[2]}" y2="{p[3]}" {stroke}/>')
+        elif shape["type"] == "polyline":
+            coords = " ".join(f"{x},{y}" for x, y in zip(p[::2], p[1::2]))
+            parts.append(f'<polyline class="{shape["class"]}" points="{coords}" fill="none" {stroke}/>')
+        elif shape["type"] == "dot":
+            parts.append(f'<circle class="{shape["class"]}" cx="{p[0]}" cy="{p[1]}" r="{style["radius"]}" '
+                         f'fill="{style["color"]}"/>')
+
+    panel = overlay["panel"]
+    parts.append(f'<title>{escape(panel["heading"])}: {panel["angle"]} degrees, {escape(panel["verdict"])}</title>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def _bgr(color):
+    """RGB hex as OpenCV BGR"""
+    return (int(color[5:7], 16), int(color[3:5], 16), int(color[1:3], 16))
+
+
+def scale_overlay(overlay, scale):
+    """
+    Overlay of the same study on a resized upload
+
+    Args:
+        overlay: Dict from build_overlay()
+        scale: Size factor of the resized upload
+
+    Returns:
+        New overlay with scaled primitive coordinates
+    """
+    shapes = [
+        dict(shape, points=[int(round(v * scale)) for v in shape["points"]])
+        for shape in overlay["shapes"]
+    ]
+    size = overlay["size"]
+    if size is not None:
+        size = [int(round(v * scale)) for v in size]
+    return dict(overlay, shapes=shapes, size=size)
+
+
+def draw_overlay(img, overlay):
+    """
+    Burn overlay primitives into a film, as the batch report does
+
+    Args:
+        img: BGR film (drawn in place)
+        overlay: Dict from build_overlay() in the film's pixel coordinates
+
+    Returns:
+        The film
+    """
+    for shape in overlay["shapes"]:
+        style = overlay["styles"][shape["class"]]
+        color = _bgr(style["color"])
+        p = shape["points"]
+        if shape["type"] == "rect":
+            cv2.rectangle(img, (p[0], p[1]), (p[2], p[3]), color, style["width"])
+        elif shape["type"] == "line":
+            line_type = cv2.LINE_AA if shape["class"] == "limit" else cv2.LINE_8
+            cv2.line(img, (p[0], p[1]), (p[2], p[3]), color, style["width"], line_type)
+        elif shape["type"] == "polyline":
+            pts = np.array(p, dtype=np.int32).reshape(-1, 2)
+            cv2.polylines(img, [pts], False, color, style["width"])
+        elif shape["type"] == "dot":
+            cv2.circle(img, (p[0], p[1]), style["radius"], color, -1)
+    return img
+
+
+def overlay_from_store(key, thresholds=None, store=None):
+    """
+    Rebuild the overlay of a stored study without inference
+
+    Args:
+        key: Detection store key
+        thresholds: Rule thresholds (defaults to DEFAULT_THRESHOLDS)
+        store: DetectionStore (the default store if omitted)
+
+    Returns:
+        Overlay dict, or None if the key is unknown
+    """
+    store = store or default_store()
+    record = store.record(key)
+    if record is None:
+        return None
+
+    column = spine_geometry.VertebraColumn(store.load(key))
+    image_type = column.image_type()
+    flags = column.diseases(image_type, thresholds)
+    return build_overlay(column, flags, image_type, record["size"], record["upload"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or (len(sys.argv) > 2 and sys.argv[2] != "--svg"):
+        print("Usage: python report_overlay.py <detection_key> [--svg]")
+        sys.exit(1)
+
+    overlay = overlay_from_store(sys.argv[1])
+    if overlay is None:
+        print(f"Unknown detection key: {sys.argv[1]}", file=sys.stderr)
+        sys.exit(1)
+
+    if len(sys.argv) > 2:
+        print(overlay_svg(overlay, f"/uploads/{overlay['image']}"))
+    else:
+        print(json.dumps(overlay, separators=(",", ":")))
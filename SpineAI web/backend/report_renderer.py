@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Report Renderer
+Draws the doctor report panel next to an annotated radiograph, reusing
+cached panel templates and text metrics between films
+"""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+PANEL_BACKGROUND = 30
+
+# (label, findings key, color) in panel order
+FINDING_ROWS = [
+    ("Compression Frac.", "compression_fracture", (0, 0, 255)),  # Red
+    ("Disc Herniation", "herniated_disc", (255, 0, 255)),  # Magenta
+    ("Spondylolisthesis", "listhesis", (0, 165, 255)),  # Orange
+]
+
+# Widest fixed strings; the panel also grows with the file name
+WIDTH_STRINGS = ("AI RADIOLOGY REPORT", "RETROLISTHESIS: 10")
+
+
+@lru_cache(maxsize=1024)
+def text_size(text, scale, thickness):
+    """Cached cv2.getTextSize ((width, height), baseline)"""
+    return cv2.getTextSize(text, FONT, scale, thickness)
+
+
+def panel_style(height):
+    """
+    Font metrics of a panel for a film height
+
+    Args:
+        height: Image height in pixels
+
+    Returns:
+        (font_scale, thickness, line_height)
+    """
+    font_scale = max(0.60, height / 1100)
+    thickness = max(1, int(font_scale * 2))
+    line_h = int(45 * font_scale)
+    return font_scale, thickness, line_h
+
+
+def panel_width(height, file_name):
+    """Width of the report panel for a film height and file name"""
+    font_scale, thickness, _ = panel_style(height)
+    texts = WIDTH_STRINGS + (f"ID: {file_name}",)
+    return max(text_size(t, font_scale, thickness)[0][0] for t in texts) + 80
+
+
+def angle_heading(image_type):
+    """Panel heading of the measured angle"""
+    return "SCOLIOSIS (Cobb)" if "AP" in image_type else "LORDOSIS / KYPHOSIS"
+
+
+def angle_comment(image_type, angle):
+    """
+    Interpretation of the measured angle
+
+    Returns:
+        (comment, color); comment is empty for a normal angle
+    """
+    if "AP" in image_type:
+        if angle > 10:
+            return "SCOLIOSIS (+)", (0, 0, 255)
+    elif angle < 20:
+        return "HYPOLORDOSIS (Flat)", (0, 0, 255)
+    elif angle > 60:
+        return "HYPERLORDOSIS", (0, 165, 255)
+    return "", (0, 255, 0)
+
+
+@lru_cache(maxsize=16)
+def panel_template(height, width, heading):
+    """
+    Panel background with the fixed header and angle heading drawn
+
+    Cached per (height, width, heading); the returned array is read-only
+    and must be copied before drawing.
+    """
+    font_scale, thickness, line_h = panel_style(height)
+    panel = np.full((height, width, 3), PANEL_BACKGROUND, dtype=np.uint8)
+
+    x = 20
+    y = 50
+    cv2.putText(panel, "AI RADIOLOGY", (x, y), FONT, font_scale * 1.1, (0, 255, 255), thickness)
+    y += int(line_h * 1.5) * 2
+    cv2.putText(panel, f"{heading}:", (x, y), FONT, font_scale, (255, 255, 255), 1)
+
+    panel.flags.writeable = False
+    return panel
+
+
+def _draw_dynamic_fields(panel, file_name, image_type, angle, findings):
+    """Draw the per-film fields onto a panel holding the template"""
+    height, width = panel.shape[:2]
+    font_scale, thickness, line_h = panel_style(height)
+
+    x = 20
+    y = 50 + int(line_h * 1.5)
+    cv2.putText(panel, f"ID: {file_name[:18]}", (x, y), FONT, font_scale * 0.7, (200, 200, 200), 1)
+    y += int(line_h * 1.5) + line_h
+
+    # Angle value
+    comment, color = angle_comment(image_type, angle)
+    cv2.putText(panel, f"{angle:.1f} Degrees", (x, y), FONT, font_scale * 1.4, color, thickness + 1)
+    y += line_h
+    if comment:
+        cv2.putText(panel, comment, (x, y), FONT, font_scale * 0.8, color, 1)
+        y += line_h
+    y += int(line_h * 0.5)
+
+    # Findings list
+    cv2.putText(panel, "FINDINGS:", (x, y), FONT, font_scale, (255, 255, 255), thickness)
+    y += line_h
+    for label, key, row_color in FINDING_ROWS:
+        count = findings[key]
+        # If disease present use vivid color, else dim gray
+        dot = row_color if count > 0 else (80, 80, 80)
+        text_color = (255, 255, 255) if count > 0 else (120, 120, 120)
+        text = f"{label}: {count}" if count > 0 else f"{label}: NONE"
+        cv2.circle(panel, (x + 15, y - 8), int(6 * font_scale), dot, -1)
+        cv2.putText(panel, text, (x + 35, y), FONT, font_scale * 0.75, text_color, 1)
+        y += line_h
+
+    # Result box
+    y += 30
+    risk = sum(findings[key] for _, key, _ in FINDING_ROWS) + (1 if comment else 0)
+    background = (0, 0, 200) if risk > 0 else (0, 180, 0)
+    message = "PATHOLOGY DETECTED" if risk > 0 else "NORMAL"
+    box_h = int(line_h * 1.8)
+    cv2.rectangle(panel, (20, y), (width - 20, y + box_h), background, -1)
+
+    (text_w, text_h), _ = text_size(message, font_scale, thickness)
+    tx = 20 + ((width - 40) - text_w) // 2
+    ty = y + (box_h + text_h) // 2
+    cv2.putText(panel, message, (tx, ty), FONT, font_scale, (255, 255, 255), thickness)
+
+
+def draw_report_panel(height, file_name, image_type, angle, findings):
+    """
+    Render the report panel on its own
+
+    Args:
+        height: Height of the annotated film
+        file_name: Study file name shown as ID
+        image_type: "AP", "LATERAL" or "UNKNOWN"
+        angle: Cobb / lordosis angle in degrees
+        findings: Counts keyed like DiseaseFlags.counts()
+
+    Returns:
+        (height, panel_width, 3) uint8 panel
+    """
+    width = panel_width(height, file_name)
+    panel = panel_template(height, width, angle_heading(image_type)).copy()
+    _draw_dynamic_fields(panel, file_name, image_type, angle, findings)
+    return panel
+
+
+def report_canvas(height, width, file_name):
+    """
+    Allocate the output buffer of a report
+
+    Annotating the film directly in ``canvas[:, :width]`` lets
+    render_report skip copying the film.
+
+    Returns:
+        Uninitialized (height, width + panel_width, 3) uint8 buffer
+    """
+    return np.empty((height, width + panel_width(height, file_name), 3), dtype=np.uint8)
+
+
+def render_report(img, file_name, image_type, angle, findings, out=None):
+    """
+    Join an annotated film and its report panel
+
+    The cached template goes straight into the right side of the output
+    and only the per-film fields are drawn there; the film is copied at
+    most once (not at all when it is already ``out[:, :w]``).
+
+    Args:
+        img: Annotated BGR film
+        file_name: Study file name shown as ID
+        image_type: "AP", "LATERAL" or "UNKNOWN"
+        angle: Cobb / lordosis angle in degrees
+        findings: Counts keyed like DiseaseFlags.counts()
+        out: Optional buffer from report_canvas()
+
+    Returns:
+        Report image (``out`` when given)
+    """
+    height, w = img.shape[:2]
+    if out is None:
+        out = report_canvas(height, w, file_name)
+
+    template = panel_template(height, panel_width(height, file_name), angle_heading(image_type))
+    if out.shape != (height, w + template.shape[1], 3):
+        raise ValueError(f"Output buffer shape {out.shape} does not fit the report")
+
+    film = out[:, :w]
+    if img.ctypes.data != film.ctypes.data or img.strides != film.strides:
+        film[...] = img
+    panel = out[:, w:]
+    panel[...] = template
+    _draw_dynamic_fields(panel, file_name, image_type, angle, findings)
+    return out
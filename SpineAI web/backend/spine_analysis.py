@@ -7,134 +7,163 @@ Detects spine diseases using trained YOLO model
 from ultralytics import YOLO
 import cv2
 import numpy as np
-import math
 import sys
 import json
 import os
 
+import spine_geometry
+import image_gate
+import perceptual_index
+import report_overlay
+from detection_store import default_store, model_hash
+
 
 def smooth_points(points, window_size=3):
     """Smooth points for Cobb angle calculation"""
-    if len(points) < window_size:
-        return points
-    
-    pts = np.array(points)
-    new_pts = []
-    
-    for i in range(len(pts)):
-        start = max(0, i - 1)
-        end = min(len(pts), i + 2)
-        avg_x = np.mean(pts[start:end, 0])
-        avg_y = np.mean(pts[start:end, 1])
-        new_pts.append((int(avg_x), int(avg_y)))
-    
-    return new_pts
+    smoothed = spine_geometry.smooth_points(points, window_size)
+    return [tuple(p) for p in np.asarray(smoothed).tolist()]
 
 
 def calculate_cobb_angle(centers):
     """Calculate Cobb angle for spine curvature"""
-    if len(centers) < 5:
-        return 0, []
-    
-    smooth_pts = smooth_points(centers)
-    angles = []
-    
-    for i in range(2, len(smooth_pts) - 2):
-        p_prev = smooth_pts[i - 1]
-        p_next = smooth_pts[i + 1]
-        
-        dy = p_next[1] - p_prev[1]
-        dx = p_next[0] - p_prev[0]
-        
-        if dy == 0:
-            dy = 0.001
-        
-        angle = math.degrees(math.atan(dx / dy))
-        angles.append(angle)
-    
-    if not angles:
-        return 0, smooth_pts
-    
-    cobb_val = max(angles) - min(angles)
-    return abs(cobb_val), smooth_pts
+    measurement = spine_geometry.cobb_angle(centers)
+    return measurement.angle, [tuple(p) for p in measurement.smooth_points.tolist()]
 
 
 def analyze_image_type(boxes):
     """Determine image type (AP or LATERAL)"""
-    ratios = [(b[2] - b[0]) / (b[3] - b[1]) for b in boxes]
-    avg = np.mean(ratios)
-    # Vertebrae appear wider in AP views
-    return "AP" if avg > 1.35 else "LATERAL"
+    return spine_geometry.analyze_image_type(boxes)
 
 
 def detect_diseases(vertebrae, centers, heights, avg_height, image_type):
     """Detect spine diseases using geometric analysis"""
-    findings = {
-        "compression_fracture": 0,
-        "herniated_disc": 0,
-        "listhesis": 0
-    }
-    
-    # If no vertebrae detected, return empty findings
-    if len(vertebrae) == 0:
-        return findings
-    
-    for i, v in enumerate(vertebrae):
-        h = v[3] - v[1]  # Height
-        w = v[2] - v[0]  # Width
-        cx = centers[i][0]  # X center coordinate
+    flags = spine_geometry.detect_diseases(vertebrae, image_type, centers=np.asarray(centers).reshape(-1, 2))
+    return flags.counts()
+
+
+def persist_detections(image_path, model_path, boxes, image_size):
+    """Save raw detections so thresholds can be re-applied without inference"""
+    try:
+        return default_store().append(os.path.basename(image_path), model_hash(model_path), boxes, image_size)
+    except Exception as e:
+        # Persisting is best effort; stdout is reserved for the JSON result
+        print(f"Detection store error: {e}", file=sys.stderr)
+        return None
+
+
+_near_duplicate_index = None
+
+
+def near_duplicate_index():
+    """Process-wide perceptual hash index (band tables survive across uploads)"""
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        _near_duplicate_index = perceptual_index.PerceptualHashIndex()
+    return _near_duplicate_index
+
+
+def find_near_duplicate(image_path, model_path, image=None):
+    """Reuse stored detections of a near-identical earlier upload"""
+    try:
+        if image is None:
+            gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            return None
+        image_size = (gray.shape[1], gray.shape[0])
+        image_hash = perceptual_index.dhash(gray)
+        thumb = perceptual_index.thumbnail(gray)
+
+        lookup = {"hash": image_hash, "thumb": thumb, "size": image_size, "match": None, "boxes": None}
+        match = near_duplicate_index().lookup(image_hash, thumb, image_size, model_hash(model_path))
+        if match is not None:
+            stored = default_store().load(match["key"])
+            if stored is not None:
+                lookup["match"] = match["key"]
+                lookup["boxes"] = perceptual_index.remap_boxes(stored, match["size"], image_size)
+        return lookup
+    except Exception as e:
+        print(f"Near-duplicate lookup error: {e}", file=sys.stderr)
+        return None
+
+
+def gate_rejection(gate):
+    """Error result for an upload the image gate routes away from spine analysis"""
+    if gate.kind == "photo":
+        error = "⚠️ This appears to be a POSTURE PHOTO, not an X-ray. Please use 'Posture Photo Analysis' instead of 'Spine X-Ray Analysis'."
+    else:
+        error = f"⚠️ Image unusable: {gate.reason}. Please upload a clear spine X-ray."
+    return {"success": False, "error": error, "rejected": True, "gate": image_gate.gate_dict(gate)}
+
+
+def index_image(image_hash, thumb, detection_key, image_size):
+    """Make an analyzed upload findable by later near duplicates"""
+    try:
+        near_duplicate_index().add(image_hash, thumb, detection_key, image_size)
+    except Exception as e:
+        print(f"Near-duplicate index error: {e}", file=sys.stderr)
+
+
+def analyze_spine(image_path, model_path, model=None, progress=None, image=None):
+    """
+    Main analysis function
+
+    Args:
+        image_path: Path to the X-ray image
+        model_path: Path to the YOLO weights
+        model: Already loaded YOLO model (long-lived workers), optional
+        progress: Optional callback receiving the stages "decoded",
+            "inferred" and "scored" as they finish
+        image: Already decoded BGR image (uploads handed over in memory);
+            image_path then only names the study and is never read
+    """
+    progress = progress or (lambda stage: None)
+    try:
+        # Decode once; the gate, the near-duplicate lookup and the model share the image
+        if image is None:
+            image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            return {
+                "success": False,
+                "error": "Image could not be decoded"
+            }
         
-        # 1. COMPRESSION FRACTURE - Strict criteria
-        # Only flag if height loss is very significant (>40%)
-        if i > 0 and i < len(vertebrae) - 1:
-            local_avg = (heights[i - 1] + heights[i + 1]) / 2
-            if h < (local_avg * 0.60):  # More than 40% height loss
-                findings["compression_fracture"] += 1
+        # Reject photos and garbage uploads before spending a forward pass on them
+        gate = image_gate.classify_image(image)
+        if gate.kind != "radiograph":
+            return gate_rejection(gate)
         
-        # 2. LISTHESIS - Strict alignment check
-        # Only flag if severely misaligned
-        if i > 0 and i < len(vertebrae) - 1:
-            prev_x = centers[i - 1][0]
-            next_x = centers[i + 1][0]
-            expected_x = (prev_x + next_x) / 2
-            
-            # Much stricter tolerance
-            tolerance = 0.35 if image_type == "AP" else 0.40
-            
-            if abs(cx - expected_x) > (w * tolerance):
-                findings["listhesis"] += 1
+        # Reuse detections of a near-duplicate upload (recompressed/resized copy)
+        near = find_near_duplicate(image_path, model_path, image)
+        progress("decoded")
         
-        # 3. DISC HERNIATION - Very strict space check
-        # Only flag if space is critically narrow
-        if i < len(vertebrae) - 1:
-            space = vertebrae[i + 1][1] - v[3]
-            ref_h = (h + heights[i + 1]) / 2
+        if near is not None and near["boxes"] is not None:
+            boxes = near["boxes"]
+            image_size = near["size"]
+        else:
+            # 1. Load YOLO model (long-lived workers pass a cached one)
+            if model is None:
+                model = YOLO(model_path)
             
-            # Much stricter limit
-            limit = 0.08 if image_type == "LATERAL" else 0.06
+            # 2. Analyze image
+            results = model.predict(
+                source=image,
+                save=False,
+                conf=0.25,  # Minimum confidence threshold
+                verbose=False
+            )
             
-            if space < (ref_h * limit) and space > 0:
-                findings["herniated_disc"] += 1
-    
-    return findings
-
-
-def analyze_spine(image_path, model_path):
-    """Main analysis function"""
-    try:
-        # 1. Load YOLO model
-        model = YOLO(model_path)
-        
-        # 2. Analyze image
-        results = model.predict(
-            source=image_path,
-            save=False,
-            conf=0.25,  # Minimum confidence threshold
-            verbose=False
-        )
+            # 3. Get detected vertebrae
+            boxes = results[0].boxes.data.cpu().numpy()
+            orig_h, orig_w = results[0].orig_shape
+            image_size = (orig_w, orig_h)
+        progress("inferred")
         
-        # 3. Get detected vertebrae
-        boxes = results[0].boxes.data.cpu().numpy()
+        detection_key = persist_detections(image_path, model_path, boxes, image_size)
+        near_duplicate_of = near["match"] if near is not None else None
+        if near is not None and near_duplicate_of is None and detection_key is not None:
+            index_image(near["hash"], near["thumb"], detection_key, image_size)
         
         if len(boxes) < 3:
             return {
@@ -143,30 +172,20 @@ def analyze_spine(image_path, model_path):
             }
         
         # 4. Sort vertebrae by vertical position (top to bottom)
-        vertebrae = sorted([b for b in boxes], key=lambda x: (x[1] + x[3]) / 2)
+        column = spine_geometry.VertebraColumn(boxes)
         
         # 5. Determine image type
-        image_type = analyze_image_type(vertebrae)
-        
-        # 6. Calculate vertebral centers and heights
-        centers = []
-        heights = []
-        
-        for v in vertebrae:
-            cx = int((v[0] + v[2]) / 2)  # X center
-            cy = int((v[1] + v[3]) / 2)  # Y center
-            centers.append((cx, cy))
-            heights.append(v[3] - v[1])
-        
-        avg_height = np.mean(heights)
+        image_type = column.image_type()
         
-        # 7. Detect diseases using geometric analysis
-        findings = detect_diseases(vertebrae, centers, heights, avg_height, image_type)
+        # 6. Detect diseases using geometric analysis (per-vertebra masks)
+        flags = column.diseases(image_type)
+        findings = flags.counts()
         
-        # 8. Calculate Cobb angle
-        cobb_angle, _ = calculate_cobb_angle(centers)
+        # 7. Calculate Cobb angle
+        measurement = column.cobb()
+        cobb_angle = measurement.angle
         
-        # 9. Determine severity and generate recommendations
+        # 8. Determine severity and generate recommendations
         severity = "normal"
         consult_doctor = False
         recommendations = []
@@ -215,24 +234,31 @@ def analyze_spine(image_path, model_path):
         if not consult_doctor:
             recommendations.append("✅ Normal spine anatomy detected. Routine check-ups recommended.")
         
-        # 10. Calculate health score (0-100)
+        # 9. Calculate health score (0-100)
         score = max(0, 100 - (
             findings["compression_fracture"] * 30 +
             findings["herniated_disc"] * 20 +
             findings["listhesis"] * 15
         ))
         
-        # 11. Return results
+        # 10. Return results
+        progress("scored")
         return {
             "success": True,
             "imageType": image_type,
             "cobbAngle": round(cobb_angle, 2),
-            "vertebraeCount": len(vertebrae),
+            "vertebraeCount": len(column),
             "findings": findings,
             "severity": severity,
             "consultDoctor": consult_doctor,
             "recommendations": recommendations,
-            "score": int(score)
+            "score": int(score),
+            "detectionKey": detection_key,
+            "vertebrae": column.to_dict(flags),
+            "nearDuplicateOf": near_duplicate_of,
+            "overlay": report_overlay.build_overlay(
+                column, flags, image_type, image_size, os.path.basename(image_path), measurement
+            )
         }
         
     except Exception as e:
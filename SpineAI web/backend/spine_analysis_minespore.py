@@ -19,11 +19,12 @@ except ImportError:
 
 import cv2
 import numpy as np
-import math
 import sys
 import json
 import os
 
+import spine_geometry
+
 
 class SpineAnalyzer:
     """Spine analyzer using Minespore and ONNX model"""
@@ -160,102 +161,22 @@ class SpineAnalyzer:
     
     def smooth_points(self, points, window_size=3):
         """Smooth points for Cobb angle calculation"""
-        if len(points) < window_size:
-            return points
-        
-        pts = np.array(points)
-        new_pts = []
-        
-        for i in range(len(pts)):
-            start = max(0, i - 1)
-            end = min(len(pts), i + 2)
-            avg_x = np.mean(pts[start:end, 0])
-            avg_y = np.mean(pts[start:end, 1])
-            new_pts.append((int(avg_x), int(avg_y)))
-        
-        return new_pts
+        smoothed = spine_geometry.smooth_points(points, window_size)
+        return [tuple(p) for p in np.asarray(smoothed).tolist()]
     
     def calculate_cobb_angle(self, centers):
         """Calculate Cobb angle for spine curvature"""
-        if len(centers) < 5:
-            return 0, []
-        
-        smooth_pts = self.smooth_points(centers)
-        angles = []
-        
-        for i in range(2, len(smooth_pts) - 2):
-            p_prev = smooth_pts[i - 1]
-            p_next = smooth_pts[i + 1]
-            
-            dy = p_next[1] - p_prev[1]
-            dx = p_next[0] - p_prev[0]
-            
-            if dy == 0:
-                dy = 0.001
-            
-            angle = math.degrees(math.atan(dx / dy))
-            angles.append(angle)
-        
-        if not angles:
-            return 0, smooth_pts
-        
-        cobb_val = max(angles) - min(angles)
-        return abs(cobb_val), smooth_pts
+        measurement = spine_geometry.cobb_angle(centers)
+        return measurement.angle, [tuple(p) for p in measurement.smooth_points.tolist()]
     
     def analyze_image_type(self, boxes):
         """Determine image type (AP or LATERAL)"""
-        if len(boxes) == 0:
-            return "UNKNOWN"
-        
-        ratios = [(b[2] - b[0]) / (b[3] - b[1]) for b in boxes]
-        avg = np.mean(ratios)
-        # Vertebrae appear wider in AP views
-        return "AP" if avg > 1.35 else "LATERAL"
+        return spine_geometry.analyze_image_type(boxes)
     
     def detect_diseases(self, vertebrae, centers, heights, avg_height, image_type):
         """Detect spine diseases using geometric analysis"""
-        findings = {
-            "compression_fracture": 0,
-            "herniated_disc": 0,
-            "listhesis": 0
-        }
-        
-        if len(vertebrae) == 0:
-            return findings
-        
-        for i, v in enumerate(vertebrae):
-            h = v[3] - v[1]  # Height
-            w = v[2] - v[0]  # Width
-            cx = centers[i][0]  # X center coordinate
-            
-            # 1. COMPRESSION FRACTURE
-            if i > 0 and i < len(vertebrae) - 1:
-                local_avg = (heights[i - 1] + heights[i + 1]) / 2
-                if h < (local_avg * 0.60):  # More than 40% height loss
-                    findings["compression_fracture"] += 1
-            
-            # 2. LISTHESIS
-            if i > 0 and i < len(vertebrae) - 1:
-                prev_x = centers[i - 1][0]
-                next_x = centers[i + 1][0]
-                expected_x = (prev_x + next_x) / 2
-                
-                tolerance = 0.35 if image_type == "AP" else 0.40
-                
-                if abs(cx - expected_x) > (w * tolerance):
-                    findings["listhesis"] += 1
-            
-            # 3. DISC HERNIATION
-            if i < len(vertebrae) - 1:
-                space = vertebrae[i + 1][1] - v[3]
-                ref_h = (h + heights[i + 1]) / 2
-                
-                limit = 0.08 if image_type == "LATERAL" else 0.06
-                
-                if space < (ref_h * limit) and space > 0:
-                    findings["herniated_disc"] += 1
-        
-        return findings
+        flags = spine_geometry.detect_diseases(vertebrae, image_type, centers=np.asarray(centers).reshape(-1, 2))
+        return flags.counts()
     
     def analyze_spine(self, image_path):
         """
@@ -298,15 +219,16 @@ class SpineAnalyzer:
                 }
             
             # Sort vertebrae by vertical position (top to bottom)
-            vertebrae = sorted([b for b in boxes], key=lambda x: (x[1] + x[3]) / 2)
+            column = spine_geometry.VertebraColumn(boxes)
+            vertebrae = column.boxes
             
             # Determine image type
-            image_type = self.analyze_image_type(vertebrae)
+            image_type = column.image_type()
             
             # Calculate centers and heights
-            centers = [((v[0] + v[2]) / 2, (v[1] + v[3]) / 2) for v in vertebrae]
-            heights = [v[3] - v[1] for v in vertebrae]
-            avg_height = np.mean(heights)
+            centers = spine_geometry.box_centers(vertebrae, integer=False)
+            heights = column.heights
+            avg_height = float(np.mean(heights))
             
             # Calculate Cobb angle
             cobb_angle, smooth_centers = self.calculate_cobb_angle(centers)
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Spine Geometry Engine
+Vectorized Cobb angle, smoothing and image type analysis on (N, 4) box arrays
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+# Vertebrae appear wider in AP views
+AP_RATIO_THRESHOLD = 1.35
+
+# Minimum vertebra count for a Cobb measurement
+MIN_COBB_VERTEBRAE = 5
+
+# Segments ignored at each end (natural curves at the ends of the column)
+END_TRIM = 2
+
+# Replacement for a zero vertical step so near-horizontal segments stay finite
+ZERO_DY = 0.001
+
+
+# Disease rule thresholds used by the web API (spine_analysis.py)
+DEFAULT_THRESHOLDS = {
+    # Flag compression when height < local average * ratio
+    "compression_ratio": 0.60,
+    # Compare end vertebrae against the column mean (batch reports do)
+    "compression_at_ends": False,
+    # Listhesis when |cx - expected_x| > width * tolerance
+    "listhesis_tolerance": {"AP": 0.35, "LATERAL": 0.40, "UNKNOWN": 0.40},
+    # Herniation when 0 < disc space < mean height of the pair * limit
+    "herniation_limit": {"AP": 0.06, "LATERAL": 0.08, "UNKNOWN": 0.06},
+}
+
+# Thresholds of the desktop batch report (omurgahastalıktespiti.py)
+REPORT_THRESHOLDS = {
+    "compression_ratio": 0.70,
+    "compression_at_ends": True,
+    "listhesis_tolerance": {"AP": 0.25, "LATERAL": 0.30, "UNKNOWN": 0.30},
+    "herniation_limit": {"AP": 0.09, "LATERAL": 0.13, "UNKNOWN": 0.09},
+}
+
+
+CobbMeasurement = namedtuple(
+    "CobbMeasurement",
+    ["angle", "smooth_points", "idx_max", "idx_min", "angle_max", "angle_min"]
+)
+
+
+def _as_float(boxes):
+    """Float view of a box array, keeping float32 detector output as float32"""
+    boxes = np.asarray(boxes)
+    if boxes.dtype.kind != "f":
+        boxes = boxes.astype(np.float64)
+    return boxes
+
+
+def sort_boxes(boxes):
+    """
+    Sort detections top to bottom by vertical center
+
+    Args:
+        boxes: (N, >=4) array of [x1, y1, x2, y2, ...] rows
+
+    Returns:
+        Sorted copy of the array (stable, same order as sorted())
+    """
+    boxes = np.asarray(boxes)
+    if len(boxes) == 0:
+        return boxes.reshape(0, 6)
+    order = np.argsort((boxes[:, 1] + boxes[:, 3]) / 2, kind="stable")
+    return boxes[order]
+
+
+def box_centers(boxes, integer=True):
+    """
+    Calculate vertebra centers
+
+    Args:
+        boxes: (N, >=4) array of [x1, y1, x2, y2, ...] rows
+        integer: Truncate to pixel coordinates like int() does
+
+    Returns:
+        (N, 2) array of (cx, cy)
+    """
+    boxes = _as_float(boxes)
+    centers = np.empty((len(boxes), 2), dtype=boxes.dtype)
+    centers[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2
+    centers[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2
+    if integer:
+        return np.trunc(centers).astype(np.int64)
+    return centers
+
+
+def box_heights(boxes):
+    """Vertebra heights (y2 - y1) as a float array"""
+    boxes = _as_float(boxes)
+    return boxes[:, 3] - boxes[:, 1]
+
+
+def smooth_points(points, window_size=3):
+    """
+    Smooth points for Cobb angle calculation
+
+    3-tap moving average computed as a box convolution over shifted views;
+    the window shrinks to 2 points at both ends.
+
+    Args:
+        points: (N, 2) array-like of (x, y)
+        window_size: Minimum point count for smoothing
+
+    Returns:
+        (N, 2) int64 array, or the input unchanged if it is too short
+    """
+    if len(points) < window_size:
+        return points
+
+    pts = _as_float(points)
+    sums = np.empty_like(pts)
+    sums[0] = pts[0] + pts[1]
+    sums[1:-1] = pts[:-2] + pts[1:-1] + pts[2:]
+    sums[-1] = pts[-2] + pts[-1]
+
+    counts = np.full((len(pts), 1), 3, dtype=pts.dtype)
+    counts[0] = counts[-1] = 2
+
+    return np.trunc(sums / counts).astype(np.int64)
+
+
+def segment_angles(smooth_pts):
+    """
+    Calculate the deviation from vertical of every measured segment
+
+    The segment at index i runs from point i - 1 to point i + 1; the first
+    and last END_TRIM points are not measured.
+
+    Args:
+        smooth_pts: (N, 2) array of smoothed centers, top to bottom
+
+    Returns:
+        (N - 2 * END_TRIM,) array of angles in degrees
+    """
+    pts = np.asarray(smooth_pts, dtype=np.float64)
+    n = len(pts)
+    if n <= 2 * END_TRIM:
+        return np.empty(0)
+
+    delta = pts[END_TRIM + 1:n - END_TRIM + 1] - pts[END_TRIM - 1:n - END_TRIM - 1]
+    dx = delta[:, 0]
+    dy = np.where(delta[:, 1] == 0, ZERO_DY, delta[:, 1])
+    return np.degrees(np.arctan2(dx, dy))
+
+
+def cobb_angle(centers):
+    """
+    Calculate Cobb angle and limit vertebrae
+
+    Args:
+        centers: (N, 2) array-like of vertebra centers, top to bottom
+
+    Returns:
+        CobbMeasurement with the angle, smoothed centers, the indices of
+        the most tilted vertebrae in each direction and their angles
+    """
+    if len(centers) < MIN_COBB_VERTEBRAE:
+        return CobbMeasurement(0.0, np.empty((0, 2), dtype=np.int64), None, None, 0.0, 0.0)
+
+    smooth_pts = smooth_points(centers)
+    angles = segment_angles(smooth_pts)
+
+    pos_max = int(np.argmax(angles))
+    pos_min = int(np.argmin(angles))
+    angle_max = float(angles[pos_max])
+    angle_min = float(angles[pos_min])
+
+    return CobbMeasurement(
+        abs(angle_max - angle_min),
+        smooth_pts,
+        pos_max + END_TRIM,
+        pos_min + END_TRIM,
+        angle_max,
+        angle_min
+    )
+
+
+def analyze_image_type(boxes):
+    """Determine image type (AP or LATERAL)"""
+    boxes = _as_float(boxes)
+    if len(boxes) == 0:
+        return "UNKNOWN"
+
+    ratios = (boxes[:, 2] - boxes[:, 0]) / (boxes[:, 3] - boxes[:, 1])
+    return "AP" if ratios.mean() > AP_RATIO_THRESHOLD else "LATERAL"
+
+
+class DiseaseFlags(namedtuple("DiseaseFlags", ["compression_fracture", "herniated_disc", "listhesis"])):
+    """
+    Per-vertebra boolean masks, top to bottom
+
+    herniated_disc[i] refers to the disc space below vertebra i.
+    """
+    __slots__ = ()
+
+    def counts(self):
+        """Finding counters in the API format"""
+        return {
+            "compression_fracture": int(self.compression_fracture.sum()),
+            "herniated_disc": int(self.herniated_disc.sum()),
+            "listhesis": int(self.listhesis.sum())
+        }
+
+    def any(self):
+        """Mask of vertebrae with any finding"""
+        return self.compression_fracture | self.herniated_disc | self.listhesis
+
+
+def detect_diseases(boxes, image_type, thresholds=None, centers=None):
+    """
+    Detect spine diseases using geometric analysis
+
+    All rules are evaluated for every vertebra at once on neighbor-shifted
+    views of heights, centers and disc spaces.
+
+    Args:
+        boxes: (N, >=4) array of vertebrae, sorted top to bottom
+        image_type: "AP", "LATERAL" or "UNKNOWN"
+        thresholds: Rule thresholds (defaults to DEFAULT_THRESHOLDS)
+        centers: Optional (N, 2) centers; integer box centers by default
+
+    Returns:
+        DiseaseFlags with one boolean mask per finding
+    """
+    t = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    boxes = _as_float(boxes)
+    n = len(boxes)
+
+    compression = np.zeros(n, dtype=bool)
+    herniation = np.zeros(n, dtype=bool)
+    listhesis = np.zeros(n, dtype=bool)
+
+    if n == 0:
+        return DiseaseFlags(compression, herniation, listhesis)
+
+    heights = boxes[:, 3] - boxes[:, 1]
+    widths = boxes[:, 2] - boxes[:, 0]
+    cx = (box_centers(boxes) if centers is None else np.asarray(centers))[:, 0]
+
+    if n > 2:
+        # 1. COMPRESSION FRACTURE - height against both neighbors
+        local_avg = (heights[:-2] + heights[2:]) / 2
+        compression[1:-1] = heights[1:-1] < local_avg * t["compression_ratio"]
+
+        # 2. LISTHESIS - center against the line through both neighbors
+        expected_x = (cx[:-2] + cx[2:]) / 2
+        tolerance = t["listhesis_tolerance"][image_type]
+        listhesis[1:-1] = np.abs(cx[1:-1] - expected_x) > widths[1:-1] * tolerance
+
+    if t["compression_at_ends"]:
+        ends = [0, n - 1]
+        compression[ends] = heights[ends] < heights.mean() * t["compression_ratio"]
+
+    if n > 1:
+        # 3. DISC HERNIATION - space to the next vertebra
+        space = boxes[1:, 1] - boxes[:-1, 3]
+        ref_h = (heights[:-1] + heights[1:]) / 2
+        limit = t["herniation_limit"][image_type]
+        herniation[:-1] = (space < ref_h * limit) & (space > 0)
+
+    return DiseaseFlags(compression, herniation, listhesis)
+
+
+class VertebraColumn:
+    """
+    Vertebrae of one study as a structure of arrays, top to bottom
+
+    Detections are sorted once with argsort and stored as one contiguous
+    (6, N) block, so every field (x1, y1, x2, y2, conf, cls) is a
+    contiguous array. Centers and heights are computed once and shared by
+    geometry, rendering and serialization.
+    """
+    __slots__ = ("_data", "centers", "heights")
+
+    FIELDS = ("x1", "y1", "x2", "y2", "conf", "cls")
+
+    def __init__(self, boxes):
+        """
+        Build a column from raw detections
+
+        Args:
+            boxes: (N, >=4) [x1, y1, x2, y2, conf, cls] rows in any order
+        """
+        boxes = _as_float(boxes)
+        if boxes.size == 0:
+            boxes = boxes.reshape(0, len(self.FIELDS))
+
+        order = np.argsort((boxes[:, 1] + boxes[:, 3]) / 2, kind="stable")
+        width = min(boxes.shape[1], len(self.FIELDS))
+        self._data = np.zeros((len(self.FIELDS), len(boxes)), dtype=boxes.dtype)
+        self._data[:width] = boxes[order, :width].T
+
+        self.centers = box_centers(self.boxes)
+        self.heights = self.y2 - self.y1
+
+    def __len__(self):
+        return self._data.shape[1]
+
+    @property
+    def x1(self):
+        return self._data[0]
+
+    @property
+    def y1(self):
+        return self._data[1]
+
+    @property
+    def x2(self):
+        return self._data[2]
+
+    @property
+    def y2(self):
+        return self._data[3]
+
+    @property
+    def conf(self):
+        return self._data[4]
+
+    @property
+    def cls(self):
+        return self._data[5]
+
+    @property
+    def boxes(self):
+        """(N, 4) view of the sorted [x1, y1, x2, y2] rows"""
+        return self._data[:4].T
+
+    def rows(self):
+        """(N, 6) view of the sorted detections"""
+        return self._data.T
+
+    def image_type(self):
+        """Determine image type (AP or LATERAL)"""
+        return analyze_image_type(self.boxes)
+
+    def cobb(self):
+        """Cobb angle and limit vertebrae of the column"""
+        return cobb_angle(self.centers)
+
+    def diseases(self, image_type, thresholds=None):
+        """Per-vertebra disease masks of the column"""
+        return detect_diseases(self.boxes, image_type, thresholds, centers=self.centers)
+
+    def to_dict(self, flags=None):
+        """
+        Compact columnar serialization for the JSON API
+
+        Args:
+            flags: Optional DiseaseFlags to include per vertebra
+
+        Returns:
+            Dict of per-field lists
+        """
+        data = {
+            "boxes": np.round(self.boxes.astype(np.float64), 1).tolist(),
+            "conf": np.round(self.conf.astype(np.float64), 3).tolist(),
+            "centers": self.centers.tolist()
+        }
+        if flags is not None:
+            data["flags"] = {key: np.flatnonzero(mask).tolist() for key, mask in flags._asdict().items()}
+        return data
+
+
+BatchGeometry = namedtuple(
+    "BatchGeometry",
+    ["order", "image_type", "cobb_angle", "idx_max", "idx_min", "angle_max", "angle_min",
+     "flags", "findings"]
+)
+
+
+def _study_lookup(table, image_type, dtype):
+    """Per-row threshold from an {image type: value} table"""
+    return np.select(
+        [image_type == "AP", image_type == "LATERAL"],
+        [table["AP"], table["LATERAL"]],
+        table["UNKNOWN"]
+    ).astype(dtype)
+
+
+def analyze_batch(boxes, offsets, thresholds=None):
+    """
+    Score many studies at once from concatenated detections
+
+    Study s owns rows offsets[s]:offsets[s + 1] of ``boxes``, in any order.
+    Every stage runs as one vectorized pass over all rows; neighbor rules
+    only pair vertebrae of the same study.
+
+    Args:
+        boxes: (M, >=4) concatenated [x1, y1, x2, y2, ...] rows
+        offsets: (S + 1,) non-decreasing row offsets, offsets[0] == 0
+        thresholds: Rule thresholds (defaults to DEFAULT_THRESHOLDS)
+
+    Returns:
+        BatchGeometry where ``order`` sorts the rows top to bottom within
+        each study (flags follow that order), limit-vertebra indices are
+        positions inside the study (-1 below MIN_COBB_VERTEBRAE) and
+        ``findings`` maps each finding to an (S,) count array
+    """
+    t = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    boxes = _as_float(boxes)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_studies = len(offsets) - 1
+    sizes = np.diff(offsets)
+
+    study = np.repeat(np.arange(n_studies), sizes)
+    order = np.lexsort(((boxes[:, 1] + boxes[:, 3]) / 2, study))
+    boxes = boxes[order]
+    m = len(boxes)
+
+    pos = np.arange(m) - offsets[study]
+    size = sizes[study]
+    has_prev = pos > 0
+    has_next = pos < size - 1
+    interior = has_prev & has_next
+
+    heights = boxes[:, 3] - boxes[:, 1]
+    widths = boxes[:, 2] - boxes[:, 0]
+    centers = box_centers(boxes)
+
+    # --- IMAGE TYPE ---
+    ratio_sum = np.bincount(study, weights=widths / heights, minlength=n_studies)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio_mean = ratio_sum / sizes
+    image_type = np.where(ratio_mean > AP_RATIO_THRESHOLD, "AP", "LATERAL").astype("<U7")
+    image_type[sizes == 0] = "UNKNOWN"
+    row_type = image_type[study]
+
+    # Neighbor-shifted views; rows at study edges are masked out below
+    def prev(a):
+        return np.concatenate([a[:1], a[:-1]])
+
+    def next_(a):
+        return np.concatenate([a[1:], a[-1:]])
+
+    # --- DISEASE RULES ---
+    compression = interior & (heights < (prev(heights) + next_(heights)) / 2 * t["compression_ratio"])
+    if t["compression_at_ends"]:
+        height_mean = np.bincount(study, weights=heights, minlength=n_studies)[study] / size
+        compression |= ~interior & (heights < height_mean * t["compression_ratio"])
+
+    cx = centers[:, 0]
+    expected_x = (prev(cx) + next_(cx)) / 2
+    tolerance = _study_lookup(t["listhesis_tolerance"], row_type, boxes.dtype)
+    listhesis = interior & (np.abs(cx - expected_x) > widths * tolerance)
+
+    space = next_(boxes[:, 1]) - boxes[:, 3]
+    ref_h = (heights + next_(heights)) / 2
+    limit = _study_lookup(t["herniation_limit"], row_type, boxes.dtype)
+    herniation = has_next & (space < ref_h * limit) & (space > 0)
+
+    flags = DiseaseFlags(compression, herniation, listhesis)
+    findings = {
+        key: np.bincount(study, weights=getattr(flags, key), minlength=n_studies).astype(np.int64)
+        for key in DiseaseFlags._fields
+    }
+
+    # --- COBB ANGLE ---
+    pts = centers.astype(np.float64)
+    zero = np.zeros_like(pts)
+    sums = np.where(has_prev[:, None], prev(pts), zero) + pts + np.where(has_next[:, None], next_(pts), zero)
+    smooth_pts = np.trunc(sums / (1 + has_prev + has_next)[:, None])
+
+    measured = (size >= MIN_COBB_VERTEBRAE) & (pos >= END_TRIM) & (pos < size - END_TRIM)
+    delta = next_(smooth_pts) - prev(smooth_pts)
+    dy = np.where(delta[:, 1] == 0, ZERO_DY, delta[:, 1])
+    angles = np.degrees(np.arctan2(delta[:, 0], dy))
+
+    angle_max = np.zeros(n_studies)
+    angle_min = np.zeros(n_studies)
+    idx_max = np.full(n_studies, -1, dtype=np.int64)
+    idx_min = np.full(n_studies, -1, dtype=np.int64)
+
+    has_cobb = sizes >= MIN_COBB_VERTEBRAE
+    if has_cobb.any():
+        starts = offsets[:-1][has_cobb]
+        hi = np.where(measured, angles, -np.inf)
+        lo = np.where(measured, angles, np.inf)
+        angle_max[has_cobb] = np.maximum.reduceat(hi, starts)
+        angle_min[has_cobb] = np.minimum.reduceat(lo, starts)
+
+        # First occurrence, like np.argmax / np.argmin
+        last = m + 1
+        first_max = np.where(measured & (angles == angle_max[study]), pos, last)
+        first_min = np.where(measured & (angles == angle_min[study]), pos, last)
+        idx_max[has_cobb] = np.minimum.reduceat(first_max, starts)
+        idx_min[has_cobb] = np.minimum.reduceat(first_min, starts)
+
+    return BatchGeometry(
+        order,
+        image_type,
+        np.abs(angle_max - angle_min),
+        idx_max,
+        idx_min,
+        angle_max,
+        angle_min,
+        flags,
+        findings
+    )
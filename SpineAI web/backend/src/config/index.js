@@ -9,4 +9,14 @@ export const config = {
   jwtExpire: process.env.JWT_EXPIRE || '7d',
   refreshTokenExpire: process.env.REFRESH_TOKEN_EXPIRE || '30d',
   nodeEnv: process.env.NODE_ENV || 'development',
+  resultCacheEntries: parseInt(process.env.RESULT_CACHE_ENTRIES || '500', 10),
+  resultCacheBytes: parseInt(process.env.RESULT_CACHE_BYTES || String(256 * 1024 * 1024), 10),
+  livePostureWorkers: parseInt(process.env.LIVE_POSTURE_WORKERS || '1', 10),
+  livePostureStreamsPerWorker: parseInt(process.env.LIVE_POSTURE_STREAMS_PER_WORKER || '4', 10),
+  analysisConcurrency: parseInt(process.env.ANALYSIS_CONCURRENCY || '2', 10),
+  analysisQueueDepth: parseInt(process.env.ANALYSIS_QUEUE_DEPTH || '20', 10),
+  analysisJobTtl: parseInt(process.env.ANALYSIS_JOB_TTL || '600', 10),
+  reportCacheBytes: parseInt(process.env.REPORT_CACHE_BYTES || String(512 * 1024 * 1024), 10),
+  frameRing: process.env.FRAME_RING !== 'off',
+  frameRingSlotBytes: parseInt(process.env.FRAME_RING_SLOT_BYTES || String(10 * 1024 * 1024), 10),
 };
@@ -1,7 +1,12 @@
 import Analysis from '../models/Analysis.js';
 import pythonAnalysisService from '../services/pythonAnalysisService.js';
+import reportService, { REPORT_FORMATS } from '../services/reportService.js';
 import postureAnalysisService from '../services/postureAnalysisService.js';
+import analysisQueue, { QueueFullError } from '../services/analysisQueue.js';
+import analysisJobs from '../services/analysisJobs.js';
+import { ImageRejectedError } from '../services/analysisWorker.js';
 import { mockAnalyzeImage } from '../services/mockAnalysisService.js';
+import { discardUpload, ensurePersisted } from '../middleware/upload.js';
 import mongoose from 'mongoose';
 import fs from 'fs';
 import path from 'path';
@@ -25,9 +30,201 @@ if (fs.existsSync(POSTURE_MODEL_PATH)) {
   console.log(`📍 Expected location: ${POSTURE_MODEL_PATH}`);
 }
 
+/**
+ * Reject an upload while the analysis queue is full
+ */
+const sendQueueFull = (res, error) => {
+  res.set('Retry-After', String(error.retryAfter));
+  return res.status(503).json({
+    success: false,
+    message: 'Analysis queue is full, please try again later',
+    retryAfter: error.retryAfter
+  });
+};
+
+/**
+ * Reject an upload the image gate turned away before inference
+ */
+const sendImageRejected = (res, error) => {
+  return res.status(422).json({
+    success: false,
+    message: error.message,
+    gate: error.gate
+  });
+};
+
+/**
+ * Whether the client asked for a background job (?async=true or
+ * Prefer: respond-async) instead of waiting for the analysis
+ */
+const wantsAsync = (req) =>
+  ['1', 'true'].includes(String(req.query.async)) || /respond-async/i.test(req.get('Prefer') || '');
+
+/**
+ * Start a background analysis job and answer 202 with its URLs
+ * The job's queue place is reserved before answering, so concurrent
+ * uploads get their 503 here rather than a failed job later.
+ * @param {Function} run - (file, onStage, reservation) => analysis result
+ * @param {Function} save - (userId, file, result) => { analysis, message, data }
+ */
+const startAnalysisJob = (req, res, kind, run, save) => {
+  let reservation;
+  try {
+    reservation = analysisQueue.reserve();
+  } catch (error) {
+    discardUpload(req.file);
+    return sendQueueFull(res, error);
+  }
+
+  const userId = req.user.userId;
+  const file = req.file;
+  const job = analysisJobs.create(userId, kind, async (job) => {
+    try {
+      const analysisResult = await run(file, (stage) => job.advance(stage), reservation);
+      const { analysis, message, data } = await save(userId, file, analysisResult);
+      console.log(`✅ Analysis job ${job.id} completed - ID: ${analysis._id}`);
+      return { message, ...data };
+    } catch (error) {
+      console.error(`❌ Analysis job ${job.id} failed:`, error.message);
+      await discardUpload(file);
+      throw error;
+    } finally {
+      // Unused when the result came from the cache or the run never started
+      reservation.release();
+    }
+  });
+
+  const statusUrl = `${req.baseUrl}/jobs/${job.id}`;
+  console.log(`🕒 Analysis job queued - ${kind}, Job: ${job.id}, File: ${file.filename}`);
+  res.set('Location', statusUrl);
+  return res.status(202).json({
+    success: true,
+    message: 'Analysis started',
+    data: {
+      jobId: job.id,
+      status: job.status,
+      statusUrl,
+      eventsUrl: `${statusUrl}/events`
+    }
+  });
+};
+
+/**
+ * Run the spine analysis of an upload (mock mode without the YOLO model)
+ */
+const runSpineAnalysis = async (file, onStage, reservation) => {
+  const imagePath = file.path;
+  if (USE_MOCK) {
+    console.log('🧪 Using Mock analysis...');
+    const mockResult = await mockAnalyzeImage(imagePath);
+    console.log('✅ Mock analysis completed:', mockResult);
+    return mockResult;
+  }
+
+  console.log('🤖 Using YOLO AI analysis...');
+  try {
+    return await pythonAnalysisService.analyzeImage(imagePath, { buffer: file.buffer, onStage, reservation });
+  } catch (yoloError) {
+    if (yoloError instanceof QueueFullError || yoloError instanceof ImageRejectedError) {
+      throw yoloError;
+    }
+    console.log('⚠️ YOLO analysis failed, switching to MOCK mode...');
+    console.log('Error:', yoloError.message);
+    const mockResult = await mockAnalyzeImage(imagePath);
+    console.log('✅ Completed with mock analysis:', mockResult);
+    return mockResult;
+  }
+};
+
+/**
+ * Store a spine analysis result
+ * @returns {Promise<Object>} { analysis, message, data } (data is the API payload)
+ */
+const saveSpineAnalysis = async (userId, file, analysisResult) => {
+  // Determine result category
+  let resultCategory = 'Excellent';
+  if (analysisResult.severity === 'critical') {
+    resultCategory = 'Poor';
+  } else if (analysisResult.severity === 'moderate') {
+    resultCategory = 'Fair';
+  } else if (analysisResult.score < 85) {
+    resultCategory = 'Good';
+  }
+
+  // Map findings to issues array
+  const issues = [];
+  if (analysisResult.findings.compression_fracture > 0) {
+    issues.push('Compression Fracture');
+  }
+  if (analysisResult.findings.herniated_disc > 0) {
+    issues.push('Herniated Disc');
+  }
+  if (analysisResult.findings.listhesis > 0) {
+    issues.push('Listhesis');
+  }
+  if (analysisResult.imageType === 'AP' && analysisResult.cobbAngle > 10) {
+    issues.push('Scoliosis');
+  }
+  if (analysisResult.imageType === 'LATERAL') {
+    if (analysisResult.cobbAngle < 20) {
+      issues.push('Lordosis Flattening');
+    } else if (analysisResult.cobbAngle > 60) {
+      issues.push('Excessive Lordosis');
+    }
+  }
+
+  // Create analysis record in database
+  const analysis = new Analysis({
+    userId,
+    imageUrl: `/uploads/${file.filename}`,
+    result: resultCategory,
+    score: analysisResult.score,
+    measurements: {
+      cobbAngle: analysisResult.cobbAngle,
+      imageType: analysisResult.imageType,
+      vertebraeCount: analysisResult.vertebraeCount
+    },
+    issues: issues,
+    recommendations: analysisResult.recommendations,
+    findings: analysisResult.findings,
+    consultDoctor: analysisResult.consultDoctor,
+    severity: analysisResult.severity,
+    detectionKey: analysisResult.detectionKey
+  });
+
+  await ensurePersisted(file);
+  await analysis.save();
+
+  return {
+    analysis,
+    message: analysisResult.consultDoctor 
+      ? 'Analysis completed. CONSULT A DOCTOR!' 
+      : 'Analysis completed successfully',
+    data: {
+      analysisId: analysis._id,
+      result: resultCategory,
+      score: analysisResult.score,
+      cobbAngle: analysisResult.cobbAngle,
+      imageType: analysisResult.imageType,
+      vertebraeCount: analysisResult.vertebraeCount,
+      vertebrae: analysisResult.vertebrae,
+      overlay: analysisResult.overlay,
+      findings: analysisResult.findings,
+      issues: issues,
+      recommendations: analysisResult.recommendations,
+      consultDoctor: analysisResult.consultDoctor,
+      severity: analysisResult.severity,
+      imageUrl: analysis.imageUrl,
+      createdAt: analysis.createdAt
+    }
+  };
+};
+
 /**
  * Create new spine analysis
  * POST /api/analyses
+ * With ?async=true (or Prefer: respond-async) answers 202 with a job id;
+ * see getAnalysisJob / streamAnalysisJob.
  */
 export const createAnalysis = async (req, res, next) => {
   console.log('📥 createAnalysis called');
@@ -45,33 +242,29 @@ export const createAnalysis = async (req, res, next) => {
     const userId = req.user.userId;
     const imagePath = req.file.path;
 
+    if (wantsAsync(req)) {
+      return startAnalysisJob(req, res, 'spine', runSpineAnalysis, saveSpineAnalysis);
+    }
+
     console.log(`🔬 Analysis starting - User: ${userId}, File: ${req.file.filename}`);
     console.log(`📂 File path: ${imagePath}`);
 
     // Run Python analysis or Mock analysis
     let analysisResult;
     try {
-      if (USE_MOCK) {
-        console.log('🧪 Using Mock analysis...');
-        analysisResult = await mockAnalyzeImage(imagePath);
-        console.log('✅ Mock analysis completed:', analysisResult);
-      } else {
-        console.log('🤖 Using YOLO AI analysis...');
-        try {
-          analysisResult = await pythonAnalysisService.analyzeImage(imagePath);
-        } catch (yoloError) {
-          console.log('⚠️ YOLO analysis failed, switching to MOCK mode...');
-          console.log('Error:', yoloError.message);
-          analysisResult = await mockAnalyzeImage(imagePath);
-          console.log('✅ Completed with mock analysis:', analysisResult);
-        }
-      }
+      analysisResult = await runSpineAnalysis(req.file);
     } catch (error) {
       console.error('❌ Analysis error:', error);
       
       // Clean up uploaded file
-      if (fs.existsSync(imagePath)) {
-        fs.unlinkSync(imagePath);
+      discardUpload(req.file);
+
+      if (error instanceof QueueFullError) {
+        return sendQueueFull(res, error);
+      }
+
+      if (error instanceof ImageRejectedError) {
+        return sendImageRejected(res, error);
       }
 
       return res.status(500).json({
@@ -81,98 +274,97 @@ export const createAnalysis = async (req, res, next) => {
       });
     }
 
-    // Determine result category
-    let resultCategory = 'Excellent';
-    if (analysisResult.severity === 'critical') {
-      resultCategory = 'Poor';
-    } else if (analysisResult.severity === 'moderate') {
-      resultCategory = 'Fair';
-    } else if (analysisResult.score < 85) {
-      resultCategory = 'Good';
-    }
-
-    // Map findings to issues array
-    const issues = [];
-    if (analysisResult.findings.compression_fracture > 0) {
-      issues.push('Compression Fracture');
-    }
-    if (analysisResult.findings.herniated_disc > 0) {
-      issues.push('Herniated Disc');
-    }
-    if (analysisResult.findings.listhesis > 0) {
-      issues.push('Listhesis');
-    }
-    if (analysisResult.imageType === 'AP' && analysisResult.cobbAngle > 10) {
-      issues.push('Scoliosis');
-    }
-    if (analysisResult.imageType === 'LATERAL') {
-      if (analysisResult.cobbAngle < 20) {
-        issues.push('Lordosis Flattening');
-      } else if (analysisResult.cobbAngle > 60) {
-        issues.push('Excessive Lordosis');
-      }
-    }
-
-    // Create analysis record in database
-    const analysis = new Analysis({
-      userId,
-      imageUrl: `/uploads/${req.file.filename}`,
-      result: resultCategory,
-      score: analysisResult.score,
-      measurements: {
-        cobbAngle: analysisResult.cobbAngle,
-        imageType: analysisResult.imageType,
-        vertebraeCount: analysisResult.vertebraeCount
-      },
-      issues: issues,
-      recommendations: analysisResult.recommendations,
-      findings: analysisResult.findings,
-      consultDoctor: analysisResult.consultDoctor,
-      severity: analysisResult.severity
-    });
-
-    await analysis.save();
+    const { analysis, message, data } = await saveSpineAnalysis(userId, req.file, analysisResult);
 
     console.log(`✅ Analysis completed - ID: ${analysis._id}, Score: ${analysisResult.score}`);
 
     // Return response
     res.status(201).json({
       success: true,
-      message: analysisResult.consultDoctor 
-        ? 'Analysis completed. CONSULT A DOCTOR!' 
-        : 'Analysis completed successfully',
-      data: {
-        analysisId: analysis._id,
-        result: resultCategory,
-        score: analysisResult.score,
-        cobbAngle: analysisResult.cobbAngle,
-        imageType: analysisResult.imageType,
-        vertebraeCount: analysisResult.vertebraeCount,
-        findings: analysisResult.findings,
-        issues: issues,
-        recommendations: analysisResult.recommendations,
-        consultDoctor: analysisResult.consultDoctor,
-        severity: analysisResult.severity,
-        imageUrl: analysis.imageUrl,
-        createdAt: analysis.createdAt
-      }
+      message,
+      data
     });
   } catch (error) {
     console.error('❌ Analiz oluşturma hatası:', error);
     
     // Clean up uploaded file on error
-    if (req.file && fs.existsSync(req.file.path)) {
-      try {
-        fs.unlinkSync(req.file.path);
-      } catch (cleanupError) {
-        console.error('Dosya temizleme hatası:', cleanupError);
-      }
-    }
+    discardUpload(req.file).catch((cleanupError) => {
+      console.error('Dosya temizleme hatası:', cleanupError);
+    });
 
     next(error);
   }
 };
 
+/**
+ * Get the state of a background analysis job
+ * GET /api/analyses/jobs/:jobId
+ */
+export const getAnalysisJob = (req, res) => {
+  const job = analysisJobs.get(req.params.jobId, req.user.userId);
+  if (!job) {
+    return res.status(404).json({
+      success: false,
+      message: 'Analiz işi bulunamadı'
+    });
+  }
+
+  res.json({
+    success: true,
+    data: job.toJSON()
+  });
+};
+
+/**
+ * Stream the progress of a background analysis job (Server-Sent Events)
+ * GET /api/analyses/jobs/:jobId/events
+ * Sends the current state as a 'status' event, then 'stage' events as the
+ * analysis advances and a final 'completed' or 'failed' event.
+ */
+export const streamAnalysisJob = (req, res) => {
+  const job = analysisJobs.get(req.params.jobId, req.user.userId);
+  if (!job) {
+    return res.status(404).json({
+      success: false,
+      message: 'Analiz işi bulunamadı'
+    });
+  }
+
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    Connection: 'keep-alive',
+    'X-Accel-Buffering': 'no'
+  });
+
+  const send = (event, data) => {
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+
+  send('status', job.toJSON());
+  if (job.finished) {
+    send(job.status, job.toJSON());
+    return res.end();
+  }
+
+  const onUpdate = (state) => {
+    if (state.status === 'completed' || state.status === 'failed') {
+      send(state.status, state);
+      res.end();
+    } else {
+      send('stage', { jobId: state.jobId, stage: state.stage, stages: state.stages });
+    }
+  };
+  // Comment lines keep proxies from closing an idle stream
+  const heartbeat = setInterval(() => res.write(': keep-alive\n\n'), 15000);
+
+  job.on('update', onUpdate);
+  res.on('close', () => {
+    clearInterval(heartbeat);
+    job.off('update', onUpdate);
+  });
+};
+
 /**
  * Get all analyses for current user
  * GET /api/analyses
@@ -241,6 +433,92 @@ export const getAnalysisById = async (req, res, next) => {
   }
 };
 
+/**
+ * Get the annotation overlay of an analysis (drawn client-side)
+ * GET /api/analyses/:id/overlay?format=json|svg
+ */
+export const getAnalysisOverlay = async (req, res, next) => {
+  try {
+    const { id } = req.params;
+    const userId = req.user.userId;
+    const format = req.query.format === 'svg' ? 'svg' : 'json';
+
+    const analysis = await Analysis.findOne({
+      _id: id,
+      userId
+    }).select('detectionKey');
+
+    if (!analysis || !analysis.detectionKey) {
+      return res.status(404).json({
+        success: false,
+        message: 'Analiz bulunamadı'
+      });
+    }
+
+    const overlay = await pythonAnalysisService.getOverlay(analysis.detectionKey, format);
+
+    if (format === 'svg') {
+      return res.type('image/svg+xml').send(overlay);
+    }
+
+    res.json({
+      success: true,
+      data: overlay
+    });
+  } catch (error) {
+    console.error('Overlay hatası:', error);
+    next(error);
+  }
+};
+
+/**
+ * Get the annotated report image of an analysis, rendered on first request
+ * GET /api/analyses/:id/report?size=1600&format=jpg|webp|png&quality=80
+ */
+export const getAnalysisReport = async (req, res, next) => {
+  try {
+    const { id } = req.params;
+    const userId = req.user.userId;
+    const format = req.query.format || 'jpg';
+    const size = req.query.size ? parseInt(req.query.size, 10) : null;
+    const quality = req.query.quality ? parseInt(req.query.quality, 10) : null;
+
+    if (
+      !REPORT_FORMATS.includes(format) ||
+      (size !== null && !(size >= 64 && size <= 8192)) ||
+      (quality !== null && !(quality >= 1 && quality <= 100))
+    ) {
+      return res.status(400).json({
+        success: false,
+        message: `Geçersiz rapor parametresi (format: ${REPORT_FORMATS.join('|')}, size: 64-8192, quality: 1-100)`
+      });
+    }
+
+    const analysis = await Analysis.findOne({
+      _id: id,
+      userId
+    }).select('detectionKey imageUrl');
+
+    if (!analysis || !analysis.detectionKey) {
+      return res.status(404).json({
+        success: false,
+        message: 'Analiz bulunamadı'
+      });
+    }
+
+    const imagePath = path.join(process.cwd(), 'uploads', path.basename(analysis.imageUrl));
+    const reportPath = await reportService.getReport(analysis.detectionKey, imagePath, { size, format, quality });
+
+    res.sendFile(reportPath);
+  } catch (error) {
+    console.error('Rapor hatası:', error);
+    if (error instanceof QueueFullError) {
+      return sendQueueFull(res, error);
+    }
+    next(error);
+  }
+};
+
 /**
  * Delete analysis
  * DELETE /api/analyses/:id
@@ -325,9 +603,84 @@ export const getAnalysisStats = async (req, res, next) => {
 };
 
 
+/**
+ * Run the posture analysis of an upload
+ */
+const runPostureAnalysis = async (file, onStage, reservation) => {
+  console.log('🤖 Using YOLO Pose analysis...');
+  const postureResult = await postureAnalysisService.analyzePosture(file.path, { buffer: file.buffer, onStage, reservation });
+  console.log('✅ Posture analysis completed:', postureResult);
+  return postureResult;
+};
+
+/**
+ * Store a posture analysis result
+ * @returns {Promise<Object>} { analysis, message, data } (data is the API payload)
+ */
+const savePostureAnalysis = async (userId, file, postureResult) => {
+  // Determine result category
+  let resultCategory = 'Excellent';
+  if (postureResult.overallSeverity === 'critical' || postureResult.overallSeverity === 'moderate') {
+    resultCategory = 'Fair';
+  } else if (postureResult.score < 85) {
+    resultCategory = 'Good';
+  }
+
+  // Create issues array from posture findings
+  const issues = [];
+  if (postureResult.headPosture && postureResult.headPosture.status !== 'NORMAL') {
+    issues.push(postureResult.headPosture.status);
+  }
+  if (postureResult.backPosture && postureResult.backPosture.status !== 'BACK ALIGNED') {
+    issues.push(postureResult.backPosture.status);
+  }
+
+  // Create analysis record in database
+  const analysis = new Analysis({
+    userId,
+    imageUrl: `/uploads/${file.filename}`,
+    result: resultCategory,
+    score: postureResult.score,
+    measurements: { 
+      imageType: 'POSTURE', 
+      direction: postureResult.direction 
+    },
+    issues: issues,
+    recommendations: postureResult.recommendations,
+    consultDoctor: postureResult.consultDoctor,
+    severity: postureResult.overallSeverity
+  });
+
+  await ensurePersisted(file);
+  await analysis.save();
+
+  return {
+    analysis,
+    message: postureResult.consultDoctor 
+      ? 'Posture analysis completed. Consult a physical therapist!' 
+      : 'Posture analysis completed successfully',
+    data: {
+      analysisId: analysis._id,
+      result: resultCategory,
+      score: postureResult.score,
+      direction: postureResult.direction,
+      headPosture: postureResult.headPosture,
+      backPosture: postureResult.backPosture,
+      overallStatus: postureResult.overallStatus,
+      overallSeverity: postureResult.overallSeverity,
+      consultDoctor: postureResult.consultDoctor,
+      recommendations: postureResult.recommendations,
+      keypoints: postureResult.keypoints,
+      imageUrl: analysis.imageUrl,
+      createdAt: analysis.createdAt
+    }
+  };
+};
+
 /**
  * Create new posture analysis
  * POST /api/analyses/posture
+ * Supports the same ?async=true job mode as createAnalysis.
  */
 export const createPostureAnalysis = async (req, res, next) => {
   console.log('🧍 createPostureAnalysis called');
@@ -344,20 +697,28 @@ export const createPostureAnalysis = async (req, res, next) => {
     const userId = req.user.userId;
     const imagePath = req.file.path;
 
+    if (wantsAsync(req)) {
+      return startAnalysisJob(req, res, 'posture', runPostureAnalysis, savePostureAnalysis);
+    }
+
     console.log(`🔬 Posture analysis starting - User: ${userId}, File: ${req.file.filename}`);
     console.log(`📂 File path: ${imagePath}`);
 
     let postureResult;
     try {
-      console.log('🤖 Using YOLO Pose analysis...');
-      postureResult = await postureAnalysisService.analyzePosture(imagePath);
-      console.log('✅ Posture analysis completed:', postureResult);
+      postureResult = await runPostureAnalysis(req.file);
     } catch (error) {
       console.error('❌ Posture analysis error:', error);
       
       // Clean up uploaded file
-      if (fs.existsSync(imagePath)) {
-        fs.unlinkSync(imagePath);
+      discardUpload(req.file);
+
+      if (error instanceof QueueFullError) {
+        return sendQueueFull(res, error);
+      }
+
+      if (error instanceof ImageRejectedError) {
+        return sendImageRejected(res, error);
       }
 
       return res.status(500).json({
@@ -367,75 +728,22 @@ export const createPostureAnalysis = async (req, res, next) => {
       });
     }
 
-    // Determine result category
-    let resultCategory = 'Excellent';
-    if (postureResult.overallSeverity === 'critical' || postureResult.overallSeverity === 'moderate') {
-      resultCategory = 'Fair';
-    } else if (postureResult.score < 85) {
-      resultCategory = 'Good';
-    }
-
-    // Create issues array from posture findings
-    const issues = [];
-    if (postureResult.headPosture && postureResult.headPosture.status !== 'NORMAL') {
-      issues.push(postureResult.headPosture.status);
-    }
-    if (postureResult.backPosture && postureResult.backPosture.status !== 'BACK ALIGNED') {
-      issues.push(postureResult.backPosture.status);
-    }
-
-    // Create analysis record in database
-    const analysis = new Analysis({
-      userId,
-      imageUrl: `/uploads/${req.file.filename}`,
-      result: resultCategory,
-      score: postureResult.score,
-      measurements: { 
-        imageType: 'POSTURE', 
-        direction: postureResult.direction 
-      },
-      issues: issues,
-      recommendations: postureResult.recommendations,
-      consultDoctor: postureResult.consultDoctor,
-      severity: postureResult.overallSeverity
-    });
-
-    await analysis.save();
+    const { analysis, message, data } = await savePostureAnalysis(userId, req.file, postureResult);
 
     console.log(`✅ Posture analysis saved - ID: ${analysis._id}, Score: ${postureResult.score}`);
 
     res.status(201).json({
       success: true,
-      message: postureResult.consultDoctor 
-        ? 'Posture analysis completed. Consult a physical therapist!' 
-        : 'Posture analysis completed successfully',
-      data: {
-        analysisId: analysis._id,
-        result: resultCategory,
-        score: postureResult.score,
-        direction: postureResult.direction,
-        headPosture: postureResult.headPosture,
-        backPosture: postureResult.backPosture,
-        overallStatus: postureResult.overallStatus,
-        overallSeverity: postureResult.overallSeverity,
-        consultDoctor: postureResult.consultDoctor,
-        recommendations: postureResult.recommendations,
-        keypoints: postureResult.keypoints,
-        imageUrl: analysis.imageUrl,
-        createdAt: analysis.createdAt
-      }
+      message,
+      data
     });
   } catch (error) {
     console.error('❌ Posture analysis creation error:', error);
     
     // Clean up uploaded file on error
-    if (req.file && fs.existsSync(req.file.path)) {
-      try {
-        fs.unlinkSync(req.file.path);
-      } catch (cleanupError) {
-        console.error('File cleanup error:', cleanupError);
-      }
-    }
+    discardUpload(req.file).catch((cleanupError) => {
+      console.error('File cleanup error:', cleanupError);
+    });
 
     next(error);
   }
@@ -0,0 +1,83 @@
+import { WebSocketServer } from 'ws';
+import { verifyToken } from '../middleware/tokenUtils.js';
+import livePostureService, { MAX_FRAME_BYTES } from '../services/livePostureService.js';
+
+export const LIVE_POSTURE_PATH = '/api/posture/live';
+
+// Results are skipped while a slow client has this much unsent data
+const MAX_BUFFERED_BYTES = 256 * 1024;
+
+/**
+ * Live posture coaching over WebSocket
+ * ws://host/api/posture/live?token=<access token>
+ * - Client sends binary JPEG/PNG webcam frames
+ * - Server answers with JSON messages: ready, posture (keypoints + verdict), error
+ * - Frames arriving while one is analyzed replace each other (newest wins)
+ */
+export const attachLivePosture = (server) => {
+  const wss = new WebSocketServer({ noServer: true, maxPayload: MAX_FRAME_BYTES });
+
+  server.on('upgrade', (req, socket, head) => {
+    const url = new URL(req.url, 'http://localhost');
+    if (url.pathname !== LIVE_POSTURE_PATH) {
+      socket.destroy();
+      return;
+    }
+
+    const user = verifyToken(url.searchParams.get('token'));
+    if (!user) {
+      socket.write('HTTP/1.1 401 Unauthorized\r\nConnection: close\r\n\r\n');
+      socket.destroy();
+      return;
+    }
+
+    if (!livePostureService.hasCapacity()) {
+      socket.write('HTTP/1.1 503 Service Unavailable\r\nRetry-After: 30\r\nConnection: close\r\n\r\n');
+      socket.destroy();
+      return;
+    }
+
+    wss.handleUpgrade(req, socket, head, (ws) => handleConnection(ws, user));
+  });
+
+  return wss;
+};
+
+const handleConnection = (ws, user) => {
+  let stream = null;
+  try {
+    stream = livePostureService.openStream((message) => {
+      if (message.fatal) {
+        ws.close(1011, 'Canlı analiz servisi durdu');
+        return;
+      }
+      if (ws.readyState !== ws.OPEN || ws.bufferedAmount > MAX_BUFFERED_BYTES) {
+        return;
+      }
+      ws.send(JSON.stringify(message));
+    });
+  } catch (error) {
+    console.error('❌ Live posture error:', error.message);
+    ws.close(1011, 'Canlı analiz başlatılamadı');
+    return;
+  }
+
+  if (!stream) {
+    ws.close(1013, 'Canlı analiz kapasitesi dolu');
+    return;
+  }
+
+  console.log(`🎥 Live posture stream ${stream.id} opened (user: ${user.userId})`);
+  ws.send(JSON.stringify({ type: 'ready', stream: stream.id }));
+
+  ws.on('message', (data, isBinary) => {
+    if (isBinary) {
+      livePostureService.submitFrame(stream, data);
+    }
+  });
+
+  ws.on('close', () => {
+    livePostureService.closeStream(stream);
+    console.log(`🎥 Live posture stream ${stream.id} closed (dropped frames: ${stream.dropped})`);
+  });
+};
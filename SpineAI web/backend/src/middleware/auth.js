@@ -32,6 +32,18 @@ export const authenticate = (req, res, next) => {
   }
 };
 
+/**
+ * Authentication for EventSource streams
+ * - Browsers cannot set headers on EventSource, so the access token may
+ *   come as ?token= instead
+ */
+export const authenticateEventStream = (req, res, next) => {
+  if (!req.headers.authorization && req.query.token) {
+    req.headers.authorization = `Bearer ${req.query.token}`;
+  }
+  return authenticate(req, res, next);
+};
+
 /**
  * Authorization middleware
  * - Checks if user has required role
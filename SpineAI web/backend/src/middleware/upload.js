@@ -13,17 +13,9 @@ if (!fs.existsSync(uploadsDir)) {
   fs.mkdirSync(uploadsDir, { recursive: true });
 }
 
-// Configure storage
-const storage = multer.diskStorage({
-  destination: (req, file, cb) => {
-    cb(null, uploadsDir);
-  },
-  filename: (req, file, cb) => {
-    const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1E9);
-    const ext = path.extname(file.originalname);
-    cb(null, `spine-${uniqueSuffix}${ext}`);
-  }
-});
+// Uploads are kept in memory: the analysis worker gets the buffer directly
+// and the original is written to uploads/ in the background (persistUpload)
+const storage = multer.memoryStorage();
 
 // File filter to accept only images
 const fileFilter = (req, file, cb) => {
@@ -68,3 +60,50 @@ export const handleUploadError = (err, req, res, next) => {
   }
   next();
 };
+
+/**
+ * Name an in-memory upload and write it to uploads/ off the critical path
+ * - Sets req.file.filename / req.file.path as diskStorage would
+ * - req.file.persisted resolves to true once the original is on disk (false
+ *   if the write failed); analysis does not wait for it, storing the
+ *   record does (ensurePersisted)
+ */
+export const persistUpload = (req, res, next) => {
+  if (!req.file) {
+    return next();
+  }
+  const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1E9);
+  const ext = path.extname(req.file.originalname);
+  req.file.filename = `spine-${uniqueSuffix}${ext}`;
+  req.file.path = path.join(uploadsDir, req.file.filename);
+  req.file.persisted = fs.promises.writeFile(req.file.path, req.file.buffer).then(
+    () => true,
+    (err) => {
+      console.error('Dosya kaydetme hatası:', err);
+      return false;
+    }
+  );
+  next();
+};
+
+/**
+ * Wait until an upload is on disk (normally long done by the time its
+ * analysis finishes)
+ * @throws {Error} If the write failed, so no record points at a missing file
+ */
+export const ensurePersisted = async (file) => {
+  if (!(await file.persisted)) {
+    throw new Error('Uploaded image could not be saved');
+  }
+};
+
+/**
+ * Remove an upload whose analysis failed (after its write finished)
+ */
+export const discardUpload = async (file) => {
+  if (!file?.path) {
+    return;
+  }
+  await file.persisted;
+  await fs.promises.unlink(file.path).catch(() => {});
+};
@@ -74,6 +74,8 @@ const analysisSchema = new mongoose.Schema(
     },
     recommendations: [String],
     notes: String,
+    // Key of the raw detections in the Python detection store
+    detectionKey: String,
   },
   {
     timestamps: true,
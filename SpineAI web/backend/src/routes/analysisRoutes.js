@@ -1,13 +1,17 @@
 import express from 'express';
-import { authenticate } from '../middleware/auth.js';
-import { upload, handleUploadError } from '../middleware/upload.js';
+import { authenticate, authenticateEventStream } from '../middleware/auth.js';
+import { upload, handleUploadError, persistUpload } from '../middleware/upload.js';
 import {
   createAnalysis,
   createPostureAnalysis,
   getUserAnalyses,
   getAnalysisById,
+  getAnalysisOverlay,
+  getAnalysisReport,
   deleteAnalysis,
-  getAnalysisStats
+  getAnalysisStats,
+  getAnalysisJob,
+  streamAnalysisJob
 } from '../controllers/analysisController.js';
 
 const router = express.Router();
@@ -16,9 +20,14 @@ const router = express.Router();
  * Analysis Routes
  * POST /api/analyses - Create new spine analysis with X-ray image upload
  * POST /api/analyses/posture - Create new posture analysis with photo upload
+ *   (?async=true: 202 with a job id instead of waiting for the result)
  * GET /api/analyses - Get all analyses for current user
  * GET /api/analyses/stats - Get analysis statistics
+ * GET /api/analyses/jobs/:jobId - Get background analysis job state
+ * GET /api/analyses/jobs/:jobId/events - Stream job progress (Server-Sent Events)
  * GET /api/analyses/:id - Get specific analysis
+ * GET /api/analyses/:id/overlay - Get annotation overlay (JSON or SVG)
+ * GET /api/analyses/:id/report - Get annotated report image (rendered on demand)
  * DELETE /api/analyses/:id - Delete analysis
  */
 
@@ -27,6 +36,7 @@ router.post('/',
   authenticate, 
   upload.single('image'), 
   handleUploadError,
+  persistUpload,
   createAnalysis
 );
 
@@ -35,6 +45,7 @@ router.post('/posture',
   authenticate, 
   upload.single('image'), 
   handleUploadError,
+  persistUpload,
   createPostureAnalysis
 );
 
@@ -44,9 +55,21 @@ router.get('/', authenticate, getUserAnalyses);
 // Get analysis statistics
 router.get('/stats', authenticate, getAnalysisStats);
 
+// Get background analysis job state (polling)
+router.get('/jobs/:jobId', authenticate, getAnalysisJob);
+
+// Stream background analysis job progress (EventSource; token may be ?token=)
+router.get('/jobs/:jobId/events', authenticateEventStream, streamAnalysisJob);
+
 // Get specific analysis
 router.get('/:id', authenticate, getAnalysisById);
 
+// Get annotation overlay (JSON primitives or SVG)
+router.get('/:id/overlay', authenticate, getAnalysisOverlay);
+
+// Get annotated report image (rendered on first request, then cached)
+router.get('/:id/report', authenticate, getAnalysisReport);
+
 // Delete analysis
 router.delete('/:id', authenticate, deleteAnalysis);
 
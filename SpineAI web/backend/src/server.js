@@ -15,6 +15,12 @@ import analysisRoutes from './routes/analysisRoutes.js';
 
 // Import config
 import { config } from './config/index.js';
+import resultCache from './services/resultCache.js';
+import analysisQueue from './services/analysisQueue.js';
+import analysisWorker from './services/analysisWorker.js';
+import analysisJobs from './services/analysisJobs.js';
+import livePostureService from './services/livePostureService.js';
+import { attachLivePosture } from './controllers/livePostureController.js';
 
 dotenv.config();
 
@@ -49,6 +55,10 @@ app.get('/api/health', (req, res) => {
     status: 'OK',
     timestamp: new Date().toISOString(),
     environment: config.nodeEnv,
+    analysisCache: resultCache.stats,
+    analysisQueue: analysisQueue.summary(),
+    analysisJobs: analysisJobs.summary(),
+    livePosture: { streams: livePostureService.activeStreams, ...livePostureService.stats },
   });
 });
 
@@ -75,9 +85,14 @@ const server = app.listen(PORT, () => {
   console.log(`🔐 JWT Secret configured: ${config.jwtSecret !== 'your-secret-key-change-in-production' ? 'Yes' : 'No (using default)'}`);
 });
 
+// Live posture coaching (WebSocket)
+attachLivePosture(server);
+
 // Graceful shutdown
 process.on('SIGTERM', () => {
   console.log('SIGTERM signal received: closing HTTP server');
+  livePostureService.shutdown();
+  analysisWorker.shutdown();
   server.close(() => {
     console.log('HTTP server closed');
     mongoose.connection.close(false, () => {
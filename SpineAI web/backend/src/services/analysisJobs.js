@@ -0,0 +1,127 @@
+import crypto from 'crypto';
+import { EventEmitter } from 'events';
+import { config } from '../config/index.js';
+
+export const JOB_STAGES = ['decoded', 'inferred', 'scored'];
+
+/**
+ * One background analysis
+ * Emits 'update' with the public job state on every status or stage change.
+ */
+class AnalysisJob extends EventEmitter {
+  constructor(userId, kind) {
+    super();
+    this.id = crypto.randomUUID();
+    this.userId = String(userId);
+    this.kind = kind;
+    this.status = 'queued';
+    this.stage = null;
+    this.stages = [];
+    this.result = null;
+    this.error = null;
+    this.createdAt = new Date();
+    this.finishedAt = null;
+  }
+
+  get finished() {
+    return this.status === 'completed' || this.status === 'failed';
+  }
+
+  update(changes) {
+    Object.assign(this, changes);
+    this.emit('update', this.toJSON());
+  }
+
+  /**
+   * Record a finished pipeline stage
+   * @param {string} stage - One of JOB_STAGES
+   */
+  advance(stage) {
+    if (this.finished || this.stages.some((s) => s.stage === stage)) {
+      return;
+    }
+    this.stages.push({ stage, at: new Date() });
+    this.update({ status: 'running', stage });
+  }
+
+  toJSON() {
+    return {
+      jobId: this.id,
+      kind: this.kind,
+      status: this.status,
+      stage: this.stage,
+      stages: this.stages,
+      result: this.result,
+      error: this.error,
+      createdAt: this.createdAt,
+      finishedAt: this.finishedAt
+    };
+  }
+}
+
+/**
+ * Analysis Jobs
+ * Runs uploads in the background so the HTTP request returns a job id right
+ * away. Clients poll the job or subscribe to its events; finished jobs are
+ * kept for `ttlSeconds` so a late poll still finds the result.
+ */
+export class AnalysisJobs {
+  /**
+   * @param {Object} options
+   * @param {number} options.ttlSeconds - How long finished jobs stay readable
+   */
+  constructor({ ttlSeconds }) {
+    this.ttlMs = Math.max(1, ttlSeconds) * 1000;
+    this.jobs = new Map();
+    this.stats = { created: 0, completed: 0, failed: 0 };
+  }
+
+  /**
+   * Start a background job
+   * @param {string} userId - Owner (only they can read the job)
+   * @param {string} kind - 'spine' or 'posture'
+   * @param {Function} task - async (job) => result; may call job.advance(stage)
+   * @returns {AnalysisJob}
+   */
+  create(userId, kind, task) {
+    const job = new AnalysisJob(userId, kind);
+    this.jobs.set(job.id, job);
+    this.stats.created++;
+
+    Promise.resolve()
+      .then(() => task(job))
+      .then(
+        (result) => {
+          this.stats.completed++;
+          job.update({ status: 'completed', stage: 'saved', result, finishedAt: new Date() });
+        },
+        (err) => {
+          this.stats.failed++;
+          job.update({ status: 'failed', error: err.message, finishedAt: new Date() });
+        }
+      )
+      .finally(() => {
+        setTimeout(() => this.jobs.delete(job.id), this.ttlMs).unref();
+      });
+
+    return job;
+  }
+
+  /**
+   * Look up a job of a user
+   * @param {string} jobId
+   * @param {string} userId
+   * @returns {AnalysisJob|null} Null when unknown, expired or owned by another user
+   */
+  get(jobId, userId) {
+    const job = this.jobs.get(jobId);
+    return job && job.userId === String(userId) ? job : null;
+  }
+
+  summary() {
+    const active = [...this.jobs.values()].filter((job) => !job.finished).length;
+    return { active, retained: this.jobs.size, ...this.stats };
+  }
+}
+
+export default new AnalysisJobs({ ttlSeconds: config.analysisJobTtl });
@@ -0,0 +1,171 @@
+import { config } from '../config/index.js';
+
+/**
+ * Raised when the analysis queue is full
+ * Carries the HTTP status and a Retry-After estimate for the controller.
+ */
+export class QueueFullError extends Error {
+  constructor(retryAfter) {
+    super('Analysis queue is full');
+    this.name = 'QueueFullError';
+    this.statusCode = 503;
+    this.retryAfter = retryAfter;
+  }
+}
+
+/**
+ * Analysis Queue
+ * Bounds the number of heavy Python analyses running on this host. Up to
+ * `concurrency` tasks run at once, up to `maxDepth` more wait in FIFO
+ * order, and anything beyond that is rejected right away, so a burst of
+ * uploads queues instead of starting one torch interpreter per request.
+ * Background jobs reserve their place when they are accepted, before
+ * their task reaches run(), so a 202 never turns into a queue-full failure.
+ */
+export class AnalysisQueue {
+  /**
+   * @param {Object} options
+   * @param {number} options.concurrency - Max analyses running at once
+   * @param {number} options.maxDepth - Max analyses waiting for a slot
+   */
+  constructor({ concurrency, maxDepth }) {
+    this.concurrency = Math.max(1, concurrency);
+    this.maxDepth = Math.max(0, maxDepth);
+    this.running = 0;
+    this.waiting = [];
+    this.reserved = 0;
+    this.stats = {
+      completed: 0,
+      failed: 0,
+      rejected: 0,
+      totalWaitMs: 0,
+      maxWaitMs: 0,
+      totalRunMs: 0
+    };
+  }
+
+  get depth() {
+    return this.waiting.length;
+  }
+
+  /**
+   * Whether run() would admit a task right now
+   * @returns {boolean}
+   */
+  hasCapacity() {
+    return this.running + this.waiting.length + this.reserved < this.concurrency + this.maxDepth;
+  }
+
+  /**
+   * Hold a place for a task that calls run() later
+   * @returns {Object} Reservation; pass it to run(), or release() it if the
+   *   task never reaches the queue (cache hit, failure before the run)
+   * @throws {QueueFullError} When the queue is full
+   */
+  reserve() {
+    if (!this.hasCapacity()) {
+      this.stats.rejected++;
+      throw new QueueFullError(this.retryAfter());
+    }
+    this.reserved++;
+    let held = true;
+    return {
+      release: () => {
+        if (!held) {
+          return false;
+        }
+        held = false;
+        this.reserved--;
+        return true;
+      }
+    };
+  }
+
+  /**
+   * Run a task when a slot is free
+   * @param {Function} task - Returns a promise (started only when admitted)
+   * @param {Object} reservation - Optional reserve() result; the task then
+   *   takes the reserved place and is never rejected
+   * @returns {Promise<*>} Result of the task
+   * @throws {QueueFullError} When maxDepth tasks are already waiting
+   */
+  run(task, reservation = null) {
+    if (!reservation?.release() && !this.hasCapacity()) {
+      this.stats.rejected++;
+      return Promise.reject(new QueueFullError(this.retryAfter()));
+    }
+    if (this.running < this.concurrency) {
+      return this.start(task, performance.now());
+    }
+    return new Promise((resolve, reject) => {
+      this.waiting.push({ task, resolve, reject, queuedAt: performance.now() });
+    });
+  }
+
+  start(task, queuedAt) {
+    const startedAt = performance.now();
+    const waitMs = startedAt - queuedAt;
+    this.stats.totalWaitMs += waitMs;
+    this.stats.maxWaitMs = Math.max(this.stats.maxWaitMs, waitMs);
+    this.running++;
+
+    return Promise.resolve()
+      .then(task)
+      .then(
+        (result) => {
+          this.stats.completed++;
+          return result;
+        },
+        (err) => {
+          this.stats.failed++;
+          throw err;
+        }
+      )
+      .finally(() => {
+        this.stats.totalRunMs += performance.now() - startedAt;
+        this.running--;
+        const next = this.waiting.shift();
+        if (next) {
+          this.start(next.task, next.queuedAt).then(next.resolve, next.reject);
+        }
+      });
+  }
+
+  /**
+   * Seconds until a slot is likely free for a new request
+   * @returns {number}
+   */
+  retryAfter() {
+    const finished = this.stats.completed + this.stats.failed;
+    const avgRunMs = finished ? this.stats.totalRunMs / finished : 10000;
+    const ahead = this.waiting.length + this.reserved + this.running;
+    return Math.max(1, Math.ceil((ahead / this.concurrency) * avgRunMs / 1000));
+  }
+
+  /**
+   * Queue depth and wait time summary (health endpoint)
+   * @returns {Object}
+   */
+  summary() {
+    const started = this.stats.completed + this.stats.failed + this.running;
+    const finished = this.stats.completed + this.stats.failed;
+    return {
+      concurrency: this.concurrency,
+      maxDepth: this.maxDepth,
+      running: this.running,
+      queued: this.waiting.length,
+      reserved: this.reserved,
+      completed: this.stats.completed,
+      failed: this.stats.failed,
+      rejected: this.stats.rejected,
+      avgWaitMs: started ? Math.round(this.stats.totalWaitMs / started) : 0,
+      maxWaitMs: Math.round(this.stats.maxWaitMs),
+      avgRunMs: finished ? Math.round(this.stats.totalRunMs / finished) : 0
+    };
+  }
+}
+
+export default new AnalysisQueue({
+  concurrency: config.analysisConcurrency,
+  maxDepth: config.analysisQueueDepth
+});
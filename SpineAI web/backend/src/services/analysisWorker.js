@@ -0,0 +1,196 @@
+import { spawn } from 'child_process';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { dirname } from 'path';
+import fs from 'fs';
+import { config } from '../config/index.js';
+import { FrameRing } from './frameRing.js';
+import { encodeMessage, MessageDecoder } from './workerProtocol.js';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = dirname(__filename);
+const BACKEND_DIR = path.join(__dirname, '../..');
+
+// Python modules behind each worker method, shared by every service
+const PIPELINE_MODULES = JSON.parse(fs.readFileSync(path.join(BACKEND_DIR, 'pipeline_modules.json'), 'utf8'));
+
+/**
+ * Files whose contents determine the results of a worker method
+ * Their hash keys cached results and restarts the worker when it changes,
+ * so the list holds the worker itself and every Python module the method
+ * imports (test_analysis_worker.py checks it against the imports).
+ * @param {string} method - Worker method ('spine', 'posture', 'overlay')
+ * @param {...string} extra - Further files, such as the model weights
+ * @returns {string[]} Absolute paths
+ */
+export const pipelineFiles = (method, ...extra) => [
+  ...extra,
+  ...[...PIPELINE_MODULES.worker, ...PIPELINE_MODULES[method]].map((file) => path.join(BACKEND_DIR, file))
+];
+
+/**
+ * Raised when the worker's image gate turns an upload away before inference
+ * (a photo sent to spine analysis, or a blank, blurry, tiny... image).
+ * Carries the HTTP status and the gate verdict for the controller.
+ */
+export class ImageRejectedError extends Error {
+  constructor(message, gate) {
+    super(message);
+    this.name = 'ImageRejectedError';
+    this.statusCode = 422;
+    this.gate = gate;
+  }
+}
+
+/**
+ * Analysis Worker
+ * Client of the long-lived analysis_worker.py process. Requests are framed
+ * messages with an id, so any number can be in flight on the one pipe and
+ * answers are matched by id in whatever order they arrive. Upload bytes go
+ * through a shared memory frame ring when one could be created and a slot
+ * is free, otherwise as the message payload. Stdout carries only frames;
+ * the worker's stderr is forwarded to the log line by line.
+ * The process is started on the first request and again after it exits.
+ * Python never reloads imported analysis code, so a request whose pipeline
+ * hash (model and scripts) differs from the one the running process served
+ * restarts it; in-flight requests still finish on the old process.
+ */
+export class AnalysisWorker {
+  /**
+   * @param {Object} options
+   * @param {number} options.threads - Requests the worker analyzes concurrently
+   * @param {number} options.slotBytes - Largest upload handed over in the frame ring
+   */
+  constructor({ threads, slotBytes }) {
+    this.scriptPath = path.join(BACKEND_DIR, 'analysis_worker.py');
+    this.threads = Math.max(1, threads);
+    this.slotBytes = slotBytes;
+    this.process = null;
+    this.ring = null;
+    this.pending = new Map();
+    this.pipelines = new Map();
+    this.nextId = 1;
+  }
+
+  start() {
+    // Uploads reach the worker through the analysis queue, at most one per thread
+    const ring = FrameRing.create(this.threads, this.slotBytes);
+    const args = [this.scriptPath, '--threads', String(this.threads)];
+    if (ring) {
+      args.push('--ring', ring.spec());
+    }
+    const child = spawn('python', args);
+    const decoder = new MessageDecoder();
+    let logged = '';
+    this.process = child;
+    this.ring = ring;
+    this.pipelines = new Map();
+    console.log('🐍 Analysis worker started (pid:', child.pid + ')');
+
+    child.stdout.on('data', (data) => {
+      let messages;
+      try {
+        messages = decoder.push(data);
+      } catch (err) {
+        console.error('❌ Analysis worker protocol error:', err.message);
+        child.kill();
+        return;
+      }
+      messages.forEach(({ header, payload }) => this.handleMessage(header, payload));
+    });
+
+    child.stderr.on('data', (data) => {
+      logged += data.toString();
+      const lines = logged.split('\n');
+      logged = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => console.error(`⚠️ Analysis worker: ${line}`));
+    });
+
+    child.on('close', (code) => {
+      if (this.process === child) {
+        this.process = null;
+        this.ring = null;
+      }
+      ring?.close();
+      if (code !== null && code !== 0) {
+        console.error(`❌ Analysis worker exited (code: ${code})`);
+      }
+      for (const [id, request] of this.pending) {
+        if (request.child === child) {
+          this.pending.delete(id);
+          request.reject(new Error(`Analysis worker stopped (code: ${code}) ${logged}`.trim()));
+        }
+      }
+    });
+
+    child.on('error', (err) => {
+      console.error('❌ Python execution error:', err.message);
+    });
+    // A dead worker must not crash the server through an EPIPE
+    child.stdin.on('error', () => {});
+  }
+
+  /**
+   * Send a request to the worker
+   * @param {string} method - Worker method ('spine', 'posture', 'rekey', 'overlay')
+   * @param {Object} params - JSON parameters
+   * @param {Buffer} payload - Optional binary payload
+   * @param {Function} onEvent - Optional, receives the request's event messages
+   * @param {string} pipeline - Optional pipeline hash of the method (resultCache.pipelineHash)
+   * @returns {Promise<*>} The worker's result
+   */
+  request(method, params, payload, onEvent, pipeline) {
+    const served = this.pipelines.get(method);
+    if (this.process && pipeline && served && served !== pipeline) {
+      console.log(`🔄 ${method} pipeline changed, restarting analysis worker`);
+      this.shutdown();
+    }
+    if (!this.process) {
+      this.start();
+    }
+    if (pipeline) {
+      this.pipelines.set(method, pipeline);
+    }
+    const id = this.nextId++;
+    const child = this.process;
+    const ring = this.ring;
+    const frame = payload && ring ? ring.put(payload) : null;
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject, child, onEvent, ring, frame });
+      const header = frame ? { id, method, params, frame } : { id, method, params };
+      child.stdin.write(encodeMessage(header, frame ? undefined : payload));
+    });
+  }
+
+  handleMessage(header) {
+    const request = this.pending.get(header.id);
+    if (!request) {
+      return;
+    }
+    if (header.event) {
+      request.onEvent?.(header);
+      return;
+    }
+    this.pending.delete(header.id);
+    if (request.frame) {
+      request.ring.release(request.frame.slot);
+    }
+    if (header.error) {
+      request.reject(new Error(header.error));
+    } else {
+      request.resolve(header.result);
+    }
+  }
+
+  shutdown() {
+    if (this.process) {
+      this.process.stdin.end();
+      this.process = null;
+    }
+  }
+}
+
+export default new AnalysisWorker({
+  threads: config.analysisConcurrency,
+  slotBytes: config.frameRingSlotBytes
+});
@@ -0,0 +1,115 @@
+import fs from 'fs';
+import path from 'path';
+import { config } from '../config/index.js';
+
+// POSIX shared memory objects are files here on Linux
+const SHM_DIR = '/dev/shm';
+
+let ringCount = 0;
+
+/**
+ * Frame Ring
+ * Node side of frame_ring.py: fixed-size slots in one shared memory block
+ * that a long-lived Python worker maps once at startup. An upload or a
+ * webcam frame is copied into a free slot and only its { slot, bytes }
+ * descriptor travels in the request header, so the image never goes
+ * through the worker's pipe and Python decodes it straight from the slot.
+ * The ring owns the slot bookkeeping; a slot is released when the worker
+ * has answered the request that used it.
+ */
+export class FrameRing {
+  /**
+   * Create a ring, or null when shared memory is off or unavailable
+   * (callers then send payloads through the pipe)
+   * @param {number} slots - Number of slots
+   * @param {number} slotBytes - Capacity of one slot
+   * @returns {FrameRing|null}
+   */
+  static create(slots, slotBytes) {
+    if (!config.frameRing || !fs.existsSync(SHM_DIR)) {
+      return null;
+    }
+    try {
+      if (ringCount === 0) {
+        FrameRing.sweep();
+      }
+      return new FrameRing(slots, slotBytes);
+    } catch (err) {
+      console.error('⚠️ Frame ring unavailable, using the pipe:', err.message);
+      return null;
+    }
+  }
+
+  /**
+   * Remove rings left behind by server processes that no longer run
+   */
+  static sweep() {
+    for (const name of fs.readdirSync(SHM_DIR)) {
+      const match = /^spineai-(\d+)-\d+$/.exec(name);
+      if (!match || Number(match[1]) === process.pid) {
+        continue;
+      }
+      try {
+        process.kill(Number(match[1]), 0);
+      } catch (err) {
+        if (err.code === 'ESRCH') {
+          fs.unlink(path.join(SHM_DIR, name), () => {});
+        }
+      }
+    }
+  }
+
+  constructor(slots, slotBytes) {
+    this.name = `spineai-${process.pid}-${ringCount++}`;
+    this.path = path.join(SHM_DIR, this.name);
+    this.slots = slots;
+    this.slotBytes = slotBytes;
+    this.fd = fs.openSync(this.path, 'wx+', 0o600);
+    // Sparse: pages are only allocated once a frame is written into them
+    fs.ftruncateSync(this.fd, slots * slotBytes);
+    this.free = Array.from({ length: slots }, (_, slot) => slot);
+  }
+
+  /**
+   * Spec for the worker's --ring argument (frame_ring.ring_spec)
+   * @returns {string} name:slots:slot_bytes
+   */
+  spec() {
+    return `${this.name}:${this.slots}:${this.slotBytes}`;
+  }
+
+  /**
+   * Copy a payload into a free slot
+   * @param {Buffer} buffer - Encoded image
+   * @returns {Object|null} { slot, bytes } descriptor, or null when the
+   *   payload does not fit or every slot is taken
+   */
+  put(buffer) {
+    if (this.fd === null || buffer.length > this.slotBytes || !this.free.length) {
+      return null;
+    }
+    const slot = this.free.pop();
+    fs.writeSync(this.fd, buffer, 0, buffer.length, slot * this.slotBytes);
+    return { slot, bytes: buffer.length };
+  }
+
+  /**
+   * Return a slot once the worker answered the request that used it
+   * @param {number} slot - Slot from put()
+   */
+  release(slot) {
+    this.free.push(slot);
+  }
+
+  /**
+   * Free the block; the worker's mapping stays valid until it exits
+   */
+  close() {
+    if (this.fd === null) {
+      return;
+    }
+    fs.closeSync(this.fd);
+    this.fd = null;
+    fs.unlink(this.path, () => {});
+  }
+}
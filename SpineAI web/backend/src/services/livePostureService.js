@@ -0,0 +1,257 @@
+import { spawn } from 'child_process';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { dirname } from 'path';
+import fs from 'fs';
+import { config } from '../config/index.js';
+import { FrameRing } from './frameRing.js';
+import { encodeMessage, MessageDecoder } from './workerProtocol.js';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = dirname(__filename);
+
+// Largest accepted webcam frame (encoded)
+export const MAX_FRAME_BYTES = 2 * 1024 * 1024;
+
+/**
+ * One long-lived posture_worker.py process
+ * Frames of its streams go to stdin as framed messages (workerProtocol.js)
+ * and are answered with one framed message each on stdout. With a frame
+ * ring the frame itself sits in a shared memory slot (one per stream, as
+ * a stream has at most one frame in flight) and only its descriptor is
+ * written to the pipe.
+ */
+class PostureWorker {
+  constructor(scriptPath, modelPath, slots, onMessage, onExit) {
+    this.streams = new Set();
+    this.ring = FrameRing.create(slots, MAX_FRAME_BYTES);
+    this.frames = new Map();
+    const args = [scriptPath, modelPath];
+    if (this.ring) {
+      args.push('--ring', this.ring.spec());
+    }
+    this.process = spawn('python', args);
+    this.ready = false;
+    const decoder = new MessageDecoder();
+
+    this.process.stdout.on('data', (data) => {
+      let messages;
+      try {
+        messages = decoder.push(data);
+      } catch (err) {
+        console.error('❌ Posture worker protocol error:', err.message);
+        this.process.kill();
+        return;
+      }
+      for (const { header } of messages) {
+        if (header.ready) {
+          this.ready = true;
+          console.log('🧍 Live posture worker ready');
+          continue;
+        }
+        this.releaseFrame(header.stream, header.seq);
+        onMessage(header);
+      }
+    });
+
+    this.process.stderr.on('data', (data) => {
+      console.error(`⚠️ Posture worker: ${data}`);
+    });
+
+    this.process.on('close', (code) => {
+      this.ring?.close();
+      onExit(this, code);
+    });
+    this.process.on('error', (err) => {
+      console.error('❌ Posture worker error:', err.message);
+    });
+    // A dead worker must not crash the server through an EPIPE
+    this.process.stdin.on('error', () => {});
+  }
+
+  send(method, stream, seq, payload) {
+    const params = { stream, seq, time: performance.now() / 1000 };
+    const frame = payload && this.ring ? this.ring.put(payload) : null;
+    if (frame) {
+      this.frames.set(`${stream}:${seq}`, frame.slot);
+      this.process.stdin.write(encodeMessage({ method, params, frame }));
+    } else {
+      this.process.stdin.write(encodeMessage({ method, params }, payload));
+    }
+  }
+
+  releaseFrame(stream, seq) {
+    const key = `${stream}:${seq}`;
+    if (this.frames.has(key)) {
+      this.ring.release(this.frames.get(key));
+      this.frames.delete(key);
+    }
+  }
+
+  kill() {
+    this.process.kill();
+  }
+}
+
+/**
+ * Live Posture Service
+ * Runs webcam streams through long-lived posture workers. Every stream has
+ * at most one frame in flight; frames arriving meanwhile replace the
+ * pending one, so the newest frame is always analyzed next and the queue
+ * in front of a worker never exceeds its stream cap.
+ */
+export class LivePostureService {
+  /**
+   * @param {Object} options
+   * @param {number} options.workers - Max worker processes
+   * @param {number} options.streamsPerWorker - Max concurrent streams per worker
+   */
+  constructor({ workers, streamsPerWorker }) {
+    this.scriptPath = path.join(__dirname, '../../posture_worker.py');
+    this.modelPath = path.join(__dirname, '../../yolov8n-pose.pt');
+    this.maxWorkers = workers;
+    this.streamsPerWorker = streamsPerWorker;
+    this.workers = [];
+    this.streams = new Map();
+    this.nextId = 1;
+    this.stats = { frames: 0, analyzed: 0, dropped: 0, rejected: 0 };
+  }
+
+  get activeStreams() {
+    return this.streams.size;
+  }
+
+  /**
+   * Whether another stream can be opened
+   * @returns {boolean}
+   */
+  hasCapacity() {
+    return this.workers.length < this.maxWorkers
+      || this.workers.some((worker) => worker.streams.size < this.streamsPerWorker);
+  }
+
+  /**
+   * Open a stream on the least loaded worker
+   * @param {Function} onMessage - Receives result and error messages
+   * @returns {Object|null} Stream handle, or null when all workers are full
+   */
+  openStream(onMessage) {
+    if (!fs.existsSync(this.modelPath)) {
+      throw new Error(`Pose model not found: ${this.modelPath}`);
+    }
+
+    let worker = this.workers
+      .filter((w) => w.streams.size < this.streamsPerWorker)
+      .sort((a, b) => a.streams.size - b.streams.size)[0];
+    if (!worker && this.workers.length < this.maxWorkers) {
+      worker = new PostureWorker(
+        this.scriptPath,
+        this.modelPath,
+        this.streamsPerWorker,
+        (message) => this.handleMessage(message),
+        (exited, code) => this.handleExit(exited, code)
+      );
+      this.workers.push(worker);
+    }
+    if (!worker) {
+      this.stats.rejected++;
+      return null;
+    }
+
+    const stream = {
+      id: this.nextId++,
+      worker,
+      onMessage,
+      seq: 0,
+      inflight: null,
+      pending: null,
+      dropped: 0
+    };
+    worker.streams.add(stream.id);
+    this.streams.set(stream.id, stream);
+    return stream;
+  }
+
+  /**
+   * Submit an encoded frame of a stream
+   * @param {Object} stream - Handle from openStream()
+   * @param {Buffer} frame - JPEG/PNG bytes
+   */
+  submitFrame(stream, frame) {
+    this.stats.frames++;
+    if (stream.inflight) {
+      // Only the newest waiting frame is worth analyzing
+      if (stream.pending) {
+        stream.dropped++;
+        this.stats.dropped++;
+      }
+      stream.pending = frame;
+      return;
+    }
+    this.dispatch(stream, frame);
+  }
+
+  dispatch(stream, frame) {
+    stream.seq++;
+    stream.inflight = { seq: stream.seq, sentAt: performance.now() };
+    stream.worker.send('frame', stream.id, stream.seq, frame);
+  }
+
+  handleMessage(message) {
+    const stream = this.streams.get(message.stream);
+    if (!stream || !stream.inflight || stream.inflight.seq !== message.seq) {
+      return;
+    }
+    const latencyMs = Math.round(performance.now() - stream.inflight.sentAt);
+    stream.inflight = null;
+    this.stats.analyzed++;
+
+    const { stream: _, ...result } = message;
+    stream.onMessage({
+      type: message.error ? 'error' : 'posture',
+      ...result,
+      latencyMs,
+      dropped: stream.dropped
+    });
+
+    if (stream.pending) {
+      const frame = stream.pending;
+      stream.pending = null;
+      this.dispatch(stream, frame);
+    }
+  }
+
+  handleExit(worker, code) {
+    console.error(`❌ Live posture worker exited (code: ${code})`);
+    this.workers = this.workers.filter((w) => w !== worker);
+    for (const id of worker.streams) {
+      const stream = this.streams.get(id);
+      if (stream) {
+        this.streams.delete(id);
+        stream.onMessage({ type: 'error', fatal: true, message: 'Posture worker stopped' });
+      }
+    }
+  }
+
+  /**
+   * Close a stream and free its worker slot
+   * @param {Object} stream - Handle from openStream()
+   */
+  closeStream(stream) {
+    if (!this.streams.delete(stream.id)) {
+      return;
+    }
+    stream.worker.streams.delete(stream.id);
+    stream.worker.send('close', stream.id, 0);
+  }
+
+  shutdown() {
+    this.workers.forEach((worker) => worker.kill());
+    this.workers = [];
+  }
+}
+
+export default new LivePostureService({
+  workers: config.livePostureWorkers,
+  streamsPerWorker: config.livePostureStreamsPerWorker
+});
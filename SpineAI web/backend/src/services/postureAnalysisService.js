@@ -1,8 +1,10 @@
-import { spawn } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import { dirname } from 'path';
 import fs from 'fs';
+import resultCache from './resultCache.js';
+import analysisQueue from './analysisQueue.js';
+import analysisWorker, { ImageRejectedError, pipelineFiles } from './analysisWorker.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -15,6 +17,7 @@ export class PostureAnalysisService {
   constructor() {
     this.pythonScriptPath = path.join(__dirname, '../../posture_analysis.py');
     this.modelPath = path.join(__dirname, '../../yolov8n-pose.pt');
+    this.pipelineFiles = pipelineFiles('posture', this.modelPath);
     this.outputDir = path.join(__dirname, '../../posture_results');
     
     // Create output directory if it doesn't exist
@@ -25,90 +28,94 @@ export class PostureAnalysisService {
 
   /**
    * Analyze posture from image
+   * Duplicate uploads are served from the result cache without inference,
+   * and concurrent duplicates share a single run. New runs wait for a slot
+   * in the host-wide analysis queue (QueueFullError when it is full).
    * @param {string} imagePath - Path to the uploaded image
+   * @param {Object} options
+   * @param {Buffer} options.buffer - Upload bytes; when given they go to the
+   *   worker directly and imagePath (possibly not written yet) is never read
+   * @param {Function} options.onStage - Receives 'decoded', 'inferred' and
+   *   'scored' as the worker finishes them, also when joining an identical
+   *   in-flight run (not called for cached results)
+   * @param {Object} options.reservation - Queue place reserved by a background
+   *   job (analysisQueue.reserve()); left unused on cache hits
    * @returns {Promise<Object>} Analysis results
    */
-  async analyzePosture(imagePath) {
-    return new Promise((resolve, reject) => {
-      console.log('🧍 Posture analysis starting...');
-      console.log('📁 Image:', imagePath);
-      console.log('🤖 Model:', this.modelPath);
-      console.log('🐍 Script:', this.pythonScriptPath);
-
-      // Check if files exist
-      if (!fs.existsSync(imagePath)) {
-        return reject(new Error(`Image file not found: ${imagePath}`));
-      }
-
-      if (!fs.existsSync(this.modelPath)) {
-        return reject(new Error(`Pose model not found: ${this.modelPath}`));
-      }
+  async analyzePosture(imagePath, { buffer, onStage, reservation } = {}) {
+    let cacheKey = null;
+    try {
+      cacheKey = await resultCache.keyFor(buffer || imagePath, this.pipelineFiles);
+    } catch (err) {
+      // Missing files are reported by runAnalysis
+    }
 
-      if (!fs.existsSync(this.pythonScriptPath)) {
-        return reject(new Error(`Python script not found: ${this.pythonScriptPath}`));
+    if (cacheKey) {
+      const cached = resultCache.get(cacheKey);
+      if (cached) {
+        console.log('⚡ Result cache hit:', cacheKey.substring(0, 12));
+        return { ...cached, imagePath, cached: true };
       }
+    }
 
-      // Spawn Python process with arguments
-      const pythonProcess = spawn('python', [
-        this.pythonScriptPath,
-        imagePath,
-        this.modelPath
-      ]);
-
-      let outputData = '';
-      let errorData = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        outputData += data.toString();
-        console.log(`🐍 Python Output: ${data}`);
-      });
+    if (!cacheKey) {
+      return analysisQueue.run(() => this.runAnalysis(imagePath, { buffer, onStage }), reservation);
+    }
 
-      pythonProcess.stderr.on('data', (data) => {
-        errorData += data.toString();
-        console.error(`⚠️ Python Error: ${data}`);
-      });
+    // Identical uploads already being analyzed share that run
+    if (resultCache.inflight.has(cacheKey)) {
+      console.log('🔗 Joining in-flight analysis:', cacheKey.substring(0, 12));
+    }
+    const value = await resultCache.coalesce(cacheKey, async (emit) => {
+      const { imagePath: _, ...result } = await analysisQueue.run(() => this.runAnalysis(imagePath, { buffer, onStage: emit }), reservation);
+      resultCache.set(cacheKey, result);
+      return result;
+    }, onStage);
+    return { ...value, imagePath };
+  }
 
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error(`❌ Python process failed (exit code: ${code})`);
-          return reject(new Error(`Python process failed (code: ${code}): ${errorData}`));
-        }
+  /**
+   * Run the analysis in the long-lived Python worker
+   * @param {string} imagePath - Path to the uploaded image
+   * @param {Object} options - { buffer, onStage } as in analyzePosture()
+   * @returns {Promise<Object>} Analysis results
+   */
+  async runAnalysis(imagePath, { buffer, onStage } = {}) {
+    console.log('🧍 Posture analysis starting...');
+    console.log('📁 Image:', imagePath);
+    console.log('🤖 Model:', this.modelPath);
+
+    // Check if files exist
+    if (!buffer && !fs.existsSync(imagePath)) {
+      throw new Error(`Image file not found: ${imagePath}`);
+    }
 
-        try {
-          const results = this.parseAnalysisOutput(outputData, imagePath);
-          console.log('✅ Posture analysis results:', results);
-          resolve(results);
-        } catch (err) {
-          console.error('❌ Result parsing error:', err);
-          reject(new Error(`Result parsing error: ${err.message}`));
-        }
-      });
+    if (!fs.existsSync(this.modelPath)) {
+      throw new Error(`Pose model not found: ${this.modelPath}`);
+    }
 
-      pythonProcess.on('error', (err) => {
-        console.error('❌ Python execution error:', err);
-        reject(new Error(`Python execution error: ${err.message}`));
-      });
-    });
+    // Results must come from a worker running the pipeline they are cached under
+    const pipeline = await resultCache.pipelineHash(this.pipelineFiles).catch(() => null);
+    const result = await analysisWorker.request('posture', { imagePath, modelPath: this.modelPath }, buffer,
+      (event) => onStage?.(event.stage), pipeline);
+    if (result?.rejected) {
+      throw new ImageRejectedError(result.error, result.gate);
+    }
+    const results = this.parseAnalysisOutput(result, imagePath);
+    console.log('✅ Posture analysis results:', results.overallSeverity, `(score: ${results.score})`);
+    return results;
   }
 
   /**
-   * Parse Python script output
-   * @param {string} output - Raw output from Python script
+   * Validate the worker's result
+   * @param {Object} result - Result dict of the Python analysis
    * @param {string} imagePath - Original image path
    * @returns {Object} Parsed analysis results
    */
-  parseAnalysisOutput(output, imagePath) {
+  parseAnalysisOutput(result, imagePath) {
     try {
-      // Find JSON output in the output string
-      const jsonMatch = output.match(/\{[\s\S]*\}/);
-      if (!jsonMatch) {
-        throw new Error('JSON output not found');
-      }
-
-      const result = JSON.parse(jsonMatch[0]);
-      
-      if (!result.success) {
-        throw new Error(result.error || 'Analysis failed');
+      if (!result || !result.success) {
+        throw new Error(result?.error || 'Analysis failed');
       }
 
       return {
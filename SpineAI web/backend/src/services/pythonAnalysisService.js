@@ -1,8 +1,10 @@
-import { spawn } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import { dirname } from 'path';
 import fs from 'fs';
+import resultCache from './resultCache.js';
+import analysisQueue from './analysisQueue.js';
+import analysisWorker, { ImageRejectedError, pipelineFiles } from './analysisWorker.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -15,6 +17,8 @@ export class PythonAnalysisService {
   constructor() {
     this.pythonScriptPath = path.join(__dirname, '../../spine_analysis.py');
     this.modelPath = path.join(__dirname, '../../models/best.pt');
+    this.pipelineFiles = pipelineFiles('spine', this.modelPath);
+    this.overlayFiles = pipelineFiles('overlay');
     this.outputDir = path.join(__dirname, '../../analysis_results');
     
     // Create output directory if it doesn't exist
@@ -25,90 +29,138 @@ export class PythonAnalysisService {
 
   /**
    * Analyze spine image using Python YOLO model
+   * Duplicate uploads are served from the result cache without inference,
+   * and concurrent duplicates share a single run. New runs wait for a slot
+   * in the host-wide analysis queue (QueueFullError when it is full).
    * @param {string} imagePath - Path to the uploaded image
+   * @param {Object} options
+   * @param {Buffer} options.buffer - Upload bytes; when given they go to the
+   *   worker directly and imagePath (possibly not written yet) is never read
+   * @param {Function} options.onStage - Receives 'decoded', 'inferred' and
+   *   'scored' as the worker finishes them, also when joining an identical
+   *   in-flight run (not called for cached results)
+   * @param {Object} options.reservation - Queue place reserved by a background
+   *   job (analysisQueue.reserve()); left unused on cache hits
    * @returns {Promise<Object>} Analysis results
    */
-  async analyzeImage(imagePath) {
-    return new Promise((resolve, reject) => {
-      console.log('🔬 Python analysis starting...');
-      console.log('📁 Image:', imagePath);
-      console.log('🤖 Model:', this.modelPath);
-      console.log('🐍 Script:', this.pythonScriptPath);
-
-      // Check if files exist
-      if (!fs.existsSync(imagePath)) {
-        return reject(new Error(`Image file not found: ${imagePath}`));
-      }
+  async analyzeImage(imagePath, { buffer, onStage, reservation } = {}) {
+    let cacheKey = null;
+    try {
+      cacheKey = await resultCache.keyFor(buffer || imagePath, this.pipelineFiles);
+    } catch (err) {
+      // Missing files are reported by runAnalysis
+    }
 
-      if (!fs.existsSync(this.modelPath)) {
-        return reject(new Error(`Model file not found: ${this.modelPath}`));
+    if (cacheKey) {
+      const cached = resultCache.get(cacheKey);
+      if (cached) {
+        console.log('⚡ Result cache hit:', cacheKey.substring(0, 12));
+        return { ...(await this.forUpload(cached, imagePath)), cached: true };
       }
+    }
 
-      if (!fs.existsSync(this.pythonScriptPath)) {
-        return reject(new Error(`Python script not found: ${this.pythonScriptPath}`));
-      }
+    if (!cacheKey) {
+      return analysisQueue.run(() => this.runAnalysis(imagePath, { buffer, onStage }), reservation);
+    }
+
+    // Identical uploads already being analyzed share that run
+    if (resultCache.inflight.has(cacheKey)) {
+      console.log('🔗 Joining in-flight analysis:', cacheKey.substring(0, 12));
+    }
+    const value = await resultCache.coalesce(cacheKey, async (emit) => {
+      const { imagePath: _, ...result } = await analysisQueue.run(() => this.runAnalysis(imagePath, { buffer, onStage: emit }), reservation);
+      resultCache.set(cacheKey, result);
+      return result;
+    }, onStage);
+    return this.forUpload(value, imagePath);
+  }
+
+  /**
+   * Hand a result computed for another upload (cache hit, joined run) to this one
+   * Its detection key and overlay name the first upload, which may belong to
+   * another user and is deleted with that user's analysis, so the detections
+   * are stored again under this upload before the result is returned.
+   * @param {Object} result - Cached or shared analysis result
+   * @param {string} imagePath - Path of this upload
+   * @returns {Promise<Object>} Result naming this upload
+   */
+  async forUpload(result, imagePath) {
+    const upload = path.basename(imagePath);
+    if (!result.detectionKey || result.detectionKey.startsWith(`${upload}:`)) {
+      return { ...result, imagePath };
+    }
+
+    let detectionKey = null;
+    try {
+      const pipeline = await resultCache.pipelineHash(this.pipelineFiles).catch(() => null);
+      detectionKey = await analysisWorker.request('rekey', { key: result.detectionKey, upload }, undefined, undefined, pipeline);
+    } catch (err) {
+      // The findings still stand; only the report and overlay endpoints lack detections
+      console.error('⚠️ Detection copy error:', err.message);
+    }
+    const overlay = result.overlay && {
+      ...result.overlay,
+      image: upload,
+      panel: { ...result.overlay.panel, id: upload }
+    };
+    return { ...result, detectionKey, overlay, imagePath };
+  }
 
-      // Spawn Python process with arguments
-      const pythonProcess = spawn('python', [
-        this.pythonScriptPath,
-        imagePath,
-        this.modelPath
-      ]);
-
-      let outputData = '';
-      let errorData = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        outputData += data.toString();
-        console.log(`🐍 Python Output: ${data}`);
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        errorData += data.toString();
-        console.error(`⚠️ Python Error: ${data}`);
-      });
-
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error(`❌ Python process failed (exit code: ${code})`);
-          return reject(new Error(`Python process failed (code: ${code}): ${errorData}`));
-        }
-
-        try {
-          const results = this.parseAnalysisOutput(outputData, imagePath);
-          console.log('✅ Analysis results:', results);
-          resolve(results);
-        } catch (err) {
-          console.error('❌ Result parsing error:', err);
-          reject(new Error(`Result parsing error: ${err.message}`));
-        }
-      });
-
-      pythonProcess.on('error', (err) => {
-        console.error('❌ Python execution error:', err);
-        reject(new Error(`Python execution error: ${err.message}`));
-      });
-    });
+  /**
+   * Rebuild the annotation overlay of a stored study without inference
+   * Served by the long-lived worker, whose detection store keeps its index
+   * parsed between requests.
+   * @param {string} detectionKey - Detection store key of the study
+   * @param {string} format - 'json' or 'svg'
+   * @returns {Promise<Object|string>} Overlay primitives or SVG markup
+   */
+  async getOverlay(detectionKey, format = 'json') {
+    const pipeline = await resultCache.pipelineHash(this.overlayFiles).catch(() => null);
+    return analysisWorker.request('overlay', { key: detectionKey, format }, undefined, undefined, pipeline);
   }
 
   /**
-   * Parse Python script output
-   * @param {string} output - Raw output from Python script
+   * Run the analysis in the long-lived Python worker
+   * @param {string} imagePath - Path to the uploaded image
+   * @param {Object} options - { buffer, onStage } as in analyzeImage()
+   * @returns {Promise<Object>} Analysis results
+   */
+  async runAnalysis(imagePath, { buffer, onStage } = {}) {
+    console.log('🔬 Python analysis starting...');
+    console.log('📁 Image:', imagePath);
+    console.log('🤖 Model:', this.modelPath);
+
+    // Check if files exist
+    if (!buffer && !fs.existsSync(imagePath)) {
+      throw new Error(`Image file not found: ${imagePath}`);
+    }
+
+    if (!fs.existsSync(this.modelPath)) {
+      throw new Error(`Model file not found: ${this.modelPath}`);
+    }
+
+    // Results must come from a worker running the pipeline they are cached under
+    const pipeline = await resultCache.pipelineHash(this.pipelineFiles).catch(() => null);
+    const result = await analysisWorker.request('spine', { imagePath, modelPath: this.modelPath }, buffer,
+      (event) => onStage?.(event.stage), pipeline);
+    if (result?.rejected) {
+      throw new ImageRejectedError(result.error, result.gate);
+    }
+    const results = this.parseAnalysisOutput(result, imagePath);
+    console.log('✅ Analysis results:', results.severity, `(score: ${results.score})`);
+    return results;
+  }
+
+  /**
+   * Validate the worker's result
+   * @param {Object} result - Result dict of the Python analysis
    * @param {string} imagePath - Original image path
    * @returns {Object} Parsed analysis results
    */
-  parseAnalysisOutput(output, imagePath) {
+  parseAnalysisOutput(result, imagePath) {
     try {
-      // Find JSON output in the output string
-      const jsonMatch = output.match(/\{[\s\S]*\}/);
-      if (!jsonMatch) {
-        throw new Error('JSON output not found');
-      }
-
-      const result = JSON.parse(jsonMatch[0]);
-      
-      if (!result.success) {
-        throw new Error(result.error || 'Analysis failed');
+      if (!result || !result.success) {
+        throw new Error(result?.error || 'Analysis failed');
       }
 
       return {
@@ -121,6 +173,10 @@ export class PythonAnalysisService {
         consultDoctor: result.consultDoctor,
         recommendations: result.recommendations,
         score: result.score,
+        detectionKey: result.detectionKey,
+        vertebrae: result.vertebrae,
+        nearDuplicateOf: result.nearDuplicateOf,
+        overlay: result.overlay,
         imagePath: imagePath
       };
     } catch (err) {
@@ -0,0 +1,147 @@
+import crypto from 'crypto';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { dirname } from 'path';
+import fs from 'fs';
+import { config } from '../config/index.js';
+import resultCache from './resultCache.js';
+import analysisQueue from './analysisQueue.js';
+import analysisWorker, { pipelineFiles } from './analysisWorker.js';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = dirname(__filename);
+
+export const REPORT_FORMATS = ['jpg', 'webp', 'png'];
+
+/**
+ * Report Service
+ * Renders annotated spine reports on demand from the upload and its stored
+ * detections, and keeps rendered files in a size-bounded LRU cache, so
+ * only the studies a doctor actually opens pay the render and encode cost.
+ * Renders run in the long-lived analysis worker and take a slot of the
+ * host-wide analysis queue like any analysis.
+ */
+export class ReportService {
+  /**
+   * @param {Object} options
+   * @param {string} options.cacheDir - Directory of rendered reports
+   * @param {number} options.maxBytes - Max total size of the cache
+   */
+  constructor({ cacheDir, maxBytes }) {
+    this.pipelineFiles = pipelineFiles('report');
+    this.cacheDir = cacheDir;
+    this.maxBytes = maxBytes;
+    this.files = new Map();
+    this.total = 0;
+    this.inflight = new Map();
+    this.stats = { hits: 0, renders: 0 };
+
+    if (!fs.existsSync(this.cacheDir)) {
+      fs.mkdirSync(this.cacheDir, { recursive: true });
+    }
+
+    // Rebuild the index, oldest access first
+    fs.readdirSync(this.cacheDir)
+      .filter((name) => REPORT_FORMATS.includes(path.extname(name).slice(1)))
+      .map((name) => ({ name, stat: fs.statSync(path.join(this.cacheDir, name)) }))
+      .sort((a, b) => a.stat.mtimeMs - b.stat.mtimeMs)
+      .forEach(({ name, stat }) => {
+        this.files.set(name, stat.size);
+        this.total += stat.size;
+      });
+  }
+
+  /**
+   * Get the rendered report of a study, rendering it on first request
+   * @param {string} detectionKey - Detection store key of the study
+   * @param {string} imagePath - Original upload
+   * @param {Object} options
+   * @param {number|null} options.size - Max film width/height (null = full size)
+   * @param {string} options.format - One of REPORT_FORMATS
+   * @param {number|null} options.quality - JPEG/WebP quality (null = format default)
+   * @returns {Promise<string>} Path of the rendered report
+   * @throws {QueueFullError} When the analysis queue has no room for the render
+   */
+  async getReport(detectionKey, imagePath, { size = null, format = 'jpg', quality = null } = {}) {
+    const pipeline = await resultCache.pipelineHash(this.pipelineFiles);
+    const key = crypto.createHash('sha256')
+      .update(`${detectionKey}:${size || 'full'}:${format}:${quality || 'default'}:${pipeline}`)
+      .digest('hex');
+    const name = `${key}.${format}`;
+    const filePath = path.join(this.cacheDir, name);
+
+    if (this.files.has(name) && fs.existsSync(filePath)) {
+      // Re-insert to mark as most recently used
+      const bytes = this.files.get(name);
+      this.files.delete(name);
+      this.files.set(name, bytes);
+      const now = new Date();
+      fs.utimes(filePath, now, now, () => {});
+      this.stats.hits++;
+      return filePath;
+    }
+
+    // Concurrent requests for the same report share one render
+    if (this.inflight.has(name)) {
+      return this.inflight.get(name);
+    }
+
+    const pending = this.render(detectionKey, imagePath, filePath, { size, quality, pipeline })
+      .then((result) => {
+        console.log(`🖼️ Report ready: ${result.bytes} bytes, render ${result.renderMs} ms, encode ${result.encodeMs} ms`);
+        this.stats.renders++;
+        this.files.set(name, result.bytes);
+        this.total += result.bytes;
+        this.evict(name);
+        return filePath;
+      })
+      .finally(() => this.inflight.delete(name));
+    this.inflight.set(name, pending);
+    return pending;
+  }
+
+  /**
+   * Drop least recently used reports until the cache fits
+   * @param {string} keep - Report that must survive (just rendered)
+   */
+  evict(keep) {
+    for (const [name, bytes] of this.files) {
+      if (this.total <= this.maxBytes) {
+        break;
+      }
+      if (name === keep) {
+        continue;
+      }
+      this.files.delete(name);
+      this.total -= bytes;
+      fs.unlink(path.join(this.cacheDir, name), () => {});
+    }
+  }
+
+  /**
+   * Render a report in the analysis worker
+   * @param {string} detectionKey - Detection store key of the study
+   * @param {string} imagePath - Original upload
+   * @param {string} outputPath - Target file (format from the extension)
+   * @param {Object} options
+   * @param {number|null} options.size - Max film width/height
+   * @param {number|null} options.quality - JPEG/WebP quality
+   * @param {string} options.pipeline - Pipeline hash of the report modules
+   * @returns {Promise<Object>} Renderer result (path, size, bytes, timings)
+   */
+  async render(detectionKey, imagePath, outputPath, { size = null, quality = null, pipeline = null } = {}) {
+    if (!fs.existsSync(imagePath)) {
+      throw new Error(`Image file not found: ${imagePath}`);
+    }
+
+    console.log('🖼️ Rendering report:', path.basename(outputPath));
+    return analysisQueue.run(() => analysisWorker.request(
+      'report', { key: detectionKey, imagePath, outputPath, size, quality }, undefined, undefined, pipeline
+    ));
+  }
+}
+
+export default new ReportService({
+  cacheDir: path.join(__dirname, '../../report_cache'),
+  maxBytes: config.reportCacheBytes
+});
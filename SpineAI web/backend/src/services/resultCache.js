@@ -0,0 +1,241 @@
+import crypto from 'crypto';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { dirname } from 'path';
+import fs from 'fs';
+import { config } from '../config/index.js';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = dirname(__filename);
+
+/**
+ * Hash a file's contents
+ * @param {string} filePath - File to hash
+ * @returns {Promise<string>} Hex SHA-256 digest
+ */
+export const hashFile = (filePath) => {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')))
+      .on('error', reject);
+  });
+};
+
+/**
+ * Analysis Result Cache
+ * Content-addressed cache of analysis results: an in-memory LRU tier in
+ * front of an on-disk tier with size-based (least recently used) eviction.
+ * Keys combine the image bytes with a pipeline hash (model weights plus
+ * analysis scripts, which hold the thresholds), so a new model or a tuned
+ * threshold never serves stale results.
+ */
+export class ResultCache {
+  /**
+   * @param {Object} options
+   * @param {string} options.cacheDir - Directory of the disk tier
+   * @param {number} options.memoryEntries - Max results kept in memory
+   * @param {number} options.diskBytes - Max total size of the disk tier
+   */
+  constructor({ cacheDir, memoryEntries, diskBytes }) {
+    this.cacheDir = cacheDir;
+    this.memoryEntries = memoryEntries;
+    this.diskBytes = diskBytes;
+    this.memory = new Map();
+    this.disk = new Map();
+    this.diskTotal = 0;
+    this.pipelineHashes = new Map();
+    this.inflight = new Map();
+    this.stats = { memoryHits: 0, diskHits: 0, misses: 0, coalesced: 0 };
+
+    if (!fs.existsSync(this.cacheDir)) {
+      fs.mkdirSync(this.cacheDir, { recursive: true });
+    }
+
+    // Rebuild the disk index, oldest access first
+    fs.readdirSync(this.cacheDir)
+      .filter((name) => name.endsWith('.json'))
+      .map((name) => ({ name, stat: fs.statSync(path.join(this.cacheDir, name)) }))
+      .sort((a, b) => a.stat.mtimeMs - b.stat.mtimeMs)
+      .forEach(({ name, stat }) => {
+        this.disk.set(name.slice(0, -5), stat.size);
+        this.diskTotal += stat.size;
+      });
+  }
+
+  /**
+   * Hash of the files that determine a result (model, scripts)
+   * Recomputed only when one of the files changes.
+   * @param {string[]} files - Pipeline files
+   * @returns {Promise<string>} Hex digest
+   */
+  async pipelineHash(files) {
+    const stamp = files
+      .map((file) => {
+        const stat = fs.statSync(file);
+        return `${file}:${stat.size}:${stat.mtimeMs}`;
+      })
+      .join('|');
+
+    const cached = this.pipelineHashes.get(stamp);
+    if (cached) {
+      return cached;
+    }
+
+    const hash = crypto.createHash('sha256');
+    for (const file of files) {
+      hash.update(await hashFile(file));
+    }
+    const digest = hash.digest('hex');
+    this.pipelineHashes.set(stamp, digest);
+    return digest;
+  }
+
+  /**
+   * Cache key of an image analyzed by a pipeline
+   * @param {string|Buffer} image - Uploaded image (path or in-memory bytes)
+   * @param {string[]} pipelineFiles - Model and script files
+   * @returns {Promise<string>} Cache key
+   */
+  async keyFor(image, pipelineFiles) {
+    const [imageHash, pipeline] = await Promise.all([
+      Buffer.isBuffer(image) ? crypto.createHash('sha256').update(image).digest('hex') : hashFile(image),
+      this.pipelineHash(pipelineFiles)
+    ]);
+    return crypto.createHash('sha256').update(`${imageHash}:${pipeline}`).digest('hex');
+  }
+
+  diskPath(key) {
+    return path.join(this.cacheDir, `${key}.json`);
+  }
+
+  /**
+   * Look up a result
+   * @param {string} key - Cache key
+   * @returns {Object|null} Cached result
+   */
+  get(key) {
+    if (this.memory.has(key)) {
+      const value = this.memory.get(key);
+      // Re-insert to mark as most recently used
+      this.memory.delete(key);
+      this.memory.set(key, value);
+      this.stats.memoryHits++;
+      return value;
+    }
+
+    if (this.disk.has(key)) {
+      try {
+        const value = JSON.parse(fs.readFileSync(this.diskPath(key), 'utf8'));
+        const size = this.disk.get(key);
+        this.disk.delete(key);
+        this.disk.set(key, size);
+        const now = new Date();
+        fs.utimes(this.diskPath(key), now, now, () => {});
+        this.remember(key, value);
+        this.stats.diskHits++;
+        return value;
+      } catch (err) {
+        this.dropDisk(key);
+      }
+    }
+
+    this.stats.misses++;
+    return null;
+  }
+
+  /**
+   * Store a result in both tiers
+   * @param {string} key - Cache key
+   * @param {Object} value - JSON-serializable result
+   */
+  set(key, value) {
+    this.remember(key, value);
+
+    const data = JSON.stringify(value);
+    const size = Buffer.byteLength(data);
+    if (size > this.diskBytes) {
+      return;
+    }
+
+    // Overwritten in place; unlinking here would race the write below
+    if (this.disk.has(key)) {
+      this.diskTotal -= this.disk.get(key);
+      this.disk.delete(key);
+    }
+    fs.writeFile(this.diskPath(key), data, (err) => {
+      if (err) {
+        console.error('⚠️ Result cache write error:', err.message);
+      }
+    });
+    this.disk.set(key, size);
+    this.diskTotal += size;
+
+    // Evict least recently used files until the tier fits again
+    for (const oldKey of this.disk.keys()) {
+      if (this.diskTotal <= this.diskBytes) {
+        break;
+      }
+      this.dropDisk(oldKey);
+    }
+  }
+
+  /**
+   * Run a computation once for concurrent callers with the same key
+   * Callers arriving while it is in flight share its promise (and its
+   * failure), so a burst of identical uploads costs one inference. Events
+   * the computation emits reach every caller's listener; late joiners first
+   * get the events they missed.
+   * @param {string} key - Cache key
+   * @param {Function} compute - Async function producing the result; receives
+   *   emit(event) to report progress
+   * @param {Function} onEvent - Optional, receives the computation's events
+   * @returns {Promise<Object>} Shared result
+   */
+  coalesce(key, compute, onEvent) {
+    const pending = this.inflight.get(key);
+    if (pending) {
+      this.stats.coalesced++;
+      if (onEvent) {
+        pending.events.forEach((event) => onEvent(event));
+        pending.listeners.add(onEvent);
+      }
+      return pending.promise;
+    }
+
+    const run = { events: [], listeners: new Set(onEvent ? [onEvent] : []) };
+    const emit = (event) => {
+      run.events.push(event);
+      run.listeners.forEach((listener) => listener(event));
+    };
+    run.promise = Promise.resolve()
+      .then(() => compute(emit))
+      .finally(() => this.inflight.delete(key));
+    this.inflight.set(key, run);
+    return run.promise;
+  }
+
+  remember(key, value) {
+    this.memory.delete(key);
+    this.memory.set(key, value);
+    while (this.memory.size > this.memoryEntries) {
+      this.memory.delete(this.memory.keys().next().value);
+    }
+  }
+
+  dropDisk(key) {
+    if (!this.disk.has(key)) {
+      return;
+    }
+    this.diskTotal -= this.disk.get(key);
+    this.disk.delete(key);
+    fs.unlink(this.diskPath(key), () => {});
+  }
+}
+
+export default new ResultCache({
+  cacheDir: path.join(__dirname, '../../analysis_cache'),
+  memoryEntries: config.resultCacheEntries,
+  diskBytes: config.resultCacheBytes
+});
@@ -0,0 +1,65 @@
+/**
+ * Worker Protocol
+ * Framed messages between the Node services and long-lived Python workers
+ * (mirror of worker_protocol.py):
+ *
+ *   [u32 header length][u32 payload length][JSON header][payload bytes]
+ *
+ * Requests carry { id, method, params }; workers answer with { id, result }
+ * or { id, error }, optionally preceded by { id, event } messages.
+ */
+
+const PREFIX_BYTES = 8;
+const MAX_HEADER_BYTES = 1 << 20;
+const MAX_PAYLOAD_BYTES = 256 << 20;
+
+/**
+ * Encode one message
+ * @param {Object} header - JSON header
+ * @param {Buffer} payload - Optional binary payload
+ * @returns {Buffer} Frame
+ */
+export function encodeMessage(header, payload = Buffer.alloc(0)) {
+  const body = Buffer.from(JSON.stringify(header));
+  const prefix = Buffer.alloc(PREFIX_BYTES);
+  prefix.writeUInt32BE(body.length, 0);
+  prefix.writeUInt32BE(payload.length, 4);
+  return Buffer.concat([prefix, body, payload]);
+}
+
+/**
+ * Incremental frame decoder for a stdout stream
+ * Chunks may split or join frames arbitrarily; push() returns every frame
+ * completed so far.
+ */
+export class MessageDecoder {
+  constructor() {
+    this.buffer = Buffer.alloc(0);
+  }
+
+  /**
+   * @param {Buffer} chunk - Bytes read from the worker
+   * @returns {Array<{header: Object, payload: Buffer}>} Completed messages
+   * @throws {Error} On invalid lengths or headers (the stream is unusable)
+   */
+  push(chunk) {
+    this.buffer = this.buffer.length ? Buffer.concat([this.buffer, chunk]) : chunk;
+    const messages = [];
+
+    while (this.buffer.length >= PREFIX_BYTES) {
+      const headerBytes = this.buffer.readUInt32BE(0);
+      const payloadBytes = this.buffer.readUInt32BE(4);
+      if (headerBytes > MAX_HEADER_BYTES || payloadBytes > MAX_PAYLOAD_BYTES) {
+        throw new Error(`Frame too large (header ${headerBytes}, payload ${payloadBytes})`);
+      }
+      const end = PREFIX_BYTES + headerBytes + payloadBytes;
+      if (this.buffer.length < end) {
+        break;
+      }
+      const header = JSON.parse(this.buffer.toString('utf8', PREFIX_BYTES, PREFIX_BYTES + headerBytes));
+      messages.push({ header, payload: this.buffer.subarray(PREFIX_BYTES + headerBytes, end) });
+      this.buffer = this.buffer.subarray(end);
+    }
+    return messages;
+  }
+}
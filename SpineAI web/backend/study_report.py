@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Study Report
+Renders the annotated report of a stored study on demand, from the upload
+and its persisted detections (no inference)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+import report_encoding
+import report_overlay
+import report_renderer
+from detection_store import DetectionStore
+
+
+def render_overlay(img, overlay, max_dim=None):
+    """
+    Burn an overlay into a film and attach the report panel
+
+    Args:
+        img: Original BGR upload
+        overlay: Dict from report_overlay.build_overlay() in upload pixels
+        max_dim: Optional max width/height of the film (the panel is added)
+
+    Returns:
+        BGR report image
+    """
+    height, width = img.shape[:2]
+    scale = 1.0
+    if max_dim and max(height, width) > max_dim:
+        scale = max_dim / max(height, width)
+        width = max(1, int(round(width * scale)))
+        height = max(1, int(round(height * scale)))
+        overlay = report_overlay.scale_overlay(overlay, scale)
+
+    # Annotate the film inside the report canvas so it is never copied twice
+    name = overlay["image"] or ""
+    canvas = report_renderer.report_canvas(height, width, name)
+    film = canvas[:, :width]
+    film[...] = img if scale == 1.0 else cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    report_overlay.draw_overlay(film, overlay)
+
+    panel = overlay["panel"]
+    findings = {f["key"]: f["count"] for f in panel["findings"]}
+    return report_renderer.render_report(film, name, panel["imageType"], panel["angle"], findings, out=canvas)
+
+
+def render_study(key, image_path, max_dim=None, store=None):
+    """
+    Render the annotated report image of a stored study
+
+    Args:
+        key: Detection store key of the study
+        image_path: Path to the original upload
+        max_dim: Optional max width/height of the film (the panel is added)
+        store: DetectionStore (the default store if omitted)
+
+    Returns:
+        BGR report image
+    """
+    overlay = report_overlay.overlay_from_store(key, store=store)
+    if overlay is None:
+        raise KeyError(f"Unknown detection key: {key}")
+
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Image could not be read: {image_path}")
+
+    if not overlay["image"]:
+        overlay = dict(overlay, image=os.path.basename(image_path))
+    return render_overlay(img, overlay, max_dim)
+
+
+def write_study(key, image_path, output_path, max_dim=None, fmt=None, quality=None,
+                progressive=False, thumbnail=None, store=None):
+    """
+    Render the report of a stored study and write it encoded
+
+    Args:
+        key: Detection store key of the study
+        image_path: Path to the original upload
+        output_path: Report file (format from the extension unless fmt)
+        max_dim: Optional max width/height of the film
+        fmt: Output format, one of report_encoding.FORMATS
+        quality: JPEG/WebP quality (1-100)
+        progressive: Progressive JPEG
+        thumbnail: Optional max width/height of a thumbnail written alongside
+        store: DetectionStore (the default store if omitted)
+
+    Returns:
+        Stats dict of report_encoding.write_report() plus renderMs
+    """
+    start = time.perf_counter()
+    report = render_study(key, image_path, max_dim, store)
+    render_ms = (time.perf_counter() - start) * 1000
+
+    result = report_encoding.write_report(
+        report, output_path, fmt, quality, progressive=progressive, thumbnail=thumbnail
+    )
+    result["renderMs"] = round(render_ms, 2)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the annotated report of a stored study")
+    parser.add_argument("key", help="Detection store key")
+    parser.add_argument("image_path", help="Original upload")
+    parser.add_argument("output_path", help="Report file (format from the extension unless --format)")
+    parser.add_argument("--size", type=int, help="Max film width/height")
+    parser.add_argument("--format", choices=sorted(report_encoding.FORMATS), help="Output format")
+    parser.add_argument("--quality", type=int, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--progressive", action="store_true", help="Progressive JPEG")
+    parser.add_argument("--thumbnail", type=int, help="Also write a thumbnail of this max width/height")
+    args = parser.parse_args()
+
+    try:
+        result = write_study(
+            args.key, args.image_path, args.output_path, args.size, args.format, args.quality,
+            progressive=args.progressive, thumbnail=args.thumbnail
+        )
+        result["success"] = True
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": f"Report error: {str(e)}"
+        }
+
+    print(json.dumps(result))
+    sys.exit(0 if result["success"] else 1)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Tests for the framed worker protocol and the long-lived analysis worker
+"""
+
+import sys
+import os
+import ast
+import io
+import json
+import tempfile
+import threading
+from unittest import mock
+
+# Add current directory to path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+import cv2
+import numpy as np
+from testutil import run_tests
+
+import analysis_worker
+import report_overlay
+import worker_protocol
+from analysis_worker import AnalysisWorker, ModelCache, decode_payload, default_handlers
+from detection_store import DetectionStore
+from frame_ring import FrameRing
+from test_spine_geometry import random_spine
+
+
+def read_all(data):
+    stream = io.BytesIO(data)
+    messages = []
+    while True:
+        message = worker_protocol.read_message(stream)
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def test_message_roundtrip():
+    """Headers with braces and binary payloads survive framing; bad frames raise"""
+    header = {"id": 3, "method": "spine", "params": {"imagePath": "uploads/{x}.jpg", "note": "ünicode }{"}}
+    payload = bytes(range(256)) * 4
+    data = worker_protocol.encode_message(header, payload) + worker_protocol.encode_message({"id": 4})
+
+    assert read_all(data) == [(header, payload), ({"id": 4}, b"")]
+
+    for broken in (data[:-1], worker_protocol.PREFIX.pack(2, 0) + b"[]",
+                   worker_protocol.PREFIX.pack(worker_protocol.MAX_HEADER_BYTES + 1, 0)):
+        try:
+            read_all(broken)
+        except worker_protocol.ProtocolError:
+            continue
+        raise AssertionError(f"accepted broken frame {broken[:16]!r}")
+
+
+def test_multiplexed_requests():
+    """In-flight requests are answered by id, out of order, with events and per-request errors"""
+    fast_done = threading.Event()
+
+    def slow(params, payload, emit):
+        emit("stage", stage="decoded")
+        assert fast_done.wait(5)
+        return {"success": True, "size": len(payload)}
+
+    def fast(params, payload, emit):
+        fast_done.set()
+        return {"success": True, "image": params["imagePath"]}
+
+    def broken(params, payload, emit):
+        raise RuntimeError("model exploded")
+
+    requests = b"".join([
+        worker_protocol.encode_message({"id": 1, "method": "slow"}, b"x" * 10),
+        worker_protocol.encode_message({"id": 2, "method": "fast", "params": {"imagePath": "a.jpg"}}),
+        worker_protocol.encode_message({"id": 3, "method": "broken"}),
+        worker_protocol.encode_message({"id": 4, "method": "missing"}),
+    ])
+    output = io.BytesIO()
+    worker = AnalysisWorker({"slow": slow, "fast": fast, "broken": broken}, output, threads=4)
+    worker.serve(io.BytesIO(requests))
+
+    messages = [header for header, _ in read_all(output.getvalue())]
+    events = [header for header in messages if "event" in header]
+    responses = {header["id"]: header for header in messages if "event" not in header}
+    order = [header["id"] for header in messages if "event" not in header]
+    assert events == [{"id": 1, "event": "stage", "stage": "decoded"}]
+    assert order.index(2) < order.index(1)
+    assert responses[1]["result"] == {"success": True, "size": 10}
+    assert responses[2]["result"]["image"] == "a.jpg"
+    assert responses[3]["error"] == "model exploded"
+    assert "Unknown method" in responses[4]["error"]
+
+
+def test_ring_frames():
+    """Payloads handed over in ring slots are decoded straight from the slot"""
+    image = np.full((40, 30, 3), 90, np.uint8)
+    jpeg = cv2.imencode(".png", image)[1].tobytes()
+
+    def decode(params, payload, emit):
+        return {"shared": not payload.flags.owndata, "shape": list(decode_payload(payload).shape)}
+
+    with FrameRing(2, 4096) as ring:
+        ring.write(1, jpeg)
+        output = io.BytesIO()
+        worker = AnalysisWorker({"decode": decode}, output, ring=ring)
+        worker.serve(io.BytesIO(
+            worker_protocol.encode_message({"id": 1, "method": "decode", "frame": {"slot": 1, "bytes": len(jpeg)}})
+            + worker_protocol.encode_message({"id": 2, "method": "decode", "frame": {"slot": 5, "bytes": 1}})
+        ))
+        unringed = io.BytesIO()
+        AnalysisWorker({"decode": decode}, unringed).serve(io.BytesIO(
+            worker_protocol.encode_message({"id": 3, "method": "decode", "frame": {"slot": 1, "bytes": 1}})
+        ))
+
+    responses = {header["id"]: header for header, _ in read_all(output.getvalue())}
+    assert responses[1]["result"] == {"shared": True, "shape": [40, 30, 3]}
+    assert "outside the ring" in responses[2]["error"]
+    assert "without a frame ring" in read_all(unringed.getvalue())[0][0]["error"]
+
+
+def test_decode_payload():
+    """Uploads handed over in memory decode without touching the disk"""
+    image = np.random.default_rng(0).integers(0, 255, (40, 60, 3), dtype=np.uint8)
+    png = cv2.imencode(".png", image)[1].tobytes()
+
+    assert np.array_equal(decode_payload(png), image)
+    assert decode_payload(b"") is None
+    try:
+        decode_payload(b"not an image")
+    except ValueError:
+        return
+    raise AssertionError("garbage payload decoded")
+
+
+def test_model_cache_reloads_replaced_weights():
+    """Models are keyed by content hash, so replaced weights are reloaded"""
+    loads = []
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "best.pt")
+        with open(weights, "wb") as f:
+            f.write(b"old weights")
+        cache = ModelCache(loader=lambda path: loads.append(path) or len(loads))
+
+        assert cache.get(weights) == cache.get(weights) == 1
+        with open(weights, "wb") as f:
+            f.write(b"new weights, longer")
+        assert cache.get(weights) == 2
+        assert loads == [weights, weights]
+
+
+def local_imports(nodes):
+    """Backend modules imported by the given AST nodes"""
+    names = set()
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    return {f"{name}.py" for name in names if os.path.exists(os.path.join(BACKEND_DIR, f"{name}.py"))}
+
+
+def parse_module(name):
+    with open(os.path.join(BACKEND_DIR, name), encoding="utf-8") as f:
+        return ast.parse(f.read())
+
+
+def test_pipeline_modules_cover_imports():
+    """pipeline_modules.json lists every module a worker method imports"""
+    with open(os.path.join(BACKEND_DIR, "pipeline_modules.json")) as f:
+        modules = json.load(f)
+    worker = parse_module("analysis_worker.py")
+    handlers = next(node for node in worker.body if isinstance(node, ast.FunctionDef) and node.name == "default_handlers")
+
+    for method, handler in ((node.name, node) for node in handlers.body if isinstance(node, ast.FunctionDef)):
+        if method == "stage":
+            continue
+        listed = set(modules["worker"]) | set(modules.get(method, []))
+        # The handler's deferred imports, then everything those pull in
+        needed = local_imports(worker.body) | local_imports(ast.walk(handler))
+        pending = list(needed - {"analysis_worker.py"})
+        while pending:
+            for name in local_imports(ast.walk(parse_module(pending.pop()))) - needed:
+                needed.add(name)
+                pending.append(name)
+        assert needed <= listed, f"{method}: {sorted(needed - listed)} missing from pipeline_modules.json"
+
+
+def test_rekey():
+    """A study's detections are stored again under a later identical upload"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        boxes = np.arange(24, dtype=np.float32).reshape(4, 6)
+        key = store.append("first.jpeg", "m1", boxes, (640, 480))
+
+        rekey = default_handlers(ModelCache())["rekey"]
+        with mock.patch.object(analysis_worker, "default_store", lambda: store):
+            copied = rekey({"key": key, "upload": "second.jpeg"}, None, None)
+            assert rekey({"key": key, "upload": "first.jpeg"}, None, None) == key
+            assert rekey({"key": "missing:m1", "upload": "second.jpeg"}, None, None) is None
+
+        assert copied == "second.jpeg:m1"
+        assert np.array_equal(store.load(copied), boxes)
+        assert store.record(copied)["size"] == [640, 480]
+
+
+
+def test_overlay():
+    """Overlays of stored studies are served as JSON or SVG"""
+    rng = np.random.default_rng(31)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        key = store.append("spine-7.jpeg", "m1", random_spine(rng, 14), (1000, 2000))
+
+        overlay = default_handlers(ModelCache())["overlay"]
+        with mock.patch.object(report_overlay, "default_store", lambda: store):
+            shapes = overlay({"key": key}, None, None)
+            svg = overlay({"key": key, "format": "svg"}, None, None)
+            try:
+                overlay({"key": "missing:m1"}, None, None)
+                raise AssertionError("unknown key answered")
+            except ValueError:
+                pass
+
+        assert shapes == report_overlay.overlay_from_store(key, store=store)
+        assert shapes["image"] == "spine-7.jpeg"
+        assert svg.startswith("<svg") and 'href="/uploads/spine-7.jpeg"' in svg
+
+
+
+def test_report():
+    """Reports of stored studies are rendered and written by the worker"""
+    rng = np.random.default_rng(32)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        key = store.append("spine-8.jpeg", "m1", random_spine(rng, 14), (300, 600))
+        image_path = os.path.join(tmp, "spine-8.jpeg")
+        cv2.imwrite(image_path, rng.integers(0, 255, (600, 300, 3), dtype=np.uint8))
+        output_path = os.path.join(tmp, "report.webp")
+
+        report = default_handlers(ModelCache())["report"]
+        with mock.patch.object(report_overlay, "default_store", lambda: store):
+            result = report({"key": key, "imagePath": image_path, "outputPath": output_path, "size": 400}, None, None)
+
+        assert result["bytes"] == os.path.getsize(output_path) and result["renderMs"] >= 0
+        assert cv2.imread(output_path).shape[:2] == (result["size"][1], result["size"][0])
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tests for the resumable batch analysis command
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_analysis
+import batch_export
+from detection_store import DetectionStore, detection_key, model_hash
+from test_spine_geometry import random_spine
+from testutil import run_tests
+
+
+def make_tree(root):
+    """Nested archive with images, other files and an unreadable image"""
+    rng = np.random.default_rng(100)
+    paths = []
+    for rel in ("b/2.png", "a/1.jpeg", "a/deep/3.JPG", "4.jpg"):
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, rng.integers(0, 256, (240, 120, 3), dtype=np.uint8))
+        paths.append(path)
+    with open(os.path.join(root, "a", "notes.txt"), "w") as f:
+        f.write("not an image")
+    with open(os.path.join(root, "b", "broken.jpg"), "wb") as f:
+        f.write(b"not a jpeg")
+    return paths
+
+
+def fake_detector(model_path):
+    """Deterministic stand-in for the YOLO detector (no weights in tests)"""
+    def detect(img):
+        rng = np.random.default_rng(int(img.sum()) % 1000)
+        return random_spine(rng, 10) / 5
+    return detect
+
+
+def fake_batch_detector(batch_sizes):
+    """Batched stand-in that records the size of every forward pass"""
+    def load(model_path, batch_size):
+        detect = fake_detector(model_path)
+
+        def detect_batch(images):
+            assert len(images) <= batch_size
+            batch_sizes.append(len(images))
+            for img in images:
+                yield detect(img)
+        return detect_batch
+    return load
+
+
+def test_iter_images():
+    """Walk is recursive, sorted, filtered by extension and skips outputs"""
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp)
+        os.makedirs(os.path.join(tmp, "reports"))
+        cv2.imwrite(os.path.join(tmp, "reports", "old.jpg"), np.zeros((4, 4, 3), np.uint8))
+
+        found = [os.path.relpath(p, tmp) for p in batch_analysis.iter_images(tmp, [os.path.join(tmp, "reports")])]
+        assert found == ["4.jpg", "a/1.jpeg", "a/deep/3.JPG", "b/2.png", "b/broken.jpg"]
+
+        walker = batch_analysis.iter_images(tmp)
+        assert next(walker) == os.path.join(tmp, "4.jpg")
+
+
+def test_pending_scan():
+    """The walk is consumed once, counted ahead of the work and finishes exactly"""
+    walked = []
+
+    def walk():
+        for i in range(25):
+            walked.append(i)
+            yield f"{i}.jpg"
+
+    scan = batch_analysis.PendingScan(walk(), lookahead=10)
+    scan.fill()
+    assert (scan.found, scan.complete) == (10, False)
+    taken = [next(scan) for _ in range(5)]
+    assert taken == [f"{i}.jpg" for i in range(5)] and scan.found == 14
+    assert list(scan) == [f"{i}.jpg" for i in range(5, 25)]
+    assert (scan.found, scan.complete) == (25, True) and walked == list(range(25))
+
+
+def test_resumable_run():
+    """Finished files are skipped on restart, changed and failed ones are redone"""
+    original = batch_analysis.load_detector
+    batch_analysis.load_detector = fake_detector
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "archive")
+            paths = make_tree(archive)
+            model = os.path.join(tmp, "best.pt")
+            with open(model, "wb") as f:
+                f.write(b"weights")
+            options = {
+                "output": os.path.join(tmp, "reports"),
+                "format": "webp",
+                "thumbnail": 64,
+                "thresholds": "report",
+                "store_dir": os.path.join(tmp, "store"),
+            }
+
+            counts = batch_analysis.run_batch(archive, model, options, workers=0)
+            assert counts == {"done": 4, "failed": 1}
+            assert os.path.exists(os.path.join(tmp, "reports", "a", "deep", "3.webp"))
+            assert os.path.exists(os.path.join(tmp, "reports", "a", "deep", "3_thumb.webp"))
+            assert len(DetectionStore(options["store_dir"])) == 4
+
+            manifest = os.path.join(tmp, "reports", "batch_manifest.sqlite")
+            with sqlite3.connect(manifest) as conn:
+                assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+                row = conn.execute("SELECT status, detection_key FROM files WHERE path = ?", (paths[1],)).fetchone()
+                assert row == ("done", detection_key("a/1.jpeg", model_hash(model)))
+
+            # Only the changed file and the failed one are analyzed again
+            os.utime(paths[0], ns=(1, 1))
+            pending = list(batch_analysis.Manifest(manifest).pending(batch_analysis.iter_images(archive)))
+            assert sorted(os.path.relpath(p, archive) for p in pending) == ["b/2.png", "b/broken.jpg"]
+
+            counts = batch_analysis.run_batch(archive, model, options, workers=0)
+            assert counts == {"done": 4, "failed": 1}
+            assert len(DetectionStore(options["store_dir"])) == 4
+    finally:
+        batch_analysis.load_detector = original
+
+
+def test_batched_run():
+    """Batched streaming mode matches the per-file results, with or without the frame ring"""
+    batch_sizes, acquired = [], []
+    originals = batch_analysis.load_detector, batch_analysis.load_batch_detector, batch_analysis.FrameRing
+    batch_analysis.load_detector = fake_detector
+    batch_analysis.load_batch_detector = fake_batch_detector(batch_sizes)
+
+    class RecordingRing(batch_analysis.FrameRing):
+        def write(self, slot, frame):
+            acquired.append(slot)
+            return super().write(slot, frame)
+    batch_analysis.FrameRing = RecordingRing
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "archive")
+            make_tree(archive)
+            model = os.path.join(tmp, "best.pt")
+            with open(model, "wb") as f:
+                f.write(b"weights")
+            rows = {}
+            for name, batch_size, workers in (("single", None, 0), ("batched", 3, 0), ("shared", 2, 2)):
+                options = {"thresholds": "report", "store_dir": os.path.join(tmp, name, "store"),
+                           "summary": os.path.join(tmp, name, "summary.jsonl"), "shm_slot_mb": 1}
+                manifest = os.path.join(tmp, name, "manifest.sqlite")
+                counts = batch_analysis.run_batch(archive, model, options, workers=workers, manifest_path=manifest,
+                                                  batch_size=batch_size)
+                assert counts == {"done": 4, "failed": 1}
+                with sqlite3.connect(manifest) as conn:
+                    rows[name] = conn.execute(
+                        "SELECT path, status, detection_key, cobb_angle, findings FROM files ORDER BY path"
+                    ).fetchall()
+
+            summary = batch_export.read_summary(os.path.join(tmp, "batched", "summary.jsonl"))
+            assert sorted(r["file"] for r in summary) == [r[0] for r in rows["batched"]]
+            assert all(r["modelHash"] == model_hash(model) for r in summary)
+            assert all(r["inferenceMs"] is not None for r in summary if r["status"] == "done")
+
+            # broken.jpg (last in the second chunk) is dropped before inference
+            assert batch_sizes[:2] == [3, 1]
+            assert rows["batched"] == rows["single"]
+            # Scoring workers read the images from the shared frame ring
+            assert sorted(acquired) == [0, 1, 2, 3] and rows["shared"] == rows["single"]
+    finally:
+        batch_analysis.load_detector, batch_analysis.load_batch_detector, batch_analysis.FrameRing = originals
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming batch summary export
+"""
+
+import sys
+import os
+import tempfile
+
+import pytest
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_export
+from testutil import run_tests
+
+
+def batch_results(n):
+    """Result dicts as produced by batch_analysis"""
+    results = []
+    for i in range(n):
+        if i % 5 == 4:
+            results.append({"path": f"/archive/{i}.jpg", "status": "failed", "error": "Image could not be read",
+                            "modelHash": "m1", "timings": {}, "elapsedMs": 0.4})
+            continue
+        results.append({
+            "path": f"/archive/{i}.jpg",
+            "status": "done",
+            "detectionKey": f"{i}.jpg:m1",
+            "modelHash": "m1",
+            "imageType": "AP" if i % 2 else "LATERAL",
+            "vertebrae": 12,
+            "cobbAngle": 10.0 + i,
+            "limitVertebrae": [2, 7],
+            "findings": {"compression_fracture": i % 3, "herniated_disc": 1, "listhesis": 0},
+            "timings": {"decodeMs": 3.5, "inferenceMs": 40.25, "geometryMs": 0.5},
+            "elapsedMs": 45.0,
+        })
+    return results
+
+
+def test_summary_record():
+    """Records are flat, complete and None where not applicable"""
+    done, failed = batch_export.summary_record(batch_results(5)[0]), batch_export.summary_record(batch_results(5)[4])
+    assert list(done) == batch_export.COLUMNS
+    assert (done["upperVertebra"], done["lowerVertebra"]) == (2, 7)
+    assert done["herniatedDisc"] == 1 and done["inferenceMs"] == 40.25 and done["renderMs"] is None
+    assert failed["status"] == "failed" and failed["cobbAngle"] is None and failed["compressionFracture"] is None
+
+
+def test_text_formats():
+    """CSV and JSONL are streamed in row groups and read back"""
+    results = batch_results(23)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("summary.csv", "summary.jsonl"):
+            path = os.path.join(tmp, name)
+            with batch_export.SummaryWriter(path, row_group_size=10) as writer:
+                for result in results[:20]:
+                    writer.write(result)
+                # Records are on disk as soon as they are written
+                assert len(batch_export.read_parts(path)) == 20
+                for result in results[20:]:
+                    writer.write(result)
+
+            rows = batch_export.read_summary(path)
+            assert len(rows) == 23
+            assert rows[3]["file"] == "/archive/3.jpg"
+            assert float(rows[3]["cobbAngle"]) == 13.0
+
+        try:
+            batch_export.SummaryWriter(os.path.join(tmp, "summary.xlsx"))
+            assert False, "unsupported format accepted"
+        except ValueError:
+            pass
+
+
+def test_columnar_formats():
+    """Parquet and Arrow IPC keep the narrow schema"""
+    pytest.importorskip("pyarrow")
+    results = batch_results(23)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("summary.parquet", "summary.arrow"):
+            path = os.path.join(tmp, name)
+            with batch_export.SummaryWriter(path, row_group_size=10) as writer:
+                for result in results:
+                    writer.write(result)
+
+            table = batch_export.read_summary(path)
+            assert table.num_rows == 23
+            assert table.schema == batch_export.arrow_schema(batch_export.normalize_format(os.path.splitext(name)[1]))
+            angles = table.column("cobbAngle").to_pylist()
+            assert angles[3] == 13.0 and angles[4] is None
+            assert table.column("imageType").to_pylist()[:2] == ["LATERAL", "AP"]
+
+
+def test_resumed_and_crashed_runs():
+    """Later runs add to the summary; a killed run loses nothing and breaks nothing"""
+    results = batch_results(15)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "summary.jsonl")
+        with batch_export.SummaryWriter(path) as writer:
+            for result in results[:10]:
+                writer.write(result)
+
+        # Killed mid-run: the summary of the first run stays intact
+        crashed = batch_export.SummaryWriter(path)
+        for result in results[10:12]:
+            crashed.write(result)
+        with open(crashed.part_path, "a", encoding="utf-8") as f:
+            f.write('{"file": "/archive/torn')
+        assert len(batch_export.read_summary(path)) == 10
+
+        # The resumed run only sees the remaining files and one that changed
+        with batch_export.SummaryWriter(path) as writer:
+            for result in results[12:] + [dict(results[3], cobbAngle=99.0)]:
+                writer.write(result)
+        assert (writer.count, writer.total) == (4, 15)
+
+        rows = batch_export.read_summary(path)
+        assert sorted(row["file"] for row in rows) == sorted(r["path"] for r in results)
+        assert next(row for row in rows if row["file"] == "/archive/3.jpg")["cobbAngle"] == 99.0
+        crashed.close()
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the raw detection store
+"""
+
+import sys
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import spine_geometry
+import detection_store
+from detection_store import ROW_BYTES, DetectionStore, detection_key, model_hash
+from test_spine_geometry import random_spine
+from testutil import run_tests
+
+
+def test_round_trip():
+    """Stored rows come back unchanged and the latest record wins"""
+    rng = np.random.default_rng(10)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        first = random_spine(rng, 12)
+        key = store.append("spine-1.jpeg", "abc", first, (1200, 2400))
+
+        assert key == detection_key("spine-1.jpeg", "abc")
+        assert np.array_equal(store.load(key), first)
+        assert store.record(key)["size"] == [1200, 2400]
+
+        second = random_spine(rng, 4)[:, :4]
+        store.append("spine-1.jpeg", "abc", second)
+        loaded = store.load(key)
+        assert np.array_equal(loaded[:, :4], second) and not loaded[:, 4:].any()
+
+        store.append("spine-2.jpeg", "abc", np.empty((0, 6)))
+        assert store.load("spine-2.jpeg:abc").shape == (0, 6)
+        assert store.load("missing:abc") is None
+
+        # A second handle (another analyzer process) sees the same index
+        reopened = DetectionStore(tmp)
+        assert reopened.keys() == ["spine-1.jpeg:abc", "spine-2.jpeg:abc"]
+        assert np.array_equal(reopened.load(key), loaded)
+
+
+def test_append_skips_index():
+    """Opening and appending never parse the index; reads catch up incrementally"""
+    rng = np.random.default_rng(12)
+    with tempfile.TemporaryDirectory() as tmp:
+        DetectionStore(tmp).append("old.jpeg", "m1", random_spine(rng, 5))
+        store = DetectionStore(tmp)
+        key = store.append("new.jpeg", "m1", random_spine(rng, 3))
+        assert store._index_pos == 0 and not store._index
+
+        assert store.load(key).shape == (3, 6)
+        assert store.keys() == ["old.jpeg:m1", "new.jpeg:m1"]
+        store.append("newer.jpeg", "m1", random_spine(rng, 2))
+        assert len(store) == 3
+
+
+def test_rescore_matches_batch():
+    """Re-scoring from the store equals scoring the original detections"""
+    rng = np.random.default_rng(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        studies = [random_spine(rng, int(n)) for n in rng.integers(0, 20, 50)]
+        for i, boxes in enumerate(studies):
+            store.append(f"spine-{i}.jpeg", "m1", boxes)
+
+        keys, result = store.rescore(spine_geometry.REPORT_THRESHOLDS)
+        offsets = np.concatenate([[0], np.cumsum([len(b) for b in studies])])
+        expected = spine_geometry.analyze_batch(
+            np.concatenate(studies), offsets, spine_geometry.REPORT_THRESHOLDS
+        )
+
+        assert keys == [f"spine-{i}.jpeg:m1" for i in range(len(studies))]
+        assert np.array_equal(result.cobb_angle, expected.cobb_angle)
+        assert np.array_equal(result.image_type, expected.image_type)
+        for key in expected.findings:
+            assert np.array_equal(result.findings[key], expected.findings[key])
+
+        subset, boxes, offsets = store.load_batch(["spine-3.jpeg:m1", "spine-1.jpeg:m1"])
+        assert np.array_equal(boxes[offsets[0]:offsets[1]], studies[3])
+        assert np.array_equal(boxes[offsets[1]:offsets[2]], studies[1])
+
+
+def test_short_writes():
+    """Short writes are completed and a partial row is never indexed"""
+    rng = np.random.default_rng(13)
+    real_write = os.write
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        spine = random_spine(rng, 9)
+        with mock.patch.object(detection_store.os, "write", lambda fd, data: real_write(fd, data[:7])):
+            key = store.append("short.jpeg", "m1", spine)
+        assert np.array_equal(store.load(key), spine)
+        assert os.path.getsize(store.data_path) == 9 * ROW_BYTES
+
+        # A writer that died mid-row leaves the file misaligned
+        with open(store.data_path, "ab") as f:
+            f.write(b"\0" * 5)
+        try:
+            store.append("after.jpeg", "m1", spine)
+            raise AssertionError("misaligned append was indexed")
+        except ValueError:
+            pass
+        assert store.keys() == [key]
+
+
+def test_model_hash():
+    """Model hash depends on content only"""
+    with tempfile.TemporaryDirectory() as tmp:
+        a = os.path.join(tmp, "a.pt")
+        b = os.path.join(tmp, "b.pt")
+        for path in (a, b):
+            with open(path, "wb") as f:
+                f.write(b"weights")
+        assert model_hash(a) == model_hash(b)
+        assert len(model_hash(a)) == 16
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
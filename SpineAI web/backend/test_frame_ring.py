@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared memory frame ring
+"""
+
+import sys
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from frame_ring import FrameRing, ring_spec
+from testutil import run_tests
+
+
+def checksum_slot(spec, descriptor):
+    """Read a slot in another process and mark it as seen"""
+    ring = FrameRing.attach(spec)
+    try:
+        frame = ring.view(descriptor)
+        total = int(frame.sum(dtype=np.int64))
+        frame[0, 0] = 7
+        del frame
+        return total
+    finally:
+        ring.close()
+
+
+def test_slots():
+    """Frames are written once, viewed without copies and slots are recycled"""
+    rng = np.random.default_rng(0)
+    with FrameRing(2, 64 * 48 * 3) as ring:
+        image = rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)
+        first = ring.acquire()
+        descriptor = ring.write(first, image)
+        view = ring.view(descriptor)
+        assert np.array_equal(view, image) and not view.flags.owndata
+        assert np.shares_memory(view, ring.view(descriptor))
+
+        second = ring.acquire()
+        encoded = ring.write(second, b"\xff\xd8jpeg")
+        assert ring.view(encoded).tobytes() == b"\xff\xd8jpeg"
+        assert ring.acquire() is None
+
+        ring.release(first)
+        assert ring.acquire() == first
+        assert not ring.fits(np.zeros((49, 64, 3), np.uint8))
+        try:
+            ring.write(first, np.zeros((49, 64, 3), np.uint8))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("oversized frame accepted")
+        del view
+
+
+def test_cross_process():
+    """Another process maps the same slot from its descriptor alone"""
+    image = np.arange(32 * 32 * 3, dtype=np.uint8).reshape(32, 32, 3)
+    with FrameRing(1, image.nbytes) as ring:
+        descriptor = ring.write(ring.acquire(), image)
+        with ProcessPoolExecutor(1) as pool:
+            total = pool.submit(checksum_slot, ring.spec(), descriptor).result()
+        view = ring.view(descriptor)
+        assert total == int(image.sum(dtype=np.int64))
+        assert view[0, 0].tolist() == [7, 7, 7]
+        del view
+
+
+
+def test_server_ring():
+    """A ring created as a plain /dev/shm file (as the Node server does) attaches by spec"""
+    if not os.path.isdir("/dev/shm"):
+        pytest.skip("no /dev/shm on this host")
+    name = f"spineai-test-{os.getpid()}"
+    path = os.path.join("/dev/shm", name)
+    with open(path, "wb") as f:
+        f.truncate(2 * 64)
+        f.seek(64)
+        f.write(b"\xff\xd8frame")
+    try:
+        ring = FrameRing.attach(ring_spec(f"{name}:2:64"), track=False)
+        payload = ring.payload({"slot": 1, "bytes": 7})
+        assert payload.tobytes() == b"\xff\xd8frame" and not payload.flags.owndata
+        for bad in ({"slot": 2, "bytes": 1}, {"slot": 0, "bytes": 65}):
+            try:
+                ring.payload(bad)
+            except ValueError:
+                continue
+            raise AssertionError(f"accepted {bad}")
+        del payload
+        ring.close()
+        assert os.path.exists(path)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-inference image gate
+"""
+
+import sys
+import os
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import image_gate
+from testutil import run_tests
+
+
+def radiograph(height=1200, width=800):
+    """Grayscale X-ray-like image: dark field, bright vertebra blocks, film grain"""
+    rng = np.random.default_rng(1)
+    img = np.full((height, width), 40, np.float32)
+    for i in range(12):
+        top = 80 + i * 90
+        left = width // 2 - 90 + int(25 * np.sin(i / 3))
+        cv2.rectangle(img, (left, top), (left + 180, top + 70), 200, -1)
+    img += rng.normal(0, 12, img.shape)
+    return cv2.cvtColor(np.clip(img, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+def photo(height=960, width=720):
+    """Colour snapshot: skin/clothes/background patches with texture"""
+    rng = np.random.default_rng(2)
+    img = np.zeros((height, width, 3), np.float32)
+    img[:] = (60, 140, 90)
+    cv2.rectangle(img, (200, 100), (520, 900), (70, 110, 190), -1)
+    cv2.circle(img, (360, 160), 80, (120, 160, 220), -1)
+    img += rng.normal(0, 15, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def test_radiograph_and_photo():
+    """Grayscale radiographs and colour photos are told apart"""
+    assert image_gate.classify_image(radiograph()).kind == "radiograph"
+    assert image_gate.classify_image(photo()).kind == "photo"
+    # A single-channel decode is a radiograph too
+    gray = cv2.cvtColor(radiograph(), cv2.COLOR_BGR2GRAY)
+    assert image_gate.classify_image(gray).kind == "radiograph"
+
+
+def test_unusable():
+    """Garbage uploads are rejected with a reason"""
+    cases = {
+        "small": radiograph(100, 80),
+        "aspect": radiograph(4000, 600),
+        "dark": np.full((600, 400, 3), 5, np.uint8),
+        "bright": np.full((600, 400, 3), 250, np.uint8),
+        "blank": np.full((600, 400, 3), 128, np.uint8),
+        "binary": np.where(np.indices((600, 400)).sum(axis=0) % 40 < 20, 30, 220).astype(np.uint8),
+        "blurry": cv2.GaussianBlur(radiograph(), (0, 0), 20),
+    }
+    reasons = {}
+    for name, img in cases.items():
+        gate = image_gate.classify_image(img)
+        assert gate.kind == "unusable", f"{name}: {gate.kind} {gate.signals}"
+        reasons[name] = gate.reason
+    assert "small" in reasons["small"] and "aspect" in reasons["aspect"]
+    assert "dark" in reasons["dark"] and "bright" in reasons["bright"]
+    assert "blank" in reasons["blank"] and "blurry" in reasons["blurry"]
+
+
+def test_fast():
+    """The gate stays in the low milliseconds on a full-size X-ray"""
+    img = cv2.resize(radiograph(), (2400, 3600))
+    image_gate.classify_image(img)
+    times = sorted(image_gate.classify_image(img).signals["gateMs"] for _ in range(10))
+    assert times[len(times) // 2] < 20, times
+    assert image_gate.gate_dict(image_gate.classify_image(img))["kind"] == "radiograph"
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
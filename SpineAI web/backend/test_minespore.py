@@ -11,6 +11,8 @@ import json
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from testutil import run_tests
+
 try:
     from posture_analysis_minespore import PostureAnalyzer, analyze_posture
     from spine_analysis_minespore import SpineAnalyzer, analyze_spine
@@ -227,54 +229,5 @@ def test_dependencies():
     return all(results.values())
 
 
-def run_all_tests():
-    """Run all tests and report results"""
-    print("\n" + "="*60)
-    print("MINESPORE INTEGRATION TEST SUITE")
-    print("="*60)
-    
-    tests = [
-        ("Dependencies Check", test_dependencies),
-        ("PostureAnalyzer Initialization", test_posture_analyzer),
-        ("SpineAnalyzer Initialization", test_spine_analyzer),
-        ("Preprocessing Pipeline", test_preprocessing),
-        ("Cobb Angle Calculation", test_cobb_angle_calculation),
-        ("Disease Detection", test_disease_detection),
-    ]
-    
-    results = {}
-    
-    for test_name, test_func in tests:
-        try:
-            results[test_name] = test_func()
-        except Exception as e:
-            print(f"\n❌ {test_name} crashed: {e}")
-            results[test_name] = False
-    
-    # Print summary
-    print("\n" + "="*60)
-    print("TEST SUMMARY")
-    print("="*60)
-    
-    passed = sum(1 for r in results.values() if r)
-    total = len(results)
-    
-    for test_name, result in results.items():
-        status = "✅ PASS" if result else "❌ FAIL"
-        print(f"{status:12} {test_name}")
-    
-    print("\n" + "-"*60)
-    print(f"Results: {passed}/{total} tests passed ({passed*100//total}%)")
-    print("="*60)
-    
-    if passed == total:
-        print("\n🎉 All tests passed! Minespore integration is working correctly.")
-        return 0
-    else:
-        print(f"\n⚠️  {total-passed} test(s) failed. Please review the errors above.")
-        return 1
-
-
 if __name__ == "__main__":
-    exit_code = run_all_tests()
-    sys.exit(exit_code)
+    sys.exit(run_tests(globals(), "MINESPORE INTEGRATION TEST SUITE"))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Tests for the perceptual hash near-duplicate index
+"""
+
+import sys
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from perceptual_index import MAX_DISTANCE, PerceptualHashIndex, dhash, hamming, remap_boxes, thumbnail
+from test_spine_geometry import random_spine
+from testutil import run_tests
+
+
+def synthetic_film(rng, width=600, height=1200):
+    """Grayscale image with a column of bright blocks on a noisy background"""
+    image = rng.integers(0, 60, (height, width), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 8)
+    for y in range(60, height - 100, 90):
+        x = width // 2 + int(rng.integers(-40, 40))
+        cv2.rectangle(image, (x - 60, y), (x + 60, y + 70), int(rng.integers(150, 255)), -1)
+    return image
+
+
+def test_dhash_near_duplicates():
+    """Recompressed and resized copies stay close, other films do not"""
+    rng = np.random.default_rng(20)
+    film = synthetic_film(rng)
+    original = dhash(film)
+
+    ok, encoded = cv2.imencode(".jpg", film, [cv2.IMWRITE_JPEG_QUALITY, 75])
+    recompressed = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+    resized = cv2.resize(film, (450, 900), interpolation=cv2.INTER_AREA)
+
+    assert hamming([dhash(recompressed)], original)[0] <= MAX_DISTANCE
+    assert hamming([dhash(resized)], original)[0] <= MAX_DISTANCE
+    assert hamming([dhash(synthetic_film(rng))], original)[0] > MAX_DISTANCE
+
+
+def test_lookup_matches_brute_force():
+    """Multi-index lookup returns the brute-force nearest record"""
+    rng = np.random.default_rng(21)
+    hashes = rng.integers(0, 2**63, 2000, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, 2000).astype(np.uint64)
+    # One shared thumbnail, so verification passes and only the hashes decide
+    thumb = thumbnail(synthetic_film(rng))
+    with tempfile.TemporaryDirectory() as tmp:
+        # Lookups between the adds merge the entries into the tables in steps
+        index = PerceptualHashIndex(tmp, delta_limit=300)
+        for i, h in enumerate(hashes):
+            index.add(int(h), thumb, f"spine-{i}.jpeg:m1", (1000, 2000))
+            if i % 250 == 0:
+                assert index.lookup(int(h), thumb, (1000, 2000))["key"] == f"spine-{i}.jpeg:m1"
+        assert len(index) == len(hashes)
+        assert index._state[1] == len(hashes)
+
+        for i in rng.integers(0, len(hashes), 50):
+            flips = rng.choice(64, int(rng.integers(0, MAX_DISTANCE + 1)), replace=False)
+            query = int(hashes[i]) ^ int(sum(1 << int(b) for b in flips))
+            distance = hamming(hashes, query)
+            match = index.lookup(query, thumb, (500, 1000))
+            assert match is not None
+            assert match["distance"] == distance.min()
+            assert distance[int(match["key"].split("-")[1].split(".")[0])] == distance.min()
+
+        # Different aspect ratio or model never matches
+        assert index.lookup(int(hashes[0]), thumb, (1000, 1000)) is None
+        assert index.lookup(int(hashes[0]), thumb, (1000, 2000), "m2") is None
+        assert index.lookup(int(hashes[0]), thumb, (1000, 2000), "m1")["key"] == "spine-0.jpeg:m1"
+
+        # Records appended by another process are picked up
+        PerceptualHashIndex(tmp).add(12345, thumb, "late.jpeg:m1", (10, 20))
+        assert index.lookup(12345, thumb, (10, 20))["key"] == "late.jpeg:m1"
+
+
+def test_add_merges_incrementally():
+    """Adds land in the delta and are merged without re-sorting the tables"""
+    rng = np.random.default_rng(24)
+    thumb = thumbnail(synthetic_film(rng))
+    hashes = [int(h) for h in rng.integers(0, 2**63, 40, dtype=np.uint64)]
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PerceptualHashIndex(tmp, delta_limit=10)
+        for i, h in enumerate(hashes[:20]):
+            index.add(h, thumb, f"old-{i}.jpeg:m1", (100, 200))
+        assert len(index) == 20 and index._state[1] == 20
+        tables = index._state[2]
+
+        # A few own adds stay in the delta and are found there
+        for i, h in enumerate(hashes[20:25]):
+            index.add(h, thumb, f"new-{i}.jpeg:m1", (100, 200))
+        assert index.lookup(hashes[22], thumb, (100, 200))["key"] == "new-2.jpeg:m1"
+        assert index._state[1] == 20 and index._state[2] is tables
+
+        # Past the limit the delta is merged into the sorted tables
+        for i, h in enumerate(hashes[25:]):
+            index.add(h, thumb, f"new-{i + 5}.jpeg:m1", (100, 200))
+        assert index.lookup(hashes[-1], thumb, (100, 200))["key"] == "new-19.jpeg:m1"
+        assert index._state[1] == 40
+        for values, order in index._state[2]:
+            assert np.all(values[:-1] <= values[1:]) and sorted(order) == list(range(40))
+        assert index.lookup(hashes[3], thumb, (100, 200))["key"] == "old-3.jpeg:m1"
+
+        try:
+            index.add(hashes[0], thumb, "x" * 200 + ":m1", (100, 200))
+            raise AssertionError("long key was truncated")
+        except ValueError:
+            pass
+
+
+def test_lookup_verifies_thumbnails():
+    """A close hash alone never reuses another film's detections"""
+    rng = np.random.default_rng(23)
+    film, other = synthetic_film(rng), synthetic_film(rng)
+    copy = cv2.resize(film, (450, 900), interpolation=cv2.INTER_AREA)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PerceptualHashIndex(tmp)
+        index.add(dhash(film), thumbnail(film), "film.jpeg:m1", (600, 1200))
+
+        match = index.lookup(dhash(copy), thumbnail(copy), (450, 900))
+        assert match["key"] == "film.jpeg:m1" and match["correlation"] >= 0.97
+        # Same hash, different picture (another patient's film)
+        assert index.lookup(dhash(film), thumbnail(other), (600, 1200)) is None
+
+
+def test_remap_boxes():
+    """Detections scale with the image size"""
+    rng = np.random.default_rng(22)
+    boxes = random_spine(rng, 10)
+    scaled = remap_boxes(boxes, (1000, 2000), (500, 1500))
+    assert np.allclose(scaled[:, [0, 2]], boxes[:, [0, 2]] * 0.5)
+    assert np.allclose(scaled[:, [1, 3]], boxes[:, [1, 3]] * 0.75)
+    assert np.array_equal(scaled[:, 4:], boxes[:, 4:])
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared posture geometry engine
+"""
+
+import sys
+import os
+
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import posture_geometry
+from testutil import run_tests
+
+
+def person(head_offset, back_offset, facing=1, torso=100.0):
+    """(17, 2) keypoints with the ear/shoulder offsets given in torso heights"""
+    kpts = np.zeros((17, 2), dtype=np.float32)
+    hip = np.array([300.0, 400.0])
+    shoulder = hip + [facing * back_offset * torso, -torso]
+    ear = shoulder + [facing * head_offset * torso, -30.0]
+    kpts[list(posture_geometry.HIPS)] = hip
+    kpts[list(posture_geometry.SHOULDERS)] = shoulder
+    kpts[list(posture_geometry.EARS)] = ear
+    kpts[posture_geometry.NOSE] = [shoulder[0] + facing * 60.0, ear[1]]
+    return kpts
+
+
+def test_verdicts():
+    """Thresholds follow the legacy posture script in both directions"""
+    for facing in (1, -1):
+        healthy = posture_geometry.assess_posture(person(0.05, 0.0, facing))
+        assert healthy["direction"] == ("RIGHT" if facing == 1 else "LEFT")
+        assert healthy["overallStatus"] == "HEALTHY POSTURE" and healthy["score"] == 100
+
+        forward = posture_geometry.assess_posture(person(0.2, 0.0, facing))
+        assert forward["headPosture"]["status"] == "FORWARD HEAD POSTURE"
+        assert forward["headPosture"]["deviation_cm"] == 10.0
+        assert forward["score"] == 75 and forward["consultDoctor"]
+
+        backward = posture_geometry.assess_posture(person(-0.2, 0.0, facing))
+        assert backward["headPosture"]["status"] == "BACKWARD HEAD POSTURE"
+
+        slouch = posture_geometry.assess_posture(person(0.2, 0.2, facing))
+        assert slouch["backPosture"]["status"] == "KYPHOSIS (SLOUCHING)"
+        assert slouch["score"] == 45 and len(slouch["recommendations"]) == 5
+
+
+def test_vectorized_frames():
+    """(T, 17, 2) measurements equal the per-frame ones"""
+    rng = np.random.default_rng(7)
+    frames = rng.uniform(0, 640, (50, 17, 2)).astype(np.float32)
+    frames[3, list(posture_geometry.HIPS), 1] = frames[3, list(posture_geometry.SHOULDERS), 1].mean()
+    batch = posture_geometry.posture_measurements(frames)
+    for t in range(len(frames)):
+        single = posture_geometry.posture_measurements(frames[t])
+        for field in posture_geometry.PostureMeasurements._fields:
+            assert np.array_equal(getattr(batch, field)[t], getattr(single, field))
+    assert batch.torso_height[3] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming posture mode
+"""
+
+import sys
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import posture_stream
+from test_posture_geometry import person
+from testutil import run_tests
+
+
+def write_video(path, frames=30, fps=30.0):
+    """Short synthetic clip whose frame index is encoded in the brightness"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 8, dtype=np.uint8))
+    writer.release()
+
+
+def test_filters():
+    """Filters settle on a steady pose, reject jitter and keep undetected points"""
+    rng = np.random.default_rng(3)
+    truth = person(0.05, 0.0)
+    for smoother in (posture_stream.OneEuroFilter(min_cutoff=0.5, beta=0.0), posture_stream.EmaFilter(0.3)):
+        errors = []
+        for i in range(120):
+            noisy = truth + rng.normal(0, 4, truth.shape).astype(np.float32)
+            smoothed = smoother(noisy, i / 30)
+            errors.append(np.abs(smoothed - truth).mean())
+        assert np.mean(errors[60:]) < 4 * 0.8 / 2
+
+        missing = truth.copy()
+        missing[0] = 0
+        before = smoother.value[0].copy()
+        assert np.array_equal(smoother(missing, 4.1)[0], before)
+
+
+def test_reader_modes():
+    """Without dropping every frame arrives in order; drop mode keeps the newest"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clip.avi")
+        write_video(path)
+
+        reader = posture_stream.FrameReader(path, drop=False, buffer=4).start()
+        indices = [index for index, _, _ in reader]
+        reader.close()
+        assert indices == list(range(30)) and reader.dropped == 0
+
+        reader = posture_stream.FrameReader(path, drop=True).start()
+        seen = []
+        for index, timestamp, _ in reader:
+            seen.append(index)
+            time.sleep(0.1)
+        reader.close()
+        assert reader.dropped > 0 and reader.read == 30
+        assert seen == sorted(seen) and len(seen) + reader.dropped == 30
+
+
+def test_stream_stride():
+    """The pose model runs on every stride-th frame, verdicts on every frame"""
+    calls = []
+
+    def estimate(frame):
+        calls.append(frame)
+        return None if len(calls) == 3 else person(0.2, 0.0)
+
+    frames = [(i, i / 30, np.zeros((4, 4, 3), np.uint8)) for i in range(10)]
+    results = [r for _, r, _, _ in posture_stream.stream_posture(frames, estimate, stride=3,
+                                                                 smoother=posture_stream.OneEuroFilter())]
+    assert len(calls) == 4
+    assert [r["inferred"] for r in results] == [i % 3 == 0 for i in range(10)]
+    # Person lost on the third inference (frame 6) until the next one (frame 9)
+    assert [r["person"] for r in results] == [True] * 6 + [False] * 3 + [True]
+    assert results[1]["head"] == "FORWARD HEAD POSTURE"
+
+
+def textured_frames(count, step=(2.0, 1.0), size=(480, 640)):
+    """Frames of a smooth random texture translated by step pixels per frame"""
+    rng = np.random.default_rng(11)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (size[0] + 200, size[1] + 200), dtype=np.uint8), (0, 0), 3)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    frames = []
+    for i in range(count):
+        shift = np.float32([[1, 0, step[0] * i - 100], [0, 1, step[1] * i - 100]])
+        gray = cv2.warpAffine(texture, shift, (size[1], size[0]), flags=cv2.INTER_LINEAR)
+        frames.append(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def test_tracker_follows_motion():
+    """Tracked keypoints follow the image motion; a scene cut drops confidence"""
+    frames = textured_frames(8)
+    kpts = person(0.2, 0.0) + [100.0, 0.0]
+    kpts[1:3] = 0  # undetected eyes stay undetected
+
+    tracker = posture_stream.KeypointTracker()
+    tracker.reset(cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY), kpts)
+    for i in range(1, len(frames)):
+        tracked, confidence = tracker.track(cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY))
+        assert confidence == 1.0
+    expected = kpts + [2.0 * 7, 1.0 * 7]
+    expected[1:3] = 0
+    assert np.abs(tracked - expected).max() < 0.5
+
+    noise = np.random.default_rng(5).integers(0, 256, frames[0].shape[:2], dtype=np.uint8)
+    _, confidence = tracker.track(noise)
+    assert confidence < tracker.min_confidence
+
+
+def test_stream_tracking():
+    """Tracking replaces inference between strides and re-detects on a cut"""
+    frames = textured_frames(12)
+    frames[7] = np.random.default_rng(5).integers(0, 256, frames[0].shape, dtype=np.uint8)
+    truth = person(0.2, 0.0) + [100.0, 0.0]
+    calls = []
+
+    def estimate(frame):
+        calls.append(frame)
+        n = next(i for i, f in enumerate(frames) if f is frame)
+        return truth + [2.0 * n, 1.0 * n]
+
+    results = [r for _, r, _, _ in posture_stream.stream_posture(
+        [(i, i / 30, f) for i, f in enumerate(frames)], estimate, stride=5, tracker=posture_stream.KeypointTracker()
+    )]
+    # Scheduled at 0 and 5, early at the cut (7) and right after it (8), whose
+    # keypoints cannot be tracked back into the noise frame
+    assert [i for i, r in enumerate(results) if r["inferred"]] == [0, 5, 7, 8]
+    assert len(calls) == 4
+    assert all(r["trackingConfidence"] == 1.0 for i, r in enumerate(results) if i in (1, 2, 3, 4, 6))
+    assert all(r["head"] == "FORWARD HEAD POSTURE" for r in results)
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
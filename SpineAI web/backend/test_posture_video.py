@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for offline video posture analysis
+"""
+
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import posture_video
+from test_posture_geometry import person
+from test_posture_stream import write_video
+from testutil import run_tests
+
+
+def fake_batch_estimator(batches):
+    """Pose stand-in reading the frame index from the brightness of the clip"""
+    def estimate_batch(frames):
+        batches.append(len(frames))
+        for frame in frames:
+            index = int(round(frame.mean() / 8))
+            if index in (20, 21):
+                yield None
+            else:
+                # Forward head for the first 12 frames, then healthy
+                yield person(0.2 if index < 12 else 0.0, 0.0)
+    return estimate_batch
+
+
+def test_video_series():
+    """Every frame gets a deviation entry, batches stay bounded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.avi")
+        write_video(path, frames=30, fps=10.0)
+        batches = []
+        result = posture_video.analyze_video(path, fake_batch_estimator(batches), batch_size=8)
+
+        series = result["series"]
+        assert series["frame"] == list(range(30)) and batches == [8, 8, 8, 6]
+        assert series["head_deviation_cm"][0] == 10.0 and series["head_deviation_cm"][20] is None
+        assert series["head"][:12] == [1] * 12 and series["head"][12] == 0 and series["head"][21] is None
+
+        summary = result["summary"]
+        assert summary["frames"] == 30 and summary["personFrames"] == 28
+        assert summary["forwardHeadShare"] == round(12 / 28, 4)
+        assert summary["longestForwardHeadSec"] == 1.2
+        assert summary["headDeviationCm"]["max"] == 10.0
+        assert result["durationSec"] == 3.0
+
+
+def test_video_stride():
+    """Stride analyzes every n-th frame with its original index and time"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.avi")
+        write_video(path, frames=30, fps=10.0)
+        result = posture_video.analyze_video(path, fake_batch_estimator([]), batch_size=4, stride=3)
+        assert result["series"]["frame"] == list(range(0, 30, 3))
+        assert result["series"]["time"][1] == 0.3
+        # Frames 0, 3, 6, 9 are forward: 4 samples of 0.3 s
+        assert result["summary"]["longestForwardHeadSec"] == 1.2
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the long-lived live posture worker
+"""
+
+import sys
+import os
+import io
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import posture_worker
+import worker_protocol
+from frame_ring import FrameRing
+from test_posture_geometry import person
+from testutil import run_tests
+
+
+def request(method, stream, seq, timestamp, payload=b""):
+    params = {"stream": stream, "seq": seq, "time": timestamp}
+    return worker_protocol.encode_message({"method": method, "params": params}, payload)
+
+
+def read_all(data):
+    stream = io.BytesIO(data)
+    messages = []
+    while True:
+        message = worker_protocol.read_message(stream)
+        if message is None:
+            return messages
+        messages.append(message[0])
+
+
+def test_serve_streams():
+    """Frames of interleaved streams are answered in order, per-stream smoothed"""
+    calls = []
+
+    def estimate(frame):
+        calls.append(frame.shape)
+        return None if frame.shape[1] == 32 else person(0.2, 0.0)
+
+    jpeg = cv2.imencode(".jpg", np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+    empty = cv2.imencode(".png", np.zeros((48, 32, 3), np.uint8))[1].tobytes()
+    stdin = io.BytesIO(
+        request("frame", 7, 1, 0.0, jpeg) + request("frame", 9, 1, 0.0, empty) + request("frame", 7, 2, 0.04, jpeg)
+        + request("frame", 9, 2, 0.05, b"not an image") + request("close", 7, 0, 0.0)
+        + request("frame", 7, 3, 0.1, jpeg)
+    )
+    stdout = io.BytesIO()
+    analyzer = posture_worker.PostureAnalyzer(estimate)
+    posture_worker.serve(analyzer, stdin, stdout)
+
+    messages = read_all(stdout.getvalue())
+    assert [(m["stream"], m["seq"]) for m in messages] == [(7, 1), (9, 1), (7, 2), (9, 2), (7, 3)]
+    assert messages[0]["person"] and messages[0]["head"] == "FORWARD HEAD POSTURE" and len(messages[0]["kp"]) == 34
+    assert messages[1]["person"] is False
+    assert "error" in messages[3]
+    assert len(calls) == 4
+    # Stream 7 was closed before its third frame, so it starts a new filter
+    assert list(analyzer.filters) == [9, 7] and analyzer.filters[7].time == 0.1
+
+
+
+def test_ring_frames():
+    """Frames handed over in ring slots are analyzed like piped ones"""
+    jpeg = cv2.imencode(".jpg", np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+    header = {"method": "frame", "params": {"stream": 3, "seq": 1, "time": 0.0}, "frame": {"slot": 0, "bytes": len(jpeg)}}
+    stdout = io.BytesIO()
+    with FrameRing(1, 1 << 16) as ring:
+        ring.write(0, jpeg)
+        analyzer = posture_worker.PostureAnalyzer(lambda frame: person(0.2, 0.0))
+        posture_worker.serve(analyzer, io.BytesIO(worker_protocol.encode_message(header)), stdout, ring)
+
+    message = read_all(stdout.getvalue())[0]
+    assert (message["stream"], message["seq"]) == (3, 1) and message["person"]
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
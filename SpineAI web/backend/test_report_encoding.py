@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for report encoding
+"""
+
+import sys
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import report_encoding
+from testutil import run_tests
+
+
+def report_image(seed=90, height=1800, width=2200):
+    """Smooth synthetic report buffer (compresses like a radiograph)"""
+    rng = np.random.default_rng(seed)
+    img = cv2.resize(rng.integers(0, 256, (height // 30, width // 30, 3), dtype=np.uint8), (width, height))
+    cv2.putText(img, "AI RADIOLOGY", (width - 500, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 255), 2)
+    return img
+
+
+def test_formats_and_quality():
+    """Every format decodes back to the fitted size; quality trades bytes"""
+    img = report_image()
+    sizes = {}
+    for fmt in ("jpg", "jpeg", "webp", "png"):
+        buffer, stats, _ = report_encoding.encode(img, fmt, max_dim=1000)
+        decoded = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        assert decoded.shape[:2] == (818, 1000)
+        assert stats["size"] == [1000, 818] and stats["bytes"] == buffer.size
+        sizes[stats["format"]] = stats["bytes"]
+
+    assert set(sizes) == {"jpg", "webp", "png"}
+    low, _, _ = report_encoding.encode(img, "jpg", quality=30)
+    high, _, _ = report_encoding.encode(img, "jpg", quality=95)
+    assert low.size < high.size
+
+    progressive, _, _ = report_encoding.encode(img, "jpg", progressive=True)
+    assert cv2.imdecode(progressive, cv2.IMREAD_COLOR).shape == img.shape
+
+    for bad in (lambda: report_encoding.encode(img, "gif"), lambda: report_encoding.encode(img, "jpg", quality=0)):
+        try:
+            bad()
+            assert False, "invalid options accepted"
+        except ValueError:
+            pass
+
+
+def test_write_report_with_thumbnail():
+    """Output and thumbnail are written in one call with their stats"""
+    img = report_image(height=600, width=700)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.webp")
+        stats = report_encoding.write_report(img, path, quality=60, max_dim=2000, thumbnail=200)
+
+        assert stats["format"] == "webp" and stats["size"] == [700, 600]
+        assert stats["bytes"] == os.path.getsize(path)
+        assert stats["thumbnail"]["path"] == os.path.join(tmp, "report_thumb.webp")
+        assert cv2.imread(stats["thumbnail"]["path"]).shape[:2] == (171, 200)
+        assert stats["encodeMs"] >= 0 and stats["thumbnail"]["encodeMs"] >= 0
+        assert sorted(os.listdir(tmp)) == ["report.webp", "report_thumb.webp"]
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
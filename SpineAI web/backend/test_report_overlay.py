@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the vector report overlay
+"""
+
+import sys
+import os
+import json
+import tempfile
+import xml.etree.ElementTree as ET
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import spine_geometry
+import report_overlay
+from detection_store import DetectionStore
+from test_spine_geometry import LEGACY_SCRIPTS, load_legacy_functions, random_spine
+from testutil import run_tests
+
+
+def study(seed, n=12):
+    """Column, flags and image type of a random study"""
+    rng = np.random.default_rng(seed)
+    column = spine_geometry.VertebraColumn(random_spine(rng, n))
+    image_type = column.image_type()
+    return column, column.diseases(image_type), image_type
+
+
+def test_shapes_follow_flags():
+    """Every flagged vertebra and disc gets its primitive"""
+    for seed in range(40, 60):
+        column, flags, image_type = study(seed)
+        overlay = report_overlay.build_overlay(column, flags, image_type, (1200, 2400), "spine.jpeg")
+        classes = [s["class"] for s in overlay["shapes"]]
+
+        assert classes.count("compression_fracture") == flags.compression_fracture.sum()
+        assert classes.count("listhesis") == (flags.listhesis & ~flags.compression_fracture).sum()
+        assert classes.count("herniated_disc") == flags.herniated_disc.sum()
+        assert classes.count("healthy") == (~(flags.compression_fracture | flags.listhesis)).sum()
+        assert classes.count("spine") == 1
+        assert classes.count("limit") == 4
+
+        panel = overlay["panel"]
+        assert panel["angle"] == round(column.cobb().angle, 1)
+        assert [f["count"] for f in panel["findings"]] == list(flags.counts().values())
+        assert json.loads(json.dumps(overlay)) == overlay
+
+
+def test_limit_lines_match_batch_report():
+    """Limit lines rasterize exactly like doktor_limit_cizgisi"""
+    legacy = load_legacy_functions(LEGACY_SCRIPTS[0], ["doktor_limit_cizgisi"])
+    for seed in range(60, 70):
+        column, flags, image_type = study(seed)
+        measurement = column.cobb()
+        overlay = report_overlay.build_overlay(column, flags, image_type, measurement=measurement)
+
+        expected = np.zeros((2000, 1500, 3), dtype=np.uint8)
+        actual = np.zeros_like(expected)
+        for idx, angle in ((measurement.idx_max, measurement.angle_max), (measurement.idx_min, measurement.angle_min)):
+            center = tuple(int(v) for v in measurement.smooth_points[idx])
+            legacy["doktor_limit_cizgisi"](expected, center, angle, (220, 220, 220))
+
+        for shape in overlay["shapes"]:
+            if shape["class"] != "limit":
+                continue
+            p = shape["points"]
+            if shape["type"] == "line":
+                cv2.line(actual, (p[0], p[1]), (p[2], p[3]), (220, 220, 220), 2, cv2.LINE_AA)
+            else:
+                cv2.circle(actual, (p[0], p[1]), 6, (220, 220, 220), -1)
+
+        assert np.array_equal(actual, expected)
+
+
+def test_svg_and_store_round_trip():
+    """Overlay rebuilt from stored detections renders to valid SVG"""
+    rng = np.random.default_rng(70)
+    boxes = random_spine(rng, 14)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(tmp)
+        key = store.append("spine-7.jpeg", "m1", boxes, (1200, 2400))
+
+        overlay = report_overlay.overlay_from_store(key, store=store)
+        column = spine_geometry.VertebraColumn(boxes)
+        image_type = column.image_type()
+        assert overlay == report_overlay.build_overlay(
+            column, column.diseases(image_type), image_type, [1200, 2400], "spine-7.jpeg"
+        )
+        assert report_overlay.overlay_from_store("missing:m1", store=store) is None
+
+    svg = report_overlay.overlay_svg(overlay, "/uploads/spine-7.jpeg")
+    root = ET.fromstring(svg)
+    assert root.get("viewBox") == "0 0 1200 2400"
+    drawn = [el for el in root if el.get("class")]
+    assert len(drawn) == len(overlay["shapes"])
+
+    # The whole study fits in a few kilobytes
+    assert len(json.dumps(overlay, separators=(",", ":"))) < 8192
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached report renderer
+
+Usage:
+    python test_report_renderer.py           # parity tests
+    python test_report_renderer.py --bench   # parity tests + render benchmark
+"""
+
+import sys
+import os
+import timeit
+
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import report_renderer
+from test_spine_geometry import LEGACY_SCRIPTS, load_legacy_functions
+from testutil import run_tests
+
+LEGACY_KEYS = {"compression_fracture": "cokme", "herniated_disc": "fitik", "listhesis": "kayma"}
+
+
+def legacy_report(img, file_name, image_type, angle, findings):
+    """Report panel of the desktop batch script"""
+    legacy = load_legacy_functions(LEGACY_SCRIPTS[0], ["rapor_paneli_ciz"])
+    bulgular = {LEGACY_KEYS[k]: v for k, v in findings.items()}
+    return legacy["rapor_paneli_ciz"](img.copy(), file_name, image_type, angle, bulgular)
+
+
+def random_film(rng, height, width):
+    """Random BGR film of a given size"""
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def test_pixel_parity():
+    """Cached renderer output is pixel-identical to rapor_paneli_ciz"""
+    rng = np.random.default_rng(30)
+    cases = [
+        (480, 360, "1.jpeg", "AP", 4.2, {"compression_fracture": 0, "herniated_disc": 0, "listhesis": 0}),
+        (1200, 900, "patient_000123_lumbar.jpeg", "AP (Frontal)", 23.7, {"compression_fracture": 1, "herniated_disc": 2, "listhesis": 0}),
+        (2600, 1400, "lat.png", "LATERAL", 12.0, {"compression_fracture": 0, "herniated_disc": 0, "listhesis": 3}),
+        (2600, 1400, "lat2.png", "LATERAL", 45.0, {"compression_fracture": 0, "herniated_disc": 0, "listhesis": 0}),
+        (3000, 2000, "x.jpeg", "UNKNOWN", 75.3, {"compression_fracture": 2, "herniated_disc": 0, "listhesis": 1}),
+    ]
+    for height, width, name, image_type, angle, findings in cases:
+        img = random_film(rng, height, width)
+        expected = legacy_report(img, name, image_type, angle, findings)
+
+        # Twice: the second render comes from the cached template
+        for _ in range(2):
+            assert np.array_equal(report_renderer.render_report(img, name, image_type, angle, findings), expected)
+
+        out = report_renderer.report_canvas(height, width, name)
+        assert report_renderer.render_report(img, name, image_type, angle, findings, out=out) is out
+        assert np.array_equal(out, expected)
+
+        # Film annotated in place inside the canvas is not copied again
+        out = report_renderer.report_canvas(height, width, name)
+        out[:, :width] = img
+        assert np.array_equal(report_renderer.render_report(out[:, :width], name, image_type, angle, findings, out=out), expected)
+
+
+def test_template_cache():
+    """Films of the same height share one template"""
+    report_renderer.panel_template.cache_clear()
+    rng = np.random.default_rng(31)
+    findings = {"compression_fracture": 0, "herniated_disc": 1, "listhesis": 0}
+    for angle in (5.0, 15.0, 25.0):
+        report_renderer.render_report(random_film(rng, 800, 600), "a.jpeg", "AP", angle, findings)
+
+    info = report_renderer.panel_template.cache_info()
+    assert info.misses == 1 and info.hits == 2
+
+    template = report_renderer.panel_template(800, report_renderer.panel_width(800, "a.jpeg"), "SCOLIOSIS (Cobb)")
+    assert not template.flags.writeable
+
+    try:
+        report_renderer.render_report(random_film(rng, 800, 600), "a.jpeg", "AP", 5.0, findings,
+                                      out=np.empty((800, 600, 3), dtype=np.uint8))
+        assert False, "undersized buffer accepted"
+    except ValueError:
+        pass
+
+
+def benchmark_render(repeats=20):
+    """Time rapor_paneli_ciz against the cached renderer on a large film"""
+    legacy = load_legacy_functions(LEGACY_SCRIPTS[0], ["rapor_paneli_ciz"])
+    rng = np.random.default_rng(32)
+    img = random_film(rng, 3000, 2400)
+    findings = {"compression_fracture": 1, "herniated_disc": 0, "listhesis": 2}
+    bulgular = {LEGACY_KEYS[k]: v for k, v in findings.items()}
+    out = report_renderer.report_canvas(3000, 2400, "film.jpeg")
+
+    t_legacy = timeit.timeit(lambda: legacy["rapor_paneli_ciz"](img, "film.jpeg", "AP", 14.2, bulgular), number=repeats)
+    t_copy = timeit.timeit(lambda: report_renderer.render_report(img, "film.jpeg", "AP", 14.2, findings), number=repeats)
+    out[:, :2400] = img
+    t_inplace = timeit.timeit(
+        lambda: report_renderer.render_report(out[:, :2400], "film.jpeg", "AP", 14.2, findings, out=out), number=repeats
+    )
+    print(f"   3000x2400 film: legacy {t_legacy / repeats * 1e3:.1f} ms | cached {t_copy / repeats * 1e3:.1f} ms | "
+          f"in-place canvas {t_inplace / repeats * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
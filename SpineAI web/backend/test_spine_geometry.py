@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Parity tests and micro-benchmark for the shared spine geometry engine
+Compares spine_geometry against every legacy per-point implementation
+
+Usage:
+    python test_spine_geometry.py           # parity tests
+    python test_spine_geometry.py --bench   # parity tests + micro-benchmark
+"""
+
+import sys
+import os
+import math
+import timeit
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+import spine_geometry
+import spine_analysis_minespore
+from testutil import run_tests
+
+REPO_DIR = os.path.abspath(os.path.join(BACKEND_DIR, "..", ".."))
+
+# Batch scripts run their pipeline at import time, so their math is
+# extracted from source instead of imported.
+LEGACY_SCRIPTS = [
+    os.path.join(REPO_DIR, "SpineAI - AI", "Omurga YZ", "omurgahastalıktespiti.py"),
+    os.path.join(REPO_DIR, "SpineAI - AI", "Omurga YZ", "omurgahastalıkminespore.py"),
+    os.path.join(REPO_DIR, "SpineAI - AI", "Omurga YZ", "omurgaminedsporeenglish.py"),
+    os.path.join(REPO_DIR, "SpineAI app", "app", "python_reference", "omurgamindsporeenglish.py"),
+]
+
+
+def load_legacy_functions(script_path, names):
+    """
+    Extract top-level functions from a legacy script without running it
+
+    Each block runs from its ``def`` line to the next unindented line, so
+    scripts that do not compile as a whole (stray indentation) still load.
+    """
+    with open(script_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+
+    namespace = {"np": np, "math": math, "cv2": cv2}
+    for name in names:
+        start = next(
+            (i for i, line in enumerate(lines) if line.lstrip().startswith(f"def {name}(")),
+            None
+        )
+        if start is None:
+            continue
+
+        block = [lines[start].lstrip()]
+        for line in lines[start + 1:]:
+            if line.strip() and not line[0].isspace():
+                break
+            block.append(line)
+        exec("\n".join(block), namespace)
+
+    return {name: namespace[name] for name in names if name in namespace}
+
+
+def random_spine(rng, n, dtype=np.float32):
+    """Build a plausible (N, 6) detection array, shuffled like raw detector output"""
+    top = rng.uniform(20, 200)
+    heights = rng.uniform(30, 90, n)
+    gaps = rng.uniform(-5, 25, n)
+    y1 = top + np.concatenate([[0], np.cumsum(heights + gaps)])[:n]
+    y2 = y1 + heights * rng.choice([1.0, 0.5], n, p=[0.85, 0.15])
+
+    drift = np.cumsum(rng.normal(0, 8, n)) + rng.uniform(300, 900)
+    widths = rng.uniform(50, 160, n)
+    x1 = drift - widths / 2
+    x2 = drift + widths / 2
+
+    boxes = np.stack([x1, y1, x2, y2, rng.uniform(0.25, 1, n), np.zeros(n)], axis=1)
+    return boxes[rng.permutation(n)].astype(dtype)
+
+
+def legacy_centers(boxes):
+    """Centers exactly as the batch scripts build them"""
+    bones = sorted(boxes, key=lambda x: (x[1] + x[3]) / 2)
+    return bones, [(int((b[0] + b[2]) / 2), int((b[1] + b[3]) / 2)) for b in bones]
+
+
+def legacy_cobb_call(func, centers):
+    """smart_cobb_angle_v12 takes an unused image argument in some copies"""
+    if func.__code__.co_argcount == 2:
+        return func(None, centers)
+    return func(centers)
+
+
+def legacy_detect_diseases(vertebrae, centers, heights, image_type):
+    """Per-vertebra loop of the original spine_analysis.detect_diseases"""
+    flagged = {"compression_fracture": set(), "herniated_disc": set(), "listhesis": set()}
+
+    for i, v in enumerate(vertebrae):
+        h = v[3] - v[1]
+        w = v[2] - v[0]
+        cx = centers[i][0]
+
+        if i > 0 and i < len(vertebrae) - 1:
+            local_avg = (heights[i - 1] + heights[i + 1]) / 2
+            if h < (local_avg * 0.60):
+                flagged["compression_fracture"].add(i)
+
+        if i > 0 and i < len(vertebrae) - 1:
+            expected_x = (centers[i - 1][0] + centers[i + 1][0]) / 2
+            tolerance = 0.35 if image_type == "AP" else 0.40
+            if abs(cx - expected_x) > (w * tolerance):
+                flagged["listhesis"].add(i)
+
+        if i < len(vertebrae) - 1:
+            space = vertebrae[i + 1][1] - v[3]
+            ref_h = (h + heights[i + 1]) / 2
+            limit = 0.08 if image_type == "LATERAL" else 0.06
+            if space < (ref_h * limit) and space > 0:
+                flagged["herniated_disc"].add(i)
+
+    return flagged
+
+
+def test_sort_matches_sorted():
+    """sort_boxes keeps the order of sorted(..., key=center y)"""
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        boxes = random_spine(rng, int(rng.integers(1, 25)))
+        bones, _ = legacy_centers(boxes)
+        assert np.array_equal(spine_geometry.sort_boxes(boxes), np.array(bones))
+
+
+def test_smoothing_parity():
+    """Convolution smoothing matches every legacy smooth_points copy"""
+    rng = np.random.default_rng(1)
+    for script in LEGACY_SCRIPTS:
+        legacy = load_legacy_functions(script, ["smooth_points"])["smooth_points"]
+        for _ in range(200):
+            boxes = random_spine(rng, int(rng.integers(3, 25)))
+            _, centers = legacy_centers(boxes)
+            expected = np.array(legacy(centers))
+            assert np.array_equal(spine_geometry.smooth_points(centers), expected), script
+
+
+def test_cobb_parity():
+    """Cobb angle, limit vertebrae and limit angles match smart_cobb_angle_v12"""
+    rng = np.random.default_rng(2)
+    for script in LEGACY_SCRIPTS:
+        legacy = load_legacy_functions(
+            script, ["smooth_points", "smart_cobb_angle_v12"]
+        )["smart_cobb_angle_v12"]
+
+        for _ in range(300):
+            boxes = random_spine(rng, int(rng.integers(3, 25)))
+            _, centers = legacy_centers(boxes)
+
+            cobb_val, smooth_pts, p_max, p_min, ang_max, ang_min = legacy_cobb_call(legacy, centers)
+            result = spine_geometry.cobb_angle(centers)
+
+            assert math.isclose(result.angle, cobb_val, abs_tol=1e-9), script
+            assert math.isclose(result.angle_max, ang_max, abs_tol=1e-9), script
+            assert math.isclose(result.angle_min, ang_min, abs_tol=1e-9), script
+            if p_max is None:
+                assert result.idx_max is None and result.idx_min is None
+                continue
+
+            assert np.array_equal(result.smooth_points, np.array(smooth_pts)), script
+            assert tuple(result.smooth_points[result.idx_max]) == tuple(p_max), script
+            assert tuple(result.smooth_points[result.idx_min]) == tuple(p_min), script
+
+
+def test_image_type_parity():
+    """Image type matches goruntu_tipi_analiz_et on float32 detector boxes"""
+    rng = np.random.default_rng(3)
+    legacy = load_legacy_functions(LEGACY_SCRIPTS[0], ["goruntu_tipi_analiz_et"])["goruntu_tipi_analiz_et"]
+    for _ in range(300):
+        boxes = random_spine(rng, int(rng.integers(3, 25)))
+        boxes[:, 2] = boxes[:, 0] + (boxes[:, 3] - boxes[:, 1]) * rng.uniform(0.9, 1.8)
+        bones, _ = legacy_centers(boxes)
+        expected = legacy(bones).split(" ")[0]
+        assert spine_geometry.analyze_image_type(spine_geometry.sort_boxes(boxes)) == expected
+
+
+def test_disease_mask_parity():
+    """Vectorized rules flag the same vertebrae as the per-vertebra loop"""
+    rng = np.random.default_rng(5)
+    for _ in range(500):
+        boxes = random_spine(rng, int(rng.integers(1, 25)))
+        bones, centers = legacy_centers(boxes)
+        heights = [b[3] - b[1] for b in bones]
+
+        for image_type in ("AP", "LATERAL", "UNKNOWN"):
+            expected = legacy_detect_diseases(bones, centers, heights, image_type)
+            flags = spine_geometry.detect_diseases(np.array(bones), image_type)
+
+            for key, indices in expected.items():
+                assert set(np.flatnonzero(getattr(flags, key))) == indices, key
+            assert flags.counts() == {k: len(v) for k, v in expected.items()}
+
+
+def test_report_thresholds():
+    """Batch report rules also check end vertebrae against the column mean"""
+    boxes = np.array([
+        [100, 0, 160, 20],
+        [100, 60, 160, 110],
+        [100, 115, 160, 165],
+        [100, 170, 160, 220],
+    ], dtype=np.float32)
+
+    default = spine_geometry.detect_diseases(boxes, "LATERAL")
+    report = spine_geometry.detect_diseases(boxes, "LATERAL", spine_geometry.REPORT_THRESHOLDS)
+
+    assert not default.compression_fracture.any()
+    assert report.compression_fracture.tolist() == [True, False, False, False]
+    # 5 px gaps: below 0.13 * 50 but not 0.08 * 50
+    assert not default.herniated_disc.any()
+    assert report.herniated_disc.tolist() == [False, True, True, False]
+    assert report.any().tolist() == [True, True, True, False]
+
+
+def random_archive(rng, n_studies):
+    """Concatenated detections and offsets for many studies, empty ones included"""
+    sizes = rng.integers(0, 25, n_studies)
+    studies = [random_spine(rng, int(n)) for n in sizes]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    boxes = np.concatenate(studies) if len(studies) else np.empty((0, 6), np.float32)
+    return studies, boxes, offsets
+
+
+def test_batch_parity():
+    """Ragged batch scoring matches the per-study engine"""
+    rng = np.random.default_rng(6)
+    for thresholds in (spine_geometry.DEFAULT_THRESHOLDS, spine_geometry.REPORT_THRESHOLDS):
+        studies, boxes, offsets = random_archive(rng, 400)
+        batch = spine_geometry.analyze_batch(boxes, offsets, thresholds)
+
+        for s, study in enumerate(studies):
+            rows = slice(offsets[s], offsets[s + 1])
+            sorted_boxes = spine_geometry.sort_boxes(study)
+            assert np.array_equal(boxes[batch.order[rows]], sorted_boxes)
+
+            image_type = spine_geometry.analyze_image_type(sorted_boxes)
+            assert batch.image_type[s] == image_type
+
+            flags = spine_geometry.detect_diseases(sorted_boxes, image_type, thresholds)
+            for key in spine_geometry.DiseaseFlags._fields:
+                assert np.array_equal(getattr(batch.flags, key)[rows], getattr(flags, key)), key
+                assert batch.findings[key][s] == flags.counts()[key]
+
+            cobb = spine_geometry.cobb_angle(spine_geometry.box_centers(sorted_boxes))
+            assert math.isclose(batch.cobb_angle[s], cobb.angle, abs_tol=1e-9)
+            assert math.isclose(batch.angle_max[s], cobb.angle_max, abs_tol=1e-9)
+            assert math.isclose(batch.angle_min[s], cobb.angle_min, abs_tol=1e-9)
+            assert batch.idx_max[s] == (-1 if cobb.idx_max is None else cobb.idx_max)
+            assert batch.idx_min[s] == (-1 if cobb.idx_min is None else cobb.idx_min)
+
+
+def test_batch_empty():
+    """An archive without detections still yields one row per study"""
+    batch = spine_geometry.analyze_batch(np.empty((0, 6), np.float32), [0, 0, 0])
+    assert batch.image_type.tolist() == ["UNKNOWN", "UNKNOWN"]
+    assert batch.cobb_angle.tolist() == [0.0, 0.0]
+    assert batch.findings["listhesis"].tolist() == [0, 0]
+
+
+def test_vertebra_column():
+    """VertebraColumn sorts once and agrees with the array functions"""
+    rng = np.random.default_rng(7)
+    for _ in range(100):
+        boxes = random_spine(rng, int(rng.integers(0, 25)))
+        column = spine_geometry.VertebraColumn(boxes)
+        sorted_boxes = spine_geometry.sort_boxes(boxes)
+
+        assert len(column) == len(boxes)
+        assert np.array_equal(column.rows(), sorted_boxes)
+        for i, field in enumerate(column.FIELDS):
+            values = getattr(column, field)
+            assert values.flags["C_CONTIGUOUS"] and values.dtype == np.float32
+            assert np.array_equal(values, sorted_boxes[:, i])
+        assert np.array_equal(column.centers, spine_geometry.box_centers(sorted_boxes))
+        assert np.array_equal(column.heights, spine_geometry.box_heights(sorted_boxes))
+
+        image_type = column.image_type()
+        flags = column.diseases(image_type)
+        expected = spine_geometry.detect_diseases(sorted_boxes, image_type)
+        for key in spine_geometry.DiseaseFlags._fields:
+            assert np.array_equal(getattr(flags, key), getattr(expected, key))
+        assert column.cobb().angle == spine_geometry.cobb_angle(column.centers).angle
+
+        data = column.to_dict(flags)
+        assert len(data["boxes"]) == len(data["conf"]) == len(data["centers"]) == len(boxes)
+        assert data["flags"]["listhesis"] == np.flatnonzero(flags.listhesis).tolist()
+
+    four_columns = spine_geometry.VertebraColumn(np.array([[0, 10, 5, 20]], dtype=np.float32))
+    assert four_columns.conf.tolist() == [0.0] and four_columns.heights.tolist() == [10.0]
+
+
+def test_analyzer_wrappers():
+    """Backend analyzers keep their list-based signatures on top of the engine"""
+    analyzer = spine_analysis_minespore.SpineAnalyzer("best.onnx")
+    legacy = load_legacy_functions(LEGACY_SCRIPTS[0], ["smooth_points", "smart_cobb_angle_v12"])
+
+    centers = [(100, 50), (105, 100), (110, 150), (108, 200), (105, 250), (100, 300)]
+    cobb_angle, smooth_centers = analyzer.calculate_cobb_angle(centers)
+    expected = legacy_cobb_call(legacy["smart_cobb_angle_v12"], centers)
+
+    assert math.isclose(cobb_angle, expected[0], abs_tol=1e-9)
+    assert smooth_centers == legacy["smooth_points"](centers)
+    assert analyzer.calculate_cobb_angle(centers[:4]) == (0.0, [])
+    assert analyzer.smooth_points(centers[:2]) == [(100, 50), (105, 100)]
+
+    vertebrae = [
+        [100, 50, 150, 100, 0.9, 0.9],
+        [100, 110, 150, 160, 0.9, 0.9],
+        [100, 170, 150, 200, 0.9, 0.9],
+        [120, 210, 170, 260, 0.9, 0.9],
+        [100, 270, 150, 320, 0.9, 0.9],
+    ]
+    centers = [((v[0] + v[2]) / 2, (v[1] + v[3]) / 2) for v in vertebrae]
+    heights = [v[3] - v[1] for v in vertebrae]
+    findings = analyzer.detect_diseases(vertebrae, centers, heights, np.mean(heights), "LATERAL")
+    assert findings == {k: len(v) for k, v in legacy_detect_diseases(vertebrae, centers, heights, "LATERAL").items()}
+
+
+def benchmark_geometry(repeats=2000):
+    """Time legacy per-point loops against the vectorized engine"""
+    print("\n" + "=" * 60)
+    print("Micro-benchmark: legacy loop vs vectorized engine")
+    print("=" * 60)
+
+    legacy = load_legacy_functions(
+        LEGACY_SCRIPTS[0], ["smooth_points", "smart_cobb_angle_v12", "goruntu_tipi_analiz_et"]
+    )
+    rng = np.random.default_rng(4)
+
+    for n in (7, 17, 40):
+        boxes = random_spine(rng, n)
+        bones, centers = legacy_centers(boxes)
+
+        def run_legacy():
+            legacy["goruntu_tipi_analiz_et"](sorted(boxes, key=lambda x: (x[1] + x[3]) / 2))
+            legacy_cobb_call(legacy["smart_cobb_angle_v12"], centers)
+
+        def run_engine():
+            sorted_boxes = spine_geometry.sort_boxes(boxes)
+            spine_geometry.analyze_image_type(sorted_boxes)
+            spine_geometry.cobb_angle(spine_geometry.box_centers(sorted_boxes))
+
+        t_legacy = timeit.timeit(run_legacy, number=repeats) / repeats * 1e6
+        t_engine = timeit.timeit(run_engine, number=repeats) / repeats * 1e6
+        print(f"   {n:3d} vertebrae: legacy {t_legacy:8.1f} us | engine {t_engine:8.1f} us | "
+              f"x{t_legacy / t_engine:.1f}")
+
+    for n_studies in (10_000, 100_000):
+        _, boxes, offsets = random_archive(rng, n_studies)
+        t_batch = timeit.timeit(lambda: spine_geometry.analyze_batch(boxes, offsets), number=3) / 3
+        print(f"   batch {n_studies:7d} studies ({len(boxes)} vertebrae): {t_batch:.3f} s | "
+              f"{t_batch / n_studies * 1e6:.2f} us/study")
+
+
+if __name__ == "__main__":
+    exit_code = run_tests(globals(), "SPINE GEOMETRY PARITY SUITE")
+    if "--bench" in sys.argv:
+        benchmark_geometry()
+    sys.exit(exit_code)
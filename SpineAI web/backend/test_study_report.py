@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for on-demand study report rendering
+"""
+
+import sys
+import os
+import json
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add current directory to path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+import report_overlay
+import report_renderer
+import study_report
+from detection_store import DetectionStore
+from test_spine_geometry import random_spine
+from testutil import run_tests
+
+
+def stored_study(tmp, seed=80, size=(1200, 2400)):
+    """Write a random upload and its detections to a temporary store"""
+    rng = np.random.default_rng(seed)
+    image_path = os.path.join(tmp, "spine-1.jpeg")
+    cv2.imwrite(image_path, rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+    store = DetectionStore(os.path.join(tmp, "store"))
+    key = store.append("spine-1.jpeg", "m1", random_spine(rng, 14), size)
+    return store, key, image_path
+
+
+def test_full_size_report():
+    """Full-size render is the annotated upload plus the report panel"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store, key, image_path = stored_study(tmp)
+        report = study_report.render_study(key, image_path, store=store)
+
+        overlay = report_overlay.overlay_from_store(key, store=store)
+        film = report_overlay.draw_overlay(cv2.imread(image_path), overlay)
+        panel = overlay["panel"]
+        expected = report_renderer.render_report(
+            film, "spine-1.jpeg", panel["imageType"], panel["angle"],
+            {f["key"]: f["count"] for f in panel["findings"]}
+        )
+        assert np.array_equal(report, expected)
+
+
+def test_downscaled_report():
+    """Requested size bounds the film, the panel follows its height"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store, key, image_path = stored_study(tmp)
+        report = study_report.render_study(key, image_path, max_dim=800, store=store)
+        assert report.shape[0] == 800
+        assert report.shape[1] == 400 + report_renderer.panel_width(800, "spine-1.jpeg")
+
+        try:
+            study_report.render_study("missing:m1", image_path, store=store)
+            assert False, "unknown key rendered"
+        except KeyError:
+            pass
+
+
+def test_cli_writes_report():
+    """CLI encodes by extension and reports the written file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store, key, image_path = stored_study(tmp, size=(300, 600))
+        output_path = os.path.join(tmp, "report.png")
+        env = dict(os.environ, SPINEAI_DETECTION_STORE=store.store_dir)
+        proc = subprocess.run(
+            [sys.executable, os.path.join(BACKEND_DIR, "study_report.py"), key, image_path, output_path, "--size", "400",
+             "--thumbnail", "128"],
+            capture_output=True, text=True, env=env
+        )
+        result = json.loads(proc.stdout)
+
+        assert proc.returncode == 0 and result["success"]
+        assert result["bytes"] == os.path.getsize(output_path)
+        assert cv2.imread(output_path).shape[:2] == (result["size"][1], result["size"][0])
+        assert result["thumbnail"]["bytes"] == os.path.getsize(os.path.join(tmp, "report_thumb.png"))
+        assert max(result["thumbnail"]["size"]) == 128
+        assert not any(f.endswith(".tmp") for f in os.listdir(tmp))
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
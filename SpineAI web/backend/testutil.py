@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test Utilities
+Plain-python runner for the test_*.py modules, so each can still be run
+directly (python test_x.py) besides under pytest
+"""
+
+import inspect
+
+try:
+    import pytest
+    SKIPPED = (pytest.skip.Exception,)
+except ImportError:
+    SKIPPED = ()
+
+
+def run_tests(namespace, title=None):
+    """
+    Run the test functions of a module and report results
+
+    Args:
+        namespace: globals() of the test module; its own test_* functions
+            run in definition order
+        title: Optional suite name printed as a banner before the run
+
+    Returns:
+        Process exit code (1 if any test failed)
+    """
+    if title:
+        print("\n" + "=" * 60)
+        print(title)
+        print("=" * 60)
+
+    tests = [
+        value for name, value in namespace.items()
+        if name.startswith("test_") and inspect.isfunction(value) and value.__module__ == namespace["__name__"]
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            # Older suites report failure by returning False instead of raising
+            if test() is False:
+                raise AssertionError("returned False")
+            print(f"✅ PASS       {test.__name__}")
+        except SKIPPED as e:
+            print(f"⏭️ SKIP       {test.__name__}: {e}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ FAIL       {test.__name__}: {e!r}")
+    return 1 if failed else 0
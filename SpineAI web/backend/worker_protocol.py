@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Worker Protocol
+Framed messages between the Node services and long-lived Python workers
+
+Every message is a JSON header plus an optional binary payload:
+
+    [u32 header length][u32 payload length][JSON header][payload bytes]
+
+(big endian). Requests carry {"id", "method", "params"}; the worker answers
+with {"id", "result"} or {"id", "error"} and may send {"id", "event"}
+messages before that. Ids let many requests be in flight on one pipe and be
+answered out of order. Stdout carries nothing but frames; logs go to stderr.
+"""
+
+import json
+import struct
+import threading
+
+
+PREFIX = struct.Struct(">II")
+
+# Refuse absurd lengths from a desynchronized or hostile peer
+MAX_HEADER_BYTES = 1 << 20
+MAX_PAYLOAD_BYTES = 256 << 20
+
+
+class ProtocolError(Exception):
+    """Malformed or truncated frame"""
+
+
+def encode_message(header, payload=b""):
+    """
+    Encode one message
+
+    Args:
+        header: JSON-serializable dict
+        payload: Optional binary payload
+
+    Returns:
+        Frame bytes
+    """
+    body = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode()
+    return PREFIX.pack(len(body), len(payload)) + body + bytes(payload)
+
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_message(stream):
+    """
+    Read one message
+
+    Args:
+        stream: Binary stream (stdin buffer)
+
+    Returns:
+        (header dict, payload bytes), or None at a clean end of input
+
+    Raises:
+        ProtocolError: On a truncated frame or invalid lengths/header
+    """
+    prefix = _read_exact(stream, PREFIX.size)
+    if prefix is None:
+        return None
+    header_size, payload_size = PREFIX.unpack(prefix)
+    if header_size > MAX_HEADER_BYTES or payload_size > MAX_PAYLOAD_BYTES:
+        raise ProtocolError(f"Frame too large (header {header_size}, payload {payload_size})")
+
+    body = _read_exact(stream, header_size + payload_size)
+    if body is None:
+        raise ProtocolError("Truncated frame")
+    try:
+        header = json.loads(bytes(body[:header_size]))
+    except ValueError as e:
+        raise ProtocolError(f"Invalid header: {e}")
+    if not isinstance(header, dict):
+        raise ProtocolError("Header is not an object")
+    return header, bytes(body[header_size:])
+
+
+class MessageWriter:
+    """Writes whole frames to a stream; safe to share between threads"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, header, payload=b""):
+        frame = encode_message(header, payload)
+        with self.lock:
+            self.stream.write(frame)
+            self.stream.flush()